@@ -1,32 +1,38 @@
 # backend/app/main.py
+import time
+
+_import_started = time.perf_counter()
+
+import asyncio
+import json
 import logging
 import os
-from typing import List
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional
 
 from fastapi import FastAPI, HTTPException, UploadFile, File, Form, Body
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
+from fastapi.responses import StreamingResponse
 
 from .database import init_db
+from .logging_config import setup_logging
 from .models import (
     ProcessingStatus,
     BatchProcessingRequest,
+    BatchPlanRequest,
+    BatchPlan,
+    BulkExampleResult,
+    ReprocessSelection,
     CaptionResponse,
-    ModelConfig, PromptTemplate, SettingsUpdate, ProcessedItem, CaptionUpdate
+    ModelConfig, PromptTemplate, SettingsUpdate, ProcessedItem, CaptionUpdate, ExportRequest, ExportStatus,
+    ProcessedItemPage, CaptionSearchPage, CaptionReindexRequest, BulkCaptionUpdate, BulkCaptionUpdateResult,
+    CoalescingStats
 )
-from .services import caption_service, settings_service
+from .services import caption_service, settings_service, export_service
+from .services.image_utils import read_upload
+from .static_files import CachedStaticFiles, HASHED_EXAMPLE_NAME
 
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
-
-# Set third-party loggers to WARNING or higher
-logging.getLogger('httpcore').setLevel(logging.WARNING)
-logging.getLogger('httpx').setLevel(logging.WARNING)
-logging.getLogger('python_multipart').setLevel(logging.WARNING)
-logging.getLogger('openai').setLevel(logging.WARNING)
-logging.getLogger('PIL').setLevel(logging.WARNING)
+setup_logging()
 
 logger = logging.getLogger(__name__)
 
@@ -49,11 +55,34 @@ def setup_data_directories():
             logger.error(f"Failed to setup {directory}: {str(e)}")
 
 
-setup_data_directories()
+# Seconds spent importing the app and until it was ready to serve, reported by /health
+startup_timings: Dict[str, float] = {}
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    started = time.perf_counter()
+    # Directory and database setup do not depend on each other
+    await asyncio.gather(asyncio.to_thread(setup_data_directories), asyncio.to_thread(init_db))
+    setup_done = time.perf_counter()
+    await asyncio.to_thread(caption_service.initialize_service)
+    ready = time.perf_counter()
+
+    startup_timings.update({
+        "import": round(started - _import_started, 3),
+        "setup": round(setup_done - started, 3),
+        "service": round(ready - setup_done, 3),
+        "ready": round(ready - _import_started, 3)
+    })
+    logger.info(f"Ready in {startup_timings['ready']}s (import {startup_timings['import']}s, "
+                f"directories and database {startup_timings['setup']}s, "
+                f"caption service {startup_timings['service']}s)")
+    yield
+
 
-init_db()
 app = FastAPI(title="Image Caption Generator API",
-              root_path="/api")
+              root_path="/api",
+              lifespan=lifespan)
 
 # Add CORS middleware
 app.add_middleware(
@@ -65,47 +94,71 @@ app.add_middleware(
 )
 
 
+def _caption_settings() -> tuple:
+    """The saved settings and the ModelConfig built from them, for single-image requests"""
+    settings = settings_service.get_settings_service().get_settings()
+    model_config = ModelConfig(
+        provider=settings['provider'],
+        model=settings['model'],
+        api_key=settings['api_key'],
+        cost_per_token=settings['cost_per_token'],
+        temperature=settings['temperature'],
+        request_timeout=settings.get('request_timeout') or 60.0,
+        hedge_requests=bool(settings.get('hedge_requests'))
+    )
+    return settings, model_config
+
+
 @app.post("/generate-caption", response_model=CaptionResponse)
 async def generate_caption(
         image: UploadFile = File(...)
 ):
-    logger = logging.getLogger(__name__)
-    logger.info("=== Starting Caption Generation Request ===")
-
-    # Log image details
-    logger.info(f"Received image: {image.filename} ({image.content_type})")
-
     try:
-        # Get settings and log them
-        settings = settings_service.get_settings_service().get_settings()
-
-        logger.info("Using settings:")
-        logger.info(f"  Provider: {settings['provider']}")
-        logger.info(f"  Model: {settings['model']}")
-        logger.info(f"  Temperature: {settings['temperature']}")
-
-        # Create ModelConfig from settings
-        model_config = ModelConfig(
-            provider=settings['provider'],
-            model=settings['model'],
-            api_key=settings['api_key'],
-            cost_per_token=settings['cost_per_token'],
-            temperature=settings['temperature']
-        )
+        settings, model_config = _caption_settings()
 
         caption = await caption_service.get_caption_service().generate_single_caption(
             image_file=image,
-            model_config=model_config
+            model_config=model_config,
+            example_top_k=settings.get('example_top_k')
         )
 
-        logger.info(f"Generated caption: {caption}")
-        logger.info("=== Caption Generation Complete ===")
         return CaptionResponse(caption=caption)
 
     except Exception as e:
-        logger.error(f"Error in generate_caption endpoint: {str(e)}", exc_info=True)
+        # The service has already logged the traceback
+        logger.error(f"Error in generate_caption endpoint: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/generate-caption/stream")
+async def stream_caption(
+        image: UploadFile = File(...)
+):
+    """Caption an image as server-sent events: token events as it is generated, then done or error"""
+    try:
+        settings, model_config = _caption_settings()
+        # Read before responding, the upload is not guaranteed to stay open while the body streams
+        content, _ = await read_upload(image)
+    except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+    events = caption_service.get_caption_service().stream_single_caption(
+        content=content,
+        model_config=model_config,
+        example_top_k=settings.get('example_top_k')
+    )
+
+    async def server_sent_events():
+        async for event, data in events:
+            yield f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+    return StreamingResponse(
+        server_sent_events(),
+        media_type="text/event-stream",
+        # Proxies must pass each event through as soon as it is written
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 
 @app.post("/batch-process")
 async def start_batch_processing(request: BatchProcessingRequest):
@@ -121,6 +174,28 @@ async def start_batch_processing(request: BatchProcessingRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/batch-process/dry-run", response_model=ReprocessSelection)
+async def preview_batch_processing(request: BatchProcessingRequest):
+    """Count the images a batch job would caption without starting it, e.g. with reprocess set to stale"""
+    try:
+        return await asyncio.to_thread(caption_service.get_caption_service().preview_batch, request)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/batch-process/plan", response_model=BatchPlan)
+async def plan_batch_processing(request: BatchPlanRequest):
+    """Estimate tokens, cost and duration of a batch job from image headers only"""
+    try:
+        return await asyncio.to_thread(caption_service.get_caption_service().plan_batch, request)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @app.post("/batch-process/stop")
 async def stop_batch_processing():
     try:
@@ -139,6 +214,12 @@ async def get_processing_status():
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/stats/coalescing", response_model=CoalescingStats)
+async def get_coalescing_stats():
+    """How many caption requests shared an identical provider call that was already in flight"""
+    return caption_service.get_caption_service().get_coalescing_stats()
+
+
 @app.post("/examples")
 async def upload_example(
         image: UploadFile = File(...),
@@ -151,10 +232,25 @@ async def upload_example(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/examples:bulk", response_model=BulkExampleResult)
+async def upload_examples(
+        images: List[UploadFile] = File(...),
+        captions: List[str] = Form(...)
+):
+    """Add many example pairs at once, captions[i] belongs to images[i]. Images already stored are skipped."""
+    if len(images) != len(captions):
+        raise HTTPException(status_code=400,
+                            detail=f"Got {len(images)} images but {len(captions)} captions")
+    try:
+        return await caption_service.get_caption_service().save_examples(list(zip(images, captions)))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 # Add a health check endpoint
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy"}
+    return {"status": "healthy", "startup": startup_timings}
 
 
 @app.get("/examples")
@@ -164,7 +260,44 @@ async def list_examples():
 
 @app.put("/captions/{item_id}")
 async def update_caption(item_id: int, caption: str = Body(...)):
-    return caption_service.get_caption_service().update_caption(item_id, caption)
+    return await asyncio.to_thread(caption_service.get_caption_service().update_caption, item_id, caption)
+
+
+@app.put("/captions:bulk", response_model=BulkCaptionUpdateResult)
+async def bulk_update_captions(update: BulkCaptionUpdate):
+    """Apply many caption edits at once, all or nothing"""
+    try:
+        items = await caption_service.get_caption_service().update_captions(update.edits)
+        return BulkCaptionUpdateResult(updated=len(items), items=items)
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/captions/search", response_model=CaptionSearchPage)
+async def search_captions(q: str, folder: Optional[str] = None, page: int = 1, page_size: int = 50):
+    """Full text search over the current captions, ranked and paginated"""
+    try:
+        return await asyncio.to_thread(
+            caption_service.get_caption_service().search_captions, q, folder, page, page_size
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/captions/reindex")
+async def reindex_captions(request: CaptionReindexRequest):
+    """Add a folder's existing caption files to the search index"""
+    try:
+        count = await asyncio.to_thread(caption_service.get_caption_service().reindex_captions, request.folder_path)
+        return {"indexed": count}
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.delete("/examples/{example_id}")
@@ -175,10 +308,29 @@ async def remove_example(example_id: int):
     return {"message": "Example removed successfully"}
 
 
+@app.get("/processed-items", response_model=ProcessedItemPage)
+async def list_processed_items(
+        batch_id: Optional[str] = None,
+        status: Optional[str] = None,
+        filename: Optional[str] = None,
+        page: int = 1,
+        page_size: int = 50
+):
+    """Page through the stored processing history, newest first"""
+    try:
+        return caption_service.get_caption_service().get_processed_items(
+            batch_id=batch_id, status=status, filename=filename, page=page, page_size=page_size
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @app.put("/processed-items/{item_id}/caption", response_model=ProcessedItem)
 async def update_caption(item_id: int, update: CaptionUpdate):
     try:
-        updated_item = caption_service.get_caption_service().update_caption(item_id, update.caption)
+        updated_item = await asyncio.to_thread(
+            caption_service.get_caption_service().update_caption, item_id, update.caption, update.image
+        )
         return updated_item
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -241,7 +393,11 @@ async def get_settings():
                 "temperature": 0.5,
                 "batch_size": 50,
                 "error_handling": "continue",
-                "concurrent_processing": 2
+                "concurrent_processing": 2,
+                "example_top_k": None,
+                "images_per_request": 1,
+                "request_timeout": 60.0,
+                "hedge_requests": False
             }
         return settings
     except Exception as e:
@@ -297,6 +453,22 @@ async def get_folder_contents(folder_path: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/export", response_model=ExportStatus)
+async def start_export(request: ExportRequest):
+    """Export a folder's image/caption pairs as WebDataset, JSONL or Parquet shards, resuming if possible"""
+    try:
+        return await export_service.get_export_service().start_export(request)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/export/status", response_model=ExportStatus)
+async def get_export_status():
+    return export_service.get_export_service().get_status()
+
+
 @app.get("/folders")
 async def list_folders():
     """List all available folders in the data directory"""
@@ -323,10 +495,10 @@ async def list_folders():
     return folders
 
 
-caption_service.initialize_service()
-
-app.mount("/examples", StaticFiles(directory="/data/examples"), name="examples")
-app.mount("/data", StaticFiles(directory="/data"), name="data")
+# The directories are created by the lifespan handler, after the app is built
+app.mount("/examples", CachedStaticFiles(directory="/data/examples", check_dir=False,
+                                         immutable_names=HASHED_EXAMPLE_NAME), name="examples")
+app.mount("/data", CachedStaticFiles(directory="/data", check_dir=False), name="data")
 
 if __name__ == "__main__":
     import uvicorn
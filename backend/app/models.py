@@ -1,10 +1,10 @@
 # backend/app/models.py
 from datetime import datetime
-from typing import List, Optional, Literal
+from typing import Dict, List, Optional, Literal, Union
 
 from pydantic import BaseModel, ConfigDict
 from pydantic.alias_generators import to_camel
-from sqlalchemy import Column, String, Boolean, DateTime, Integer, Float
+from sqlalchemy import Column, String, Boolean, DateTime, Integer, Float, BigInteger, Index, text
 
 from .database import Base
 
@@ -14,6 +14,15 @@ class BaseModelWithConfig(BaseModel):
     model_config = ConfigDict(arbitrary_types_allowed=True)
 
 
+class BackendConfig(BaseModelWithConfig):
+    """One credential/endpoint of a routed OpenAI-compatible backend pool"""
+    name: Optional[str] = None
+    api_key: str
+    model: Optional[str] = None  # defaults to ModelConfig.model
+    base_url: Optional[str] = None  # defaults to the OpenAI API
+    weight: float = 1.0
+
+
 # Update all your models to inherit from BaseModelWithConfig instead of BaseModel
 class ModelConfig(BaseModelWithConfig):
     provider: Literal["openai", "huggingface"]
@@ -21,12 +30,38 @@ class ModelConfig(BaseModelWithConfig):
     api_key: str
     cost_per_token: float
     temperature: float
+    base_url: Optional[str] = None  # OpenAI-compatible endpoint, defaults to the OpenAI API
+    backends: Optional[List[BackendConfig]] = None  # route requests over several keys/endpoints
+    # Local (huggingface) provider controls
+    local_threads: Optional[int] = None  # torch CPU threads, None keeps the torch default
+    local_batch_size: int = 8  # max images per forward pass
+    local_max_wait_ms: int = 20  # how long to wait for a batch to fill up
+    # Request deadline and hedging of slow requests
+    request_timeout: float = 60.0  # seconds before a provider request is abandoned
+    hedge_requests: bool = False  # send a duplicate request after the p95 latency
+    hedge_max_ratio: float = 0.1  # max hedge requests as a fraction of all requests
+    # Upload profile, compliant JPEGs are sent without decoding and re-encoding
+    image_max_side: int = 2048  # longest side in pixels
+    image_max_bytes: int = 4 * 1024 * 1024
+    image_quality: int = 95  # JPEG quality used when re-encoding
+    max_concurrent_requests: int = 8  # provider requests in flight, batch and interactive together
+    interactive_reserved_requests: int = 2  # slots only interactive requests may use
 
 
 class ProcessingConfig(BaseModelWithConfig):
     batch_size: int = 50
     error_handling: Literal["continue", "stop"] = "continue"
     concurrent_processing: int = 2
+    example_top_k: Optional[int] = None  # None or 0 sends every example
+    images_per_request: int = 1  # >1 captions several images with one request
+    memory_limit_mb: Optional[int] = 1024  # decoded image data in flight per job, None for no limit
+    # Integrity pre-scan, run in a process pool before any request is sent
+    prescan: bool = False
+    invalid_images: Literal["skip", "quarantine"] = "skip"  # quarantine moves them to <folder>/.quarantine
+    max_file_mb: int = 50
+    max_megapixels: int = 100
+    allow_animated: bool = False  # animated and multi-frame images are captioned from their first frame
+    log_sample_rate: float = 0.01  # share of per-image debug lines written, 1 logs every image
 
 
 class ProcessedItem(BaseModelWithConfig):
@@ -37,6 +72,31 @@ class ProcessedItem(BaseModelWithConfig):
     timestamp: datetime
     status: Literal["success", "error", "pending"]
     error_message: Optional[str] = None
+    backend: Optional[str] = None  # which backend generated the caption
+
+
+class UsageStats(BaseModelWithConfig):
+    requests: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cached_tokens: int = 0  # prompt tokens served from the provider's prompt cache
+    hedged_requests: int = 0  # duplicate requests sent to cut tail latency
+    passthrough_images: int = 0  # images uploaded with their original bytes
+    reencoded_images: int = 0  # images decoded, converted and re-encoded before upload
+
+    def add(self, usage) -> None:
+        """Accumulate an OpenAI-style usage object"""
+        self.requests += 1
+        if usage is None:
+            return
+        self.prompt_tokens += getattr(usage, "prompt_tokens", 0) or 0
+        self.completion_tokens += getattr(usage, "completion_tokens", 0) or 0
+        details = getattr(usage, "prompt_tokens_details", None)
+        self.cached_tokens += getattr(details, "cached_tokens", 0) or 0
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
 
 
 class ProcessingStatus(BaseModelWithConfig):
@@ -50,13 +110,130 @@ class ProcessingStatus(BaseModelWithConfig):
     estimatedCompletion: Optional[datetime]
     processingSpeed: Optional[float]  # items per minute
     totalCost: float
+    usage: Optional[UsageStats] = None
+    peakRssMb: Optional[float] = None  # peak resident memory of the worker process
+    peakImageMemoryMb: Optional[float] = None  # peak decoded image data in flight for the job
+    batchId: Optional[str] = None  # processed_items.batch_id of the current job
+
+
+class ProcessedItemPage(BaseModelWithConfig):
+    items: List[ProcessedItem]
+    total: int
+    page: int
+    pageSize: int
+
+
+class CaptionSearchResult(BaseModelWithConfig):
+    id: int  # same per-file id as ProcessedItem.id
+    filename: str
+    image: str
+    caption: str
+    timestamp: datetime
+    rank: Optional[float] = None  # full text search rank, None with the LIKE fallback
+
+
+class CaptionSearchPage(BaseModelWithConfig):
+    query: str
+    items: List[CaptionSearchResult]
+    total: int
+    page: int
+    pageSize: int
+
+
+class CaptionReindexRequest(BaseModelWithConfig):
+    folder_path: str
+
+
+class CaptionEdit(BaseModelWithConfig):
+    id: int
+    caption: str
+    image: Optional[str] = None  # image path, only needed when several files share the id
+
+
+class BulkCaptionUpdate(BaseModelWithConfig):
+    edits: List[CaptionEdit]
+
+
+class BulkCaptionUpdateResult(BaseModelWithConfig):
+    updated: int
+    items: List[ProcessedItem]
 
 
 class BatchProcessingRequest(BaseModelWithConfig):
     folder_path: str
     model_settings: ModelConfig
     processing_settings: Optional[ProcessingConfig] = None
-    reprocess: bool = False
+    # False captions images without a .txt, True redoes every image, "stale" also redoes
+    # captions whose template, examples, model, temperature or image changed
+    reprocess: Union[bool, Literal["stale"]] = False
+
+
+class ReprocessSelection(BaseModelWithConfig):
+    """Which images a batch job would caption, without starting it"""
+    imageCount: int  # images that would be captioned
+    totalImages: int
+    uncaptioned: int
+    stale: int  # captions with recorded provenance whose inputs changed
+    current: int
+    unknownProvenance: int  # captions from before provenance was recorded or edited by hand, kept
+    staleReasons: Dict[str, int]  # changed input -> captions, a caption can have several
+    scanSeconds: float = 0.0
+
+
+class BatchPlanRequest(BatchProcessingRequest):
+    # Assumptions of the estimate, None uses what earlier requests measured or a default
+    request_latency_seconds: Optional[float] = None
+    completion_tokens_per_image: Optional[int] = None
+    requests_per_minute: Optional[int] = None
+    tokens_per_minute: Optional[int] = None
+
+
+class BatchPlan(BaseModelWithConfig):
+    imageCount: int
+    unreadableCount: int = 0  # images whose header could not be read
+    requestCount: int
+    promptTokens: int
+    completionTokens: int
+    totalTokens: int
+    prefixTokensPerRequest: int  # system prompt, template and examples, sent with every request
+    estimatedCost: float
+    estimatedDurationSeconds: float
+    concurrency: int
+    requestLatencySeconds: float
+    completionTokensPerImage: int
+    requestsPerMinute: Optional[int] = None
+    tokensPerMinute: Optional[int] = None
+    limitedBy: Literal["concurrency", "requests_per_minute", "tokens_per_minute"]
+    scanSeconds: float = 0.0  # time spent listing the folder and reading image headers
+
+
+class ExportRequest(BaseModelWithConfig):
+    folder_path: str
+    output_dir: Optional[str] = None  # defaults to /data/exports/<folder name>-<format>
+    format: Literal["webdataset", "jsonl", "parquet"] = "webdataset"
+    shard_size: int = 1000  # samples per shard
+    include_images: bool = False  # embed images in jsonl/parquet, webdataset shards always contain them
+    image_max_side: Optional[int] = None  # resize embedded images, None keeps the original files
+    image_quality: int = 90
+    overwrite: bool = False  # discard a previous export in output_dir instead of resuming it
+
+
+class ExportStatus(BaseModelWithConfig):
+    isExporting: bool
+    format: Optional[str] = None
+    outputDir: Optional[str] = None
+    totalCount: int = 0  # image/caption pairs in the folder
+    exportedCount: int = 0
+    skippedCount: int = 0  # images without a caption
+    shardsWritten: int = 0
+    shardsResumed: int = 0  # shards already complete from a previous run
+    error: Optional[str] = None
+
+
+class CoalescingStats(BaseModelWithConfig):
+    leaders: int  # provider calls made for coalescable requests
+    coalesced: int  # requests served by an identical call already in flight
+    inFlight: int
 
 
 class CaptionResponse(BaseModelWithConfig):
@@ -68,6 +245,23 @@ class ExamplePair(BaseModelWithConfig):
     image: str
     filename: str
     caption: str
+    prompt_filename: Optional[str] = None  # size-capped JPEG sent in prompts, None uses the original
+
+
+class ExampleDuplicate(BaseModelWithConfig):
+    filename: str
+    existingId: int  # example that already has this content
+
+
+class ExampleFailure(BaseModelWithConfig):
+    filename: str
+    error: str
+
+
+class BulkExampleResult(BaseModelWithConfig):
+    added: List[ExamplePair]
+    duplicates: List[ExampleDuplicate]
+    failed: List[ExampleFailure]
 
 
 class PromptTemplate(BaseModel):
@@ -79,6 +273,7 @@ class PromptTemplate(BaseModel):
 
 class CaptionUpdate(BaseModel):
     caption: str
+    image: Optional[str] = None  # image path, only needed when several files share the id
 
 
 class SettingsUpdate(BaseModelWithConfig):
@@ -90,6 +285,10 @@ class SettingsUpdate(BaseModelWithConfig):
     batch_size: Optional[int] = None
     error_handling: Optional[Literal["continue", "stop"]] = None
     concurrent_processing: Optional[int] = None
+    example_top_k: Optional[int] = None
+    images_per_request: Optional[int] = None
+    request_timeout: Optional[float] = None
+    hedge_requests: Optional[bool] = None
 
 
 class DBPromptTemplate(Base):
@@ -103,11 +302,18 @@ class DBPromptTemplate(Base):
 
 class DBExample(Base):
     __tablename__ = "examples"
+    __table_args__ = (
+        # Lets concurrent uploads of the same image fail instead of both being stored
+        Index("uq_examples_content_hash", "content_hash", unique=True),
+    )
 
     id = Column(Integer, primary_key=True)
     filename = Column(String, nullable=False)
     image_path = Column(String, nullable=False)
     caption = Column(String, nullable=False)
+    features = Column(String, nullable=True)  # JSON encoded perceptual feature vector
+    content_hash = Column(String, nullable=True)  # sha256 of the original, for deduplication
+    prompt_filename = Column(String, nullable=True)  # normalized copy sent in prompts
     created_at = Column(DateTime, default=datetime.utcnow)
 
 
@@ -124,6 +330,10 @@ class DBSettings(Base):
     batch_size = Column(Integer, nullable=False, default=50)
     error_handling = Column(String, nullable=False, default="continue")
     concurrent_processing = Column(Integer, nullable=False, default=2)
+    example_top_k = Column(Integer, nullable=True)
+    images_per_request = Column(Integer, nullable=True)
+    request_timeout = Column(Float, nullable=True)
+    hedge_requests = Column(Boolean, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
@@ -137,18 +347,67 @@ class DBSettings(Base):
             "temperature": self.temperature,
             "batch_size": self.batch_size,
             "error_handling": self.error_handling,
-            "concurrent_processing": self.concurrent_processing
+            "concurrent_processing": self.concurrent_processing,
+            "example_top_k": self.example_top_k,
+            "images_per_request": self.images_per_request or 1,
+            "request_timeout": self.request_timeout or 60.0,
+            "hedge_requests": bool(self.hedge_requests)
         }
 
 
 class DBProcessedItem(Base):
     __tablename__ = "processed_items"
+    __table_args__ = (
+        Index("ix_processed_items_batch_id_status", "batch_id", "status"),
+        # Caption edits look up the latest item of an image
+        Index("ix_processed_items_image_path", "image_path"),
+    )
 
     id = Column(String, primary_key=True)
-    filename = Column(String, nullable=False)
+    item_id = Column(BigInteger, nullable=True, index=True)  # stable per-file id, ProcessedItem.id
+    filename = Column(String, nullable=False, index=True)
     image_path = Column(String, nullable=False)
     caption = Column(String, nullable=True)
-    status = Column(String, nullable=False)  # 'pending', 'processing', 'completed', 'error'
+    status = Column(String, nullable=False)  # 'success', 'error'
     error_message = Column(String, nullable=True)
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
     batch_id = Column(String, nullable=False)
+    backend = Column(String, nullable=True)
+
+
+class DBCaptionProvenance(Base):
+    """Inputs that produced the current generated caption of an image"""
+    __tablename__ = "caption_provenance"
+
+    image_path = Column(String, primary_key=True)
+    folder = Column(String, nullable=False, index=True)
+    template_hash = Column(String, nullable=False)
+    examples_hash = Column(String, nullable=False)
+    model = Column(String, nullable=False)
+    temperature = Column(Float, nullable=False)
+    image_hash = Column(String, nullable=False)  # sha256 of the file
+    image_size = Column(BigInteger, nullable=False)
+    image_mtime = Column(Float, nullable=False)  # the hash is only recomputed when size or mtime change
+    batch_id = Column(String, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+# Indexed expression of the captions full text index, queries must repeat it verbatim to use the index
+CAPTION_TSVECTOR = "to_tsvector('english', coalesce(caption, ''))"
+
+
+class DBCaption(Base):
+    """Current caption of every image, kept for searching"""
+    __tablename__ = "captions"
+    __table_args__ = (
+        Index("ix_captions_caption_fts", text(CAPTION_TSVECTOR), postgresql_using="gin").ddl_if(
+            dialect="postgresql"
+        ),
+    )
+
+    image_path = Column(String, primary_key=True)
+    item_id = Column(BigInteger, nullable=True, index=True)  # per-file id, several paths may share one
+    folder = Column(String, nullable=False, index=True)
+    filename = Column(String, nullable=False)
+    caption = Column(String, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, index=True)
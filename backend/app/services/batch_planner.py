@@ -0,0 +1,181 @@
+# backend/app/services/batch_planner.py
+import logging
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
+
+from PIL import Image
+
+from ..models import BatchPlan, ExamplePair, ModelConfig, ProcessingConfig
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.gif', '.webp')
+# Only these decoders are tried when identifying a file
+IMAGE_FORMATS = ("JPEG", "PNG", "GIF", "WEBP")
+# Files per header-reading task
+HEADER_CHUNK_SIZE = 256
+
+# OpenAI vision token accounting at high detail: the image is fitted into
+# 2048x2048, its shortest side scaled down to 768, then billed per 512px tile
+IMAGE_BASE_TOKENS = 85
+IMAGE_TILE_TOKENS = 170
+IMAGE_TILE_SIZE = 512
+IMAGE_FIT_SIDE = 2048
+IMAGE_SHORT_SIDE = 768
+# Text is estimated at ~4 characters per token, plus the chat formatting of each message
+CHARS_PER_TOKEN = 4
+MESSAGE_TOKENS = 4
+
+# Used when no request has been observed yet and the caller gives no value
+DEFAULT_REQUEST_LATENCY = 5.0
+DEFAULT_COMPLETION_TOKENS = 80
+
+
+def scan_folder(folder_path: str) -> Tuple[List[str], List[str]]:
+    """Return the image filenames of a folder without and with a caption file"""
+    names = set()
+    images = []
+    for entry in os.scandir(folder_path):
+        names.add(entry.name)
+        if entry.is_file() and entry.name.lower().endswith(IMAGE_EXTENSIONS):
+            images.append(entry.name)
+    uncaptioned, captioned = [], []
+    for name in images:
+        (captioned if os.path.splitext(name)[0] + '.txt' in names else uncaptioned).append(name)
+    return uncaptioned, captioned
+
+
+def _read_sizes(paths: List[str]) -> Tuple[List[Tuple[int, int]], int]:
+    sizes, unreadable = [], 0
+    for path in paths:
+        try:
+            # Opening only parses the header, pixel data is never decoded
+            with Image.open(path, formats=IMAGE_FORMATS) as image:
+                sizes.append(image.size)
+        except Exception:
+            unreadable += 1
+    return sizes, unreadable
+
+
+def read_image_sizes(paths: List[str]) -> Tuple[List[Tuple[int, int]], int]:
+    """Read the dimensions of every image from its header in parallel, returns the sizes and unreadable count"""
+    chunks = [paths[start:start + HEADER_CHUNK_SIZE] for start in range(0, len(paths), HEADER_CHUNK_SIZE)]
+    if len(chunks) <= 1:
+        return _read_sizes(paths)
+
+    sizes, unreadable = [], 0
+    with ThreadPoolExecutor(max_workers=min(32, (os.cpu_count() or 1) * 4)) as executor:
+        for chunk_sizes, chunk_unreadable in executor.map(_read_sizes, chunks):
+            sizes.extend(chunk_sizes)
+            unreadable += chunk_unreadable
+    return sizes, unreadable
+
+
+def upload_size(width: int, height: int, max_side: int) -> Tuple[int, int]:
+    """Dimensions after the upload profile scales the longest side down to max_side"""
+    scale = min(1.0, max_side / max(width, height))
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def image_tokens(width: int, height: int) -> int:
+    scale = min(1.0, IMAGE_FIT_SIDE / max(width, height))
+    width, height = width * scale, height * scale
+    scale = min(1.0, IMAGE_SHORT_SIDE / min(width, height))
+    width, height = width * scale, height * scale
+    tiles = math.ceil(width / IMAGE_TILE_SIZE) * math.ceil(height / IMAGE_TILE_SIZE)
+    return IMAGE_BASE_TOKENS + IMAGE_TILE_TOKENS * tiles
+
+
+def text_tokens(text: Optional[str]) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN) if text else 0
+
+
+def plan_batch(
+        image_sizes: List[Tuple[int, int]],
+        model_config: ModelConfig,
+        processing_config: ProcessingConfig,
+        template: Optional[str],
+        examples: List[Tuple[ExamplePair, Tuple[int, int]]],
+        request_latency: float,
+        completion_tokens_per_image: int,
+        requests_per_minute: Optional[int] = None,
+        tokens_per_minute: Optional[int] = None
+) -> BatchPlan:
+    """Estimate tokens, cost and duration of captioning images of the given sizes.
+
+    Requests are laid out the way the batch job sends them: the shared
+    prefix (system prompt, template, examples) once per request, then the
+    request's images at their upload size. Duration is the slowest of the
+    concurrency bound and the request and token rate limits.
+    """
+    from .providers.openai_provider import SYSTEM_PROMPT, MULTI_IMAGE_INSTRUCTION
+
+    image_count = len(image_sizes)
+    group_size = max(1, processing_config.images_per_request)
+    batch_size = max(1, processing_config.batch_size)
+    local = model_config.provider == "huggingface" and not model_config.backends
+
+    # Prefix tokens, top-k selection sends the average example k times
+    prefix_tokens = MESSAGE_TOKENS + text_tokens(SYSTEM_PROMPT)
+    if template:
+        prefix_tokens += MESSAGE_TOKENS + text_tokens(template)
+    if examples:
+        example_tokens = [
+            2 * MESSAGE_TOKENS + image_tokens(*size) + text_tokens(example.caption) for example, size in examples
+        ]
+        top_k = processing_config.example_top_k
+        sent = min(top_k, len(examples)) if top_k else len(examples)
+        prefix_tokens += round(sum(example_tokens) / len(example_tokens) * sent)
+
+    # Requests and concurrency rounds, batches run one after the other
+    request_count = 0
+    multi_image_requests = 0
+    rounds = 0
+    concurrency = max(1, min(processing_config.concurrent_processing,
+                             model_config.max_concurrent_requests - model_config.interactive_reserved_requests))
+    for start in range(0, image_count, batch_size):
+        batch_images = min(batch_size, image_count - start)
+        groups = math.ceil(batch_images / group_size)
+        request_count += groups
+        if group_size > 1:
+            multi_image_requests += batch_images // group_size + (1 if batch_images % group_size > 1 else 0)
+        rounds += math.ceil(groups / concurrency)
+
+    if local:
+        prompt_tokens = completion_tokens = prefix_tokens = 0
+    else:
+        upload_tokens = sum(
+            image_tokens(*upload_size(width, height, model_config.image_max_side)) for width, height in image_sizes
+        )
+        # Each multi-image request adds its instruction and an "Image n:" label per image
+        multi_image_tokens = multi_image_requests * text_tokens(MULTI_IMAGE_INSTRUCTION) + (
+            image_count * text_tokens("Image 1:") if group_size > 1 else 0)
+        prompt_tokens = (request_count * (prefix_tokens + MESSAGE_TOKENS) + upload_tokens + multi_image_tokens)
+        completion_tokens = image_count * completion_tokens_per_image
+    total_tokens = prompt_tokens + completion_tokens
+
+    durations = {"concurrency": rounds * request_latency}
+    if requests_per_minute:
+        durations["requests_per_minute"] = request_count / requests_per_minute * 60
+    if tokens_per_minute and total_tokens:
+        durations["tokens_per_minute"] = total_tokens / tokens_per_minute * 60
+    limited_by = max(durations, key=durations.get)
+
+    return BatchPlan(
+        imageCount=image_count,
+        requestCount=request_count,
+        promptTokens=prompt_tokens,
+        completionTokens=completion_tokens,
+        totalTokens=total_tokens,
+        prefixTokensPerRequest=prefix_tokens,
+        estimatedCost=total_tokens * model_config.cost_per_token / 1000,  # cost is per 1K tokens
+        estimatedDurationSeconds=round(durations[limited_by], 1),
+        concurrency=concurrency,
+        requestLatencySeconds=request_latency,
+        completionTokensPerImage=0 if local else completion_tokens_per_image,
+        requestsPerMinute=requests_per_minute,
+        tokensPerMinute=tokens_per_minute,
+        limitedBy=limited_by
+    )
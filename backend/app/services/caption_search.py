@@ -0,0 +1,137 @@
+# backend/app/services/caption_search.py
+import logging
+import os
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from ..models import DBCaption, CAPTION_TSVECTOR
+
+logger = logging.getLogger(__name__)
+
+# Rows per multi-row upsert statement
+UPSERT_CHUNK_SIZE = 500
+
+_TSQUERY = "websearch_to_tsquery('english', :query)"
+
+
+def item_id_for(filename: str) -> int:
+    """Stable id of a file, the same 32-bit string hash as hashFilename in the frontend.
+
+    JavaScript hashes UTF-16 code units and takes the absolute value of the
+    signed result, so this does too. Distinct files can share an id.
+    """
+    hash_value = 0
+    encoded = filename.encode("utf-16-le")
+    for i in range(0, len(encoded), 2):
+        hash_value = (hash_value * 31 + int.from_bytes(encoded[i:i + 2], "little")) & 0xFFFFFFFF
+    if hash_value >= 0x80000000:
+        hash_value -= 0x100000000
+    return abs(hash_value)
+
+
+def find_image_paths(db: Session, item_ids: List[int]) -> Dict[int, List[str]]:
+    """Return the indexed image paths of each id"""
+    paths: Dict[int, List[str]] = {}
+    for start in range(0, len(item_ids), UPSERT_CHUNK_SIZE):
+        rows = (db.query(DBCaption.item_id, DBCaption.image_path)
+                .filter(DBCaption.item_id.in_(item_ids[start:start + UPSERT_CHUNK_SIZE]))
+                .all())
+        for item_id, image_path in rows:
+            paths.setdefault(item_id, []).append(image_path)
+    return paths
+
+
+def dialect_insert(db: Session):
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        raise RuntimeError(f"Caption indexing is not supported on {dialect}")
+    return insert
+
+
+def upsert_captions(db: Session, captions: List[Tuple[str, str]]):
+    """Insert or update the indexed caption of each (image path, caption) pair. The caller commits."""
+    if not captions:
+        return
+    insert = dialect_insert(db)
+    now = datetime.utcnow()
+    # One statement must not touch the same row twice, the last caption of a path wins
+    captions = list({os.path.normpath(image_path): caption for image_path, caption in captions}.items())
+    for start in range(0, len(captions), UPSERT_CHUNK_SIZE):
+        rows = []
+        for image_path, caption in captions[start:start + UPSERT_CHUNK_SIZE]:
+            rows.append({
+                "image_path": image_path,
+                "item_id": item_id_for(os.path.basename(image_path)),
+                "folder": os.path.dirname(image_path),
+                "filename": os.path.basename(image_path),
+                "caption": caption,
+                "updated_at": now
+            })
+        statement = insert(DBCaption).values(rows)
+        db.execute(statement.on_conflict_do_update(
+            index_elements=[DBCaption.image_path],
+            set_={
+                "caption": statement.excluded.caption,
+                "item_id": statement.excluded.item_id,
+                "updated_at": statement.excluded.updated_at
+            }
+        ))
+
+
+def search_captions(
+        db: Session,
+        query: str,
+        folder: Optional[str] = None,
+        offset: int = 0,
+        limit: int = 50
+) -> Tuple[List[Tuple[DBCaption, Optional[float]]], int]:
+    """Return one page of (caption row, rank) matches and the total number of matches.
+
+    On Postgres this is a ranked full text search served by the GIN index,
+    supporting quoted phrases, OR and -exclusions. Other databases fall back
+    to matching every word with LIKE, newest first.
+    """
+    base = db.query(DBCaption)
+    if folder:
+        base = base.filter(DBCaption.folder == os.path.normpath(folder))
+
+    if db.get_bind().dialect.name == "postgresql":
+        matches = base.filter(text(f"{CAPTION_TSVECTOR} @@ {_TSQUERY}")).params(query=query)
+        rows = (matches.add_columns(text(f"ts_rank({CAPTION_TSVECTOR}, {_TSQUERY}) AS rank"))
+                .order_by(text("rank DESC"), DBCaption.image_path)
+                .offset(offset)
+                .limit(limit)
+                .all())
+        return [(row[0], row[1]) for row in rows], matches.count()
+
+    matches = base
+    for word in query.split():
+        escaped = word.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        matches = matches.filter(DBCaption.caption.ilike(f"%{escaped}%", escape="\\"))
+    rows = (matches.order_by(DBCaption.updated_at.desc(), DBCaption.image_path)
+            .offset(offset)
+            .limit(limit)
+            .all())
+    return [(row, None) for row in rows], matches.count()
+
+
+def read_folder_captions(folder_path: str) -> List[Tuple[str, str]]:
+    """Read the caption sidecar of every captioned image in a folder"""
+    captions = []
+    for entry in os.scandir(folder_path):
+        if not entry.is_file() or not entry.name.lower().endswith(('.png', '.jpg', '.jpeg', '.gif', '.webp')):
+            continue
+        caption_path = os.path.splitext(entry.path)[0] + '.txt'
+        try:
+            with open(caption_path, encoding="utf-8") as f:
+                captions.append((entry.path, f.read().strip()))
+        except FileNotFoundError:
+            continue
+    return captions
@@ -2,39 +2,89 @@
 import asyncio
 import logging
 import os
+import time
 import uuid
-from datetime import datetime, timedelta
-from typing import List, Optional
+from contextlib import ExitStack, nullcontext, suppress
+from datetime import datetime
+from io import BytesIO
+from typing import AsyncIterator, BinaryIO, Dict, List, Optional, Set, Tuple, Union
 
 import aiofiles
 from PIL import Image
 from fastapi import UploadFile
+from sqlalchemy import insert, update
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
-from .providers import OpenAIProvider, HuggingFaceProvider
+from .batch_planner import (
+    DEFAULT_COMPLETION_TOKENS, DEFAULT_REQUEST_LATENCY, scan_folder, read_image_sizes, plan_batch
+)
+from .caption_search import (
+    upsert_captions, search_captions, read_folder_captions, find_image_paths, item_id_for
+)
+from .example_index import ExampleIndex, compute_features, serialize_features, deserialize_features
+from .example_store import write_example_files, write_prompt_copy, remove_example_files
+from .image_scan import scan_images, quarantine_image
+from .image_utils import read_upload, open_image, decoded_size, file_sha256
+from .memory_budget import MemoryBudget, peak_rss_mb
+from .provenance import (
+    STALE_REASONS, caption_inputs, provenance_row, upsert_provenance, delete_provenance, load_folder_provenance,
+    stale_reasons
+)
+from .run_state import RunState
+from .scheduler import RequestScheduler, Priority
+from .single_flight import SingleFlight
+from .providers import BaseProvider, available_providers, create_provider, served_by
 from ..database import SessionLocal
+from ..logging_config import LogSampler
+from ..static_files import file_version
 from ..models import (
     ModelConfig,
     ProcessingConfig,
     ProcessedItem,
     ProcessingStatus,
+    BatchPlan,
+    BatchPlanRequest,
+    BatchProcessingRequest,
+    BulkExampleResult,
+    ExampleDuplicate,
+    ExampleFailure,
+    ReprocessSelection,
+    ProcessedItemPage,
+    CaptionSearchPage,
+    CaptionSearchResult,
+    CaptionEdit,
+    CoalescingStats,
+    UsageStats,
     ExamplePair, PromptTemplate, DBPromptTemplate, DBExample, DBProcessedItem
 )
 
 logger = logging.getLogger(__name__)
 
+# Example features only need a 64px thumbnail, so JPEGs are decoded at 1/8 scale
+FEATURE_DECODE_SIDE = 64
+# Uploads of a bulk example request decoded and written at the same time
+EXAMPLE_INGEST_CONCURRENCY = 8
+
 
 class CaptionService:
     def __init__(self):
         self._processing = False
-        self._processed_items: List[ProcessedItem] = []
+        # Counters and recent items of the current job, all results are stored in the database
+        self._run = RunState()
+        self._batch_id: Optional[str] = None
         self._current_batch = 0
         self._start_time: Optional[datetime] = None
         self._total_cost = 0.0
-        self._providers = {
-            "openai": OpenAIProvider(),
-            "huggingface": HuggingFaceProvider()
-        }
+        self._usage = UsageStats()
+        self._cost_per_token = 0.0
+        # Job-wide provenance inputs, and the file hash of each captioned image until it is stored
+        self._caption_inputs: Optional[dict] = None
+        self._image_hashes: Dict[str, str] = {}
+        # Decides which per-image debug lines of the current job are written
+        self._log_sample = LogSampler()
+        # Providers are created on first use, see _provider()
+        self._providers: Dict[str, BaseProvider] = {}
         self._processing_task: Optional[asyncio.Task] = None
         self._templates: List[PromptTemplate] = []
         self._db: Session = SessionLocal()
@@ -43,10 +93,103 @@ class CaptionService:
         self._examples_dir = "/data/examples"  # Root data/examples directory
         self._temp_dir = "/app/backend/temp"  # Backend temp directory
         self._current_folder = None
+        # Folders whose caption files are in the id->path index, so a missing id doesn't reindex them again
+        self._reindexed_folders: Set[str] = set()
+        self._example_index = ExampleIndex()
+        self._memory = MemoryBudget()
+        # Shared by the Test panel and batch jobs so interactive requests go first
+        self._scheduler = RequestScheduler()
+        # Identical requests in flight at the same time share one provider call
+        self._single_flight = SingleFlight()
+        # Bumped whenever examples change, so requests built from an older set are not shared
+        self._examples_version = 0
 
     def initialize(self):
         self._examples = self.load_examples()
         self._templates = self.get_prompt_templates()
+        self._build_example_index()
+
+    def _build_example_index(self):
+        """Load stored example features, filling in what examples saved by older versions lack"""
+        self._example_index.clear()
+        with SessionLocal() as db:
+            examples = db.query(DBExample).all()
+            hashes = {example.content_hash for example in examples if example.content_hash}
+            for example in examples:
+                try:
+                    if example.content_hash is None:
+                        content_hash = file_sha256(example.image_path)
+                        # Hashes are unique, copies of an image stored before deduplication keep none
+                        if content_hash not in hashes:
+                            example.content_hash = content_hash
+                            hashes.add(content_hash)
+                    if example.prompt_filename is None:
+                        example.prompt_filename = write_prompt_copy(self._examples_dir, example.filename)
+                except Exception as e:
+                    logger.error(f"Failed to prepare example {example.filename}: {str(e)}")
+                features = deserialize_features(example.features)
+                if features is None:
+                    try:
+                        features = self._image_features(example.image_path)
+                        example.features = serialize_features(features)
+                    except Exception as e:
+                        logger.error(f"Failed to index example {example.filename}: {str(e)}")
+                        continue
+                self._example_index.add(example.id, features)
+            db.commit()
+        logger.info(f"Indexed {len(self._example_index)} examples")
+
+    @staticmethod
+    def _image_features(source: Union[str, BinaryIO]) -> List[float]:
+        with open_image(source, FEATURE_DECODE_SIDE) as image:
+            return compute_features(image)
+
+    async def _select_examples(
+            self,
+            sources: List[Union[str, BinaryIO]],
+            examples: List[ExamplePair],
+            top_k: Optional[int],
+            memory: Optional[MemoryBudget] = None
+    ) -> List[ExamplePair]:
+        """Pick the top_k examples most similar to the images, keeping their original order
+
+        Images are passed as paths or buffers and decoded separately at
+        thumbnail scale, so the instances sent to the provider are untouched.
+        Only JPEGs can decode at that scale, other formats are decoded at full
+        size first and count against `memory` while they are.
+        """
+        if not top_k or top_k >= len(examples) or len(self._example_index) == 0:
+            return examples
+
+        # Similarity is a dot product, so ranking against the mean vector ranks
+        # by the summed similarity over all images of a group
+        vectors = []
+        for source in sources:
+            with open_image(source, FEATURE_DECODE_SIDE) as image:
+                async with memory.reserve(decoded_size(image)) if memory else nullcontext():
+                    vectors.append(await asyncio.to_thread(compute_features, image))
+        features = [sum(values) / len(vectors) for values in zip(*vectors)]
+        selected = set(self._example_index.top_k(features, top_k))
+        return [example for example in examples if example.id in selected]
+
+    def _provider(self, name: str) -> BaseProvider:
+        if name not in self._providers:
+            logger.info(f"Loading {name} provider")
+            self._providers[name] = create_provider(name)
+        return self._providers[name]
+
+    def _get_provider(self, model_config: ModelConfig):
+        """Return the configured provider, routing over the backend pool if one is given"""
+        if model_config.backends:
+            provider = self._provider("router")
+        elif model_config.provider in available_providers():
+            provider = self._provider(model_config.provider)
+        else:
+            logger.error(f"Unsupported provider: {model_config.provider}")
+            raise ValueError(f"Unsupported provider: {model_config.provider}")
+
+        provider.configure(model_config)
+        return provider
 
     def _get_active_template(self):
         """Gets the current active template or falls back to default"""
@@ -78,81 +221,118 @@ class CaptionService:
     async def generate_single_caption(
             self,
             image_file: UploadFile,
-            model_config: Optional[ModelConfig] = None
+            model_config: Optional[ModelConfig] = None,
+            example_top_k: Optional[int] = None
     ) -> str:
-        logger = logging.getLogger(__name__)
-        logger.info("Starting caption generation process")
-
-        # Create temp directory if it doesn't exist
-        try:
-            os.makedirs(self._temp_dir, exist_ok=True)
-            temp_image_path = os.path.join(self._temp_dir, f"temp_{image_file.filename}")
-            logger.info(f"Created temp directory and path: {temp_image_path}")
-        except Exception as e:
-            logger.error(f"Failed to create temp directory: {str(e)}")
-            raise
-
+        started = time.perf_counter()
         try:
-            # Save uploaded image temporarily
-            logger.info("Attempting to save uploaded file")
-            async with aiofiles.open(temp_image_path, 'wb') as out_file:
-                content = await image_file.read()
-                await out_file.write(content)
-            logger.info("Successfully saved uploaded file")
-
-            # Load image using PIL
-            logger.info("Attempting to load image with PIL")
-            image = Image.open(temp_image_path)
-            logger.info("Successfully loaded image with PIL")
-
-            # Get the appropriate provider
-            if model_config.provider not in self._providers:
-                logger.error(f"Unsupported provider: {model_config.provider}")
-                raise ValueError(f"Unsupported provider: {model_config.provider}")
-
-            provider = self._providers[model_config.provider]
-            logger.info(f"Got provider for {model_config.provider}")
-
-            provider.configure(model_config)
-            logger.info("Configured provider")
+            # Decode straight from the upload buffer, the temp directory is not touched
+            content, content_hash = await read_upload(image_file)
+            provider = self._get_provider(model_config)
 
             # Load active template and examples
             active_template = self._get_active_template()
-            logger.info(f"Got active template: {active_template.name if active_template else 'None'}")
-
-            examples = self.load_examples()
-            logger.info(f"Got {len(examples)} examples")
-
-            # Generate caption
-            logger.info("Starting caption generation with provider")
-            caption = await provider.generate_caption(
-                image=image,
-                template=active_template.content if active_template else None,
-                examples=examples
-            )
-            logger.info("Successfully generated caption")
-
+            examples = await self._select_examples([BytesIO(content)], self.load_examples(), example_top_k)
+
+            template = active_template.content if active_template else None
+
+            async def request():
+                usage = UsageStats()
+                with open_image(BytesIO(content), model_config.image_max_side) as image:
+                    async with self._scheduler.slot(Priority.INTERACTIVE):
+                        caption = await provider.generate_caption(
+                            image=image,
+                            template=template,
+                            examples=examples,
+                            usage=usage
+                        )
+                # The request runs in its own task, so the backend is handed back explicitly. Usage
+                # goes with it, a caller that shared the request logs the tokens the leader spent.
+                return caption, served_by.get(), usage
+
+            key = self._request_key((content_hash,), template, examples, self._model_key(model_config))
+            (caption, backend, usage), shared = await self._single_flight.do(key, request)
+            served_by.set(backend)
+            logger.info("Generated caption", extra={
+                "provider": model_config.provider,
+                "model": model_config.model,
+                "bytes": len(content),
+                "examples": len(examples),
+                "template": active_template.name if active_template else None,
+                "shared": shared,
+                "prompt_tokens": usage.prompt_tokens,
+                "cached_tokens": usage.cached_tokens,
+                "passthrough": bool(usage.passthrough_images),
+                "seconds": round(time.perf_counter() - started, 3)
+            })
             return caption
         except Exception as e:
-            logger.error(f"Caption generation failed: {str(e)}")
-            logger.error(f"Error type: {type(e)}")
-            logger.error(f"Error details: {str(e)}", exc_info=True)  # This will log the full traceback
+            logger.exception(f"Caption generation failed: {str(e)}")
             raise RuntimeError(f"Caption generation failed: {str(e)}")
-        finally:
-            # Cleanup
-            try:
-                if os.path.exists(temp_image_path):
-                    os.remove(temp_image_path)
-                    logger.info("Cleaned up temporary file")
-            except Exception as e:
-                logger.error(f"Failed to clean up temporary file: {str(e)}")
+
+    async def stream_single_caption(
+            self,
+            content: bytes,
+            model_config: ModelConfig,
+            example_top_k: Optional[int] = None
+    ) -> AsyncIterator[Tuple[str, dict]]:
+        """Caption an uploaded image, yielding ("token", ...) events as the provider streams.
+
+        The last event is ("done", ...) with the whole caption and its usage,
+        or ("error", ...). Streamed requests are not coalesced, each client
+        gets its own tokens.
+        """
+        started = time.perf_counter()
+        first_token: Optional[float] = None
+        try:
+            provider = self._get_provider(model_config)
+            active_template = self._get_active_template()
+            examples = await self._select_examples([BytesIO(content)], self.load_examples(), example_top_k)
+            usage = UsageStats()
+
+            parts = []
+            with open_image(BytesIO(content), model_config.image_max_side) as image:
+                async with self._scheduler.slot(Priority.INTERACTIVE):
+                    async for text in provider.stream_caption(
+                            image=image,
+                            template=active_template.content if active_template else None,
+                            examples=examples,
+                            usage=usage
+                    ):
+                        if first_token is None:
+                            first_token = time.perf_counter() - started
+                        parts.append(text)
+                        yield "token", {"text": text}
+
+            caption = "".join(parts).strip()
+            seconds = time.perf_counter() - started
+            logger.info("Streamed caption", extra={
+                "provider": model_config.provider,
+                "model": model_config.model,
+                "bytes": len(content),
+                "examples": len(examples),
+                "prompt_tokens": usage.prompt_tokens,
+                "cached_tokens": usage.cached_tokens,
+                "first_token_seconds": round(first_token, 3) if first_token is not None else None,
+                "seconds": round(seconds, 3)
+            })
+            yield "done", {
+                "caption": caption,
+                "usage": usage.model_dump(),
+                "backend": served_by.get(),
+                "firstTokenSeconds": round(first_token, 3) if first_token is not None else None,
+                "seconds": round(seconds, 3)
+            }
+        except Exception as e:
+            logger.exception(f"Caption streaming failed: {str(e)}")
+            yield "error", {"detail": f"Caption generation failed: {str(e)}"}
 
     async def start_batch_processing(
             self,
             folder_path: str,
             model_config: ModelConfig,
             processing_config: Optional[ProcessingConfig] = None,
-            reprocess: bool = False
+            reprocess: Union[bool, str] = False
     ):
         """Start batch processing with validation and pre-processing."""
         if self._processing:
@@ -162,27 +342,18 @@ class CaptionService:
         if not os.path.exists(folder_path):
             raise RuntimeError(f"Folder not found: {folder_path}")
 
-        logger.info(f"Starting batch processing with reprocess={reprocess}")
-        logger.info(f"Processing folder: {folder_path}")
-
-        # Get list of image files
-        image_files = []
-        if reprocess:
-            image_files = [
-                f for f in os.listdir(folder_path)
-                if f.lower().endswith(('.png', '.jpg', '.jpeg', '.gif', '.webp'))
-            ]
-            logger.info(f"Reprocess mode: Found {len(image_files)} total images")
-        else:
-            image_files = [
-                f for f in os.listdir(folder_path)
-                if f.lower().endswith(('.png', '.jpg', '.jpeg', '.gif', '.webp'))
-                   and not os.path.exists(os.path.splitext(os.path.join(folder_path, f))[0] + '.txt')
-            ]
-            logger.info(f"Normal mode: Found {len(image_files)} uncaptioned images")
+        processing_config = processing_config or ProcessingConfig()
+        image_files, selection = await asyncio.to_thread(
+            self.select_images, folder_path, reprocess, model_config, processing_config
+        )
+        logger.info(f"Starting batch processing of {folder_path} with reprocess={reprocess}: "
+                    f"{selection.imageCount} of {selection.totalImages} images")
 
         if not image_files:
-            error_msg = "No images found to process" if reprocess else "No uncaptioned images found"
+            if reprocess == "stale":
+                error_msg = "No uncaptioned or stale images found"
+            else:
+                error_msg = "No images found to process" if reprocess else "No uncaptioned images found"
             logger.error(error_msg)
             raise RuntimeError(error_msg)
 
@@ -191,18 +362,86 @@ class CaptionService:
         self._processing = True
         self._start_time = datetime.now()
         self._current_batch = 0
-        self._processed_items = []
+        self._run = RunState(total=len(image_files))
+        self._batch_id = str(uuid.uuid4())
         self._total_cost = 0.0
+        self._usage = UsageStats()
+        self._cost_per_token = model_config.cost_per_token
+        # Request slots follow the job's settings, interactive requests leave them alone
+        self._scheduler.configure(model_config.max_concurrent_requests, model_config.interactive_reserved_requests)
 
         # Start the processing task
         self._processing_task = asyncio.create_task(
             self._process_batch(
                 folder_path,
+                image_files,
                 model_config,
-                processing_config or ProcessingConfig()
+                processing_config
             )
         )
 
+    def select_images(
+            self,
+            folder_path: str,
+            reprocess: Union[bool, str],
+            model_config: ModelConfig,
+            processing_config: ProcessingConfig
+    ) -> Tuple[List[str], ReprocessSelection]:
+        """Return the image filenames a batch job would caption, and why.
+
+        In "stale" mode a caption is redone when its recorded provenance no
+        longer matches the current template, examples, model, temperature
+        or image file. Captions without provenance are kept.
+        """
+        started = time.perf_counter()
+        uncaptioned, captioned = scan_folder(folder_path)
+        reasons = dict.fromkeys(STALE_REASONS, 0)
+        stale, unknown = [], 0
+        if reprocess == "stale" and captioned:
+            active_template = self._get_active_template()
+            inputs = caption_inputs(active_template.content if active_template else None, self.load_examples(),
+                                    processing_config.example_top_k, model_config)
+            with SessionLocal() as db:
+                provenance = load_folder_provenance(db, folder_path)
+            for filename in captioned:
+                image_path = os.path.normpath(os.path.join(folder_path, filename))
+                row = provenance.get(image_path)
+                if row is None:
+                    unknown += 1
+                    continue
+                changed = stale_reasons(row, inputs, image_path)
+                if changed:
+                    stale.append(filename)
+                    for reason in changed:
+                        reasons[reason] += 1
+
+        if reprocess is True:
+            image_files = uncaptioned + captioned
+        else:
+            image_files = uncaptioned + stale
+        selection = ReprocessSelection(
+            imageCount=len(image_files),
+            totalImages=len(uncaptioned) + len(captioned),
+            uncaptioned=len(uncaptioned),
+            stale=len(stale),
+            current=len(captioned) - len(stale) - unknown if reprocess is not True else 0,
+            unknownProvenance=unknown,
+            staleReasons=reasons,
+            scanSeconds=round(time.perf_counter() - started, 3)
+        )
+        return image_files, selection
+
+    def preview_batch(self, request: BatchProcessingRequest) -> ReprocessSelection:
+        """Dry run of a batch job: count the images it would caption without sending requests"""
+        if not os.path.isdir(request.folder_path):
+            raise ValueError(f"Folder not found: {request.folder_path}")
+        _, selection = self.select_images(request.folder_path, request.reprocess, request.model_settings,
+                                          request.processing_settings or ProcessingConfig())
+        logger.info(f"Dry run of {request.folder_path} with reprocess={request.reprocess}: "
+                    f"{selection.imageCount} of {selection.totalImages} images "
+                    f"({selection.uncaptioned} uncaptioned, {selection.stale} stale)")
+        return selection
+
     async def get_folder_contents(self, folder_path: str) -> dict:
         """Get contents of a folder with caption status"""
         try:
@@ -227,12 +466,16 @@ class CaptionService:
                 if os.path.exists(caption_path):
                     with open(caption_path, 'r') as f:
                         caption_content = f.read().strip()
+                    stat_result = os.stat(image_path)
                     folder_stats['captioned'] += 1
                     folder_stats['files'].append({
                         'filename': image_file,
                         'image': image_path,
                         'caption': caption_content,
-                        'has_caption': True
+                        'has_caption': True,
+                        'last_modified': int(stat_result.st_mtime * 1000),
+                        # Lets the gallery request a URL that is cached until the file changes
+                        'version': file_version(stat_result)
                     })
                 else:
                     folder_stats['uncaptioned'] += 1
@@ -243,20 +486,32 @@ class CaptionService:
             logger.error(f"Error reading folder contents: {str(e)}")
             raise
 
-    async def _process_batch(self, folder_path: str, model_config: ModelConfig, processing_config: ProcessingConfig):
+    async def _process_batch(self, folder_path: str, image_files: List[str], model_config: ModelConfig,
+                             processing_config: ProcessingConfig):
         """Process a batch of images with error handling."""
         try:
-            provider = self._providers[model_config.provider]
-            provider.configure(model_config)
+            provider = self._get_provider(model_config)
 
-            # Get list of image files that don't have captions yet
-            image_files = [
-                f for f in os.listdir(folder_path)
-                if f.lower().endswith(('.png', '.jpg', '.jpeg', '.gif', '.webp'))
-            ]
+            # Template and examples are fixed for the whole job so every request
+            # shares the same prompt prefix
+            active_template = self._get_active_template()
+            template = active_template.content if active_template else None
+            examples = self.load_examples()
+            limit_mb = processing_config.memory_limit_mb
+            self._memory = MemoryBudget(limit_mb * 1024 * 1024 if limit_mb else None)
+            max_side = model_config.image_max_side
+            model_key = self._model_key(model_config)
+            self._caption_inputs = caption_inputs(template, examples, processing_config.example_top_k, model_config)
+            self._image_hashes = {}
+
+            self._run.total = len(image_files)
+            self._log_sample = LogSampler(processing_config.log_sample_rate)
+            if processing_config.prescan:
+                image_files = await self._prescan(folder_path, image_files, processing_config)
 
             total_images = len(image_files)
-            logger.info(f"Found {total_images} images without captions")
+            if not total_images:
+                return
 
             # Process in batches
             batch_size = min(processing_config.batch_size, total_images)
@@ -275,90 +530,464 @@ class CaptionService:
                 # Process batch with concurrency control
                 tasks = []
                 sem = asyncio.Semaphore(processing_config.concurrent_processing)
+                completed: List[ProcessedItem] = []
 
-                async def process_with_semaphore(filepath):
+                async def process_with_semaphore(filepaths, completed):
                     async with sem:
-                        return await self._process_single_image(filepath, provider)
-
-                for filename in batch:
-                    filepath = os.path.join(folder_path, filename)
-                    task = asyncio.create_task(process_with_semaphore(filepath))
+                        items = await self._process_image_group(
+                            filepaths, provider, template, examples, processing_config.example_top_k, max_side,
+                            model_key
+                        )
+                    # Live progress follows every request, the database insert waits for the batch
+                    self._run.record(items)
+                    completed.extend(item for item in items if isinstance(item, ProcessedItem))
+                    return items
+
+                # Group images that share one request when multi-image mode is enabled
+                group_size = max(1, processing_config.images_per_request)
+                for j in range(0, len(batch), group_size):
+                    filepaths = [os.path.join(folder_path, filename) for filename in batch[j:j + group_size]]
+                    task = asyncio.create_task(process_with_semaphore(filepaths, completed))
                     tasks.append(task)
 
-                # Wait for all tasks in this batch
-                results = await asyncio.gather(*tasks, return_exceptions=True)
-
-                # Handle results
-                for result in results:
-                    if isinstance(result, Exception):
-                        logger.error(f"Error processing file: {str(result)}")
-                        if processing_config.error_handling == "stop":
-                            raise result
-                    elif isinstance(result, ProcessedItem):
-                        self._processed_items.append(result)
+                try:
+                    # Wait for all tasks in this batch
+                    results = await asyncio.gather(*tasks, return_exceptions=True)
+                    for result in results:
+                        if isinstance(result, Exception):
+                            logger.error(f"Error processing file: {str(result)}")
+                            if processing_config.error_handling == "stop":
+                                raise result
+                finally:
+                    # Items that finished are stored even when the batch is stopped or cancelled
+                    # part way, shielded so the insert isn't abandoned by a second cancel
+                    await asyncio.shield(self._record_items(completed))
+                rate = self._run.items_per_minute
+                logger.info(f"Batch {self._current_batch} done: {self._run.processed}/{self._run.total} images",
+                            extra={
+                                "batch_id": self._batch_id,
+                                "batch": self._current_batch,
+                                "images": len(batch),
+                                "processed": self._run.processed,
+                                "errors": self._run.errors,
+                                "total": self._run.total,
+                                "items_per_minute": round(rate, 1) if rate is not None else None,
+                                "prompt_tokens": self._usage.prompt_tokens,
+                                "completion_tokens": self._usage.completion_tokens
+                            })
 
         except Exception as e:
             logger.error(f"Batch processing error: {str(e)}")
             raise
         finally:
             self._processing = False
-            logger.info("Batch processing completed")
+            logger.info(f"Batch processing completed: {self._usage.requests} requests, "
+                        f"{self._usage.prompt_tokens} prompt tokens "
+                        f"({self._usage.cached_tokens} cached), "
+                        f"{self._usage.completion_tokens} completion tokens, "
+                        f"{self._usage.passthrough_images} images passed through without re-encoding, "
+                        f"peak {self._memory.peak / (1024 * 1024):.0f} MB decoded images in flight, "
+                        f"peak RSS {peak_rss_mb() or 0:.0f} MB")
+
+    async def _prescan(self, folder_path: str, image_files: List[str],
+                       processing_config: ProcessingConfig) -> List[str]:
+        """Validate the images before any request is sent, returning the valid ones.
+
+        Rejected images are recorded as errors with the reason, and moved to
+        the folder's quarantine directory if configured.
+        """
+        started = time.perf_counter()
+        reasons = await scan_images(
+            [os.path.join(folder_path, filename) for filename in image_files],
+            processing_config.max_file_mb * 1024 * 1024,
+            processing_config.max_megapixels * 1_000_000,
+            processing_config.allow_animated
+        )
 
-    async def _process_single_image(self, image_path: str, provider) -> ProcessedItem:
+        valid, rejected = [], []
+        for filename, reason in zip(image_files, reasons):
+            if reason is None:
+                valid.append(filename)
+                continue
+            image_path = os.path.join(folder_path, filename)
+            action = "Skipped"
+            if processing_config.invalid_images == "quarantine":
+                try:
+                    image_path = await asyncio.to_thread(quarantine_image, image_path, reason)
+                    action = "Quarantined"
+                except OSError as e:
+                    logger.error(f"Failed to quarantine {filename}: {str(e)}")
+            rejected.append(self._error_item(image_path, ValueError(f"{action} by pre-scan: {reason}")))
+
+        self._run.record(rejected)
+        await self._record_items(rejected)
+        logger.info(f"Pre-scan of {len(image_files)} images took {time.perf_counter() - started:.1f}s, "
+                    f"{len(rejected)} rejected")
+        return valid
+
+    async def _record_items(self, items: List[ProcessedItem]):
+        """Store the results of a batch with one multi-row insert"""
+        if not items:
+            return
+        image_hashes = {}
+        for item in items:
+            image_hash = self._image_hashes.pop(item.image, None)
+            if image_hash and item.status == "success":
+                image_hashes[item.image] = image_hash
         try:
-            # Generate caption
-            filename = os.path.basename(image_path)
-            item_id = self._get_item_id(filename)
-            image = Image.open(image_path)
-            logger.info(f"Processing image {os.path.basename(image_path)} with mode {image.mode}")
-
-            # Convert RGBA images to RGB with white background
-            if image.mode in ('RGBA', 'LA'):
-                logger.info(f"Converting image from {image.mode} to RGB")
-                background = Image.new('RGB', image.size, (255, 255, 255))
-                if image.mode == 'RGBA':
-                    background.paste(image, mask=image.split()[3])  # Use alpha channel as mask
-                else:
-                    background.paste(image, mask=image.split()[1])  # Use alpha channel as mask
-                image = background
-            elif image.mode != 'RGB':
-                logger.info(f"Converting image from {image.mode} to RGB")
-                image = image.convert('RGB')
+            await asyncio.to_thread(self._insert_items, self._batch_id, items, self._caption_inputs, image_hashes)
+        except Exception as e:
+            logger.error(f"Failed to store {len(items)} processed items: {str(e)}")
+
+    @staticmethod
+    def _insert_items(batch_id: str, items: List[ProcessedItem], inputs: Optional[dict] = None,
+                      image_hashes: Optional[Dict[str, str]] = None):
+        """Insert the results and, for generated captions, the inputs that produced them"""
+        provenance = []
+        for image_path, image_hash in (image_hashes or {}).items():
+            try:
+                provenance.append(provenance_row(image_path, inputs, image_hash, batch_id))
+            except OSError:
+                continue  # moved or deleted since it was captioned
+        rows = [{
+            "id": str(uuid.uuid4()),
+            "item_id": item.id,
+            "filename": item.filename,
+            "image_path": os.path.normpath(item.image),
+            "caption": item.caption,
+            "status": item.status,
+            "error_message": item.error_message,
+            "created_at": item.timestamp,
+            "batch_id": batch_id,
+            "backend": item.backend
+        } for item in items]
+        with SessionLocal() as db:
+            db.execute(insert(DBProcessedItem), rows)
+            upsert_captions(db, [(item.image, item.caption) for item in items if item.status == "success"])
+            upsert_provenance(db, provenance)
+            db.commit()
 
-            logger.info(f"Image converted to mode {image.mode}")
+    @staticmethod
+    def _to_processed_item(db_item: DBProcessedItem) -> ProcessedItem:
+        return ProcessedItem(
+            id=db_item.item_id,
+            filename=db_item.filename,
+            image=db_item.image_path,
+            caption=db_item.caption or "",
+            timestamp=db_item.created_at,
+            status=db_item.status,
+            error_message=db_item.error_message,
+            backend=db_item.backend
+        )
 
-            active_template = self._get_active_template()
-            examples = self.load_examples()
-            caption = await provider.generate_caption(
-                image=image,
-                template=active_template.content if active_template else None,
-                examples=examples
+    def get_processed_items(
+            self,
+            batch_id: Optional[str] = None,
+            status: Optional[str] = None,
+            filename: Optional[str] = None,
+            page: int = 1,
+            page_size: int = 50
+    ) -> ProcessedItemPage:
+        """Page through stored processed items, newest first"""
+        page = max(1, page)
+        page_size = max(1, min(page_size, 500))
+        with SessionLocal() as db:
+            query = db.query(DBProcessedItem)
+            if batch_id:
+                query = query.filter(DBProcessedItem.batch_id == batch_id)
+            if status:
+                query = query.filter(DBProcessedItem.status == status)
+            if filename:
+                query = query.filter(DBProcessedItem.filename == filename)
+            total = query.count()
+            rows = (query.order_by(DBProcessedItem.created_at.desc())
+                    .offset((page - 1) * page_size)
+                    .limit(page_size)
+                    .all())
+            return ProcessedItemPage(
+                items=[self._to_processed_item(row) for row in rows],
+                total=total,
+                page=page,
+                pageSize=page_size
             )
 
-            # Save caption to a txt file next to the image
-            caption_path = os.path.splitext(image_path)[0] + '.txt'
-            async with aiofiles.open(caption_path, 'w') as f:
-                await f.write(caption)
+    def search_captions(
+            self,
+            query: str,
+            folder: Optional[str] = None,
+            page: int = 1,
+            page_size: int = 50
+    ) -> CaptionSearchPage:
+        """Search the current captions of all processed images, best matches first"""
+        page = max(1, page)
+        page_size = max(1, min(page_size, 500))
+        with SessionLocal() as db:
+            rows, total = search_captions(db, query, folder, (page - 1) * page_size, page_size)
+            items = [CaptionSearchResult(
+                id=self._get_item_id(row.filename),
+                filename=row.filename,
+                image=row.image_path,
+                caption=row.caption,
+                timestamp=row.updated_at,
+                rank=rank
+            ) for row, rank in rows]
+        return CaptionSearchPage(query=query, items=items, total=total, page=page, pageSize=page_size)
+
+    def reindex_captions(self, folder_path: str) -> int:
+        """Index the caption files of a folder, e.g. ones written before search existed or edited by hand"""
+        if not os.path.isdir(folder_path):
+            raise ValueError(f"Folder not found: {folder_path}")
+        captions = read_folder_captions(folder_path)
+        with SessionLocal() as db:
+            upsert_captions(db, captions)
+            db.commit()
+        self._reindexed_folders.add(os.path.normpath(folder_path))
+        logger.info(f"Indexed {len(captions)} captions from {folder_path}")
+        return len(captions)
+
+    @staticmethod
+    def _load_image(image_path: str, max_side: Optional[int] = None) -> Image.Image:
+        """Open an image, only its header is read until the pixels are needed.
+
+        Conversion happens when the provider encodes the image, so images
+        that are already compliant can be uploaded without decoding them.
+        Callers own the returned image and must close it.
+        """
+        return open_image(image_path, max_side)
+
+    @staticmethod
+    async def _write_caption_file(image_path: str, caption: str):
+        caption_path = os.path.splitext(image_path)[0] + '.txt'
+        async with aiofiles.open(caption_path, 'w') as f:
+            await f.write(caption)
+
+    @staticmethod
+    async def _stage_caption_file(image_path: str, caption: str, staged: List[Tuple[str, str]]):
+        """Write a caption next to its final path, recording (temporary, final) before anything is written"""
+        caption_path = os.path.splitext(image_path)[0] + '.txt'
+        tmp_path = f"{caption_path}.{uuid.uuid4().hex}.tmp"
+        staged.append((tmp_path, caption_path))
+        async with aiofiles.open(tmp_path, 'w') as f:
+            await f.write(caption)
+
+    async def _save_caption(self, image_path: str, caption: str) -> ProcessedItem:
+        """Save caption to a txt file next to the image"""
+        await self._write_caption_file(image_path, caption)
+        if self._log_sample() and logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Captioned image", extra={
+                "batch_id": self._batch_id,
+                "image": os.path.basename(image_path),
+                "backend": served_by.get(),
+                "caption_chars": len(caption)
+            })
+
+        return ProcessedItem(
+            id=self._get_item_id(os.path.basename(image_path)),
+            filename=os.path.basename(image_path),
+            image=image_path,
+            caption=caption,
+            timestamp=datetime.now(),
+            status="success",
+            backend=served_by.get()
+        )
 
-            return ProcessedItem(
-                id=item_id,
-                filename=os.path.basename(image_path),
-                image=image_path,
-                caption=caption,
-                timestamp=datetime.now(),
-                status="success"
-            )
+    def _error_item(self, image_path: str, error: Exception) -> ProcessedItem:
+        logger.error(f"Error processing {image_path}: {str(error)}",
+                     extra={"batch_id": self._batch_id, "image": os.path.basename(image_path)})
+        return ProcessedItem(
+            id=self._get_item_id(os.path.basename(image_path)),
+            filename=os.path.basename(image_path),
+            image=image_path,
+            caption="",
+            timestamp=datetime.now(),
+            status="error",
+            error_message=str(error)
+        )
+
+    async def _process_single_image(
+            self,
+            image_path: str,
+            provider,
+            template: Optional[str],
+            examples: List[ExamplePair],
+            example_top_k: Optional[int] = None,
+            max_side: Optional[int] = None,
+            model_key: tuple = ()
+    ) -> ProcessedItem:
+        try:
+            selected_examples = await self._select_examples([image_path], examples, example_top_k, self._memory)
+            usage = self._usage
+
+            async def request():
+                with self._load_image(image_path, max_side) as image:
+                    async with self._scheduler.slot(Priority.BATCH), self._memory.reserve(decoded_size(image)):
+                        caption = await provider.generate_caption(
+                            image=image,
+                            template=template,
+                            examples=selected_examples,
+                            usage=usage
+                        )
+                return caption, served_by.get()
+
+            image_hash = await asyncio.to_thread(file_sha256, image_path)
+            key = self._request_key((image_hash,), template, selected_examples, model_key)
+            (caption, backend), _ = await self._single_flight.do(key, request)
+            served_by.set(backend)
+            self._total_cost = self._usage.total_tokens * self._cost_per_token / 1000  # cost is per 1K tokens
+            self._image_hashes[image_path] = image_hash
+
+            return await self._save_caption(image_path, caption)
         except Exception as e:
-            logger.error(f"Error processing {image_path}: {str(e)}")
-            return ProcessedItem(
-                id=item_id,
-                filename=os.path.basename(image_path),
-                image=image_path,
-                caption="",
-                timestamp=datetime.now(),
-                status="error",
-                error_message=str(e)
-            )
+            return self._error_item(image_path, e)
+
+    async def _process_image_group(
+            self,
+            image_paths: List[str],
+            provider,
+            template: Optional[str],
+            examples: List[ExamplePair],
+            example_top_k: Optional[int] = None,
+            max_side: Optional[int] = None,
+            model_key: tuple = ()
+    ) -> List[ProcessedItem]:
+        """Caption several images with one provider request.
+
+        Images the request returns no caption for, or all of them if it
+        fails, are captioned again one at a time once the group's scheduler
+        slot and memory are released, each through its own slot.
+        """
+        if len(image_paths) == 1:
+            return [await self._process_single_image(
+                image_paths[0], provider, template, examples, example_top_k, max_side, model_key
+            )]
+
+        items = []
+        with ExitStack() as stack:
+            loaded = []
+            for image_path in image_paths:
+                try:
+                    loaded.append((image_path, stack.enter_context(self._load_image(image_path, max_side))))
+                except Exception as e:
+                    items.append(self._error_item(image_path, e))
+            if not loaded:
+                return items
+
+            paths = [image_path for image_path, _ in loaded]
+            images = [image for _, image in loaded]
+            try:
+                selected_examples = await self._select_examples(paths, examples, example_top_k, self._memory)
+                usage = self._usage
+
+                async def request():
+                    async with self._scheduler.slot(Priority.BATCH), \
+                            self._memory.reserve(sum(decoded_size(image) for image in images)):
+                        captions = await provider.generate_captions(
+                            images=images,
+                            template=template,
+                            examples=selected_examples,
+                            usage=usage
+                        )
+                    return captions, served_by.get()
+
+                image_hashes = tuple([await asyncio.to_thread(file_sha256, path) for path in paths])
+                key = self._request_key(image_hashes, template, selected_examples, model_key)
+                (captions, backend), _ = await self._single_flight.do(key, request)
+                served_by.set(backend)
+                self._total_cost = self._usage.total_tokens * self._cost_per_token / 1000  # cost is per 1K tokens
+                self._image_hashes.update(zip(paths, image_hashes))
+            except Exception as e:
+                logger.warning(f"Multi-image request failed: {str(e)}")
+                captions = [e] * len(paths)
+
+        retry = []
+        for image_path, caption in zip(paths, captions):
+            if isinstance(caption, Exception):
+                retry.append(image_path)
+                continue
+            try:
+                items.append(await self._save_caption(image_path, caption))
+            except Exception as e:
+                items.append(self._error_item(image_path, e))
+
+        if retry:
+            logger.warning(f"Falling back to single-image requests for {len(retry)} of {len(paths)} images")
+            results = await asyncio.gather(*[
+                self._process_single_image(image_path, provider, template, examples, example_top_k, max_side,
+                                           model_key)
+                for image_path in retry
+            ], return_exceptions=True)
+            for image_path, result in zip(retry, results):
+                if isinstance(result, asyncio.CancelledError):
+                    raise result
+                items.append(self._error_item(image_path, result) if isinstance(result, BaseException) else result)
+        return items
+
+    @staticmethod
+    def _model_key(model_config: ModelConfig) -> tuple:
+        """The parts of a model config that decide what a provider returns"""
+        backends = tuple((backend.model, backend.base_url) for backend in model_config.backends or [])
+        return (model_config.provider, model_config.model, model_config.base_url, model_config.temperature,
+                model_config.image_max_side, model_config.image_max_bytes, model_config.image_quality, backends)
+
+    def _request_key(self, image_hashes: Tuple[str, ...], template: Optional[str],
+                     examples: List[ExamplePair], model_key: tuple) -> tuple:
+        """Identical keys produce the same request, so concurrent ones can share a single call"""
+        example_ids = tuple(example.id for example in examples)
+        return image_hashes, template, self._examples_version, example_ids, model_key
+
+    def plan_batch(self, request: BatchPlanRequest) -> BatchPlan:
+        """Estimate tokens, cost and duration of a batch job from image headers, without sending requests"""
+        if not os.path.isdir(request.folder_path):
+            raise ValueError(f"Folder not found: {request.folder_path}")
+        model_config = request.model_settings
+        processing_config = request.processing_settings or ProcessingConfig()
+
+        started = time.perf_counter()
+        filenames, _ = self.select_images(request.folder_path, request.reprocess, model_config, processing_config)
+        sizes, unreadable = read_image_sizes([os.path.join(request.folder_path, name) for name in filenames])
+        examples = []
+        for example in self.load_examples():
+            example_sizes, _ = read_image_sizes([
+                os.path.join(self._examples_dir, example.prompt_filename or example.filename)
+            ])
+            if example_sizes:
+                examples.append((example, example_sizes[0]))
+        scan_seconds = time.perf_counter() - started
+
+        # Fill in assumptions from what earlier requests measured, without creating a provider
+        provider = self._providers.get("router" if model_config.backends else model_config.provider)
+        observed_latency = getattr(provider, "observed_latency", None)
+        latency = request.request_latency_seconds or (
+            observed_latency(max(1, processing_config.images_per_request)) if observed_latency else None
+        ) or DEFAULT_REQUEST_LATENCY
+        completion_tokens = request.completion_tokens_per_image or (
+            round(self._usage.completion_tokens / self._run.processed)
+            if self._usage.completion_tokens and self._run.processed else DEFAULT_COMPLETION_TOKENS
+        )
+        requests_per_minute = request.requests_per_minute or getattr(provider, "limit_requests", None)
+
+        active_template = self._get_active_template()
+        plan = plan_batch(
+            sizes,
+            model_config,
+            processing_config,
+            active_template.content if active_template else None,
+            examples,
+            latency,
+            completion_tokens,
+            requests_per_minute,
+            request.tokens_per_minute
+        )
+        plan.unreadableCount = unreadable
+        plan.scanSeconds = round(scan_seconds, 3)
+        logger.info(f"Planned {plan.imageCount} images in {plan.scanSeconds}s: {plan.requestCount} requests, "
+                    f"{plan.totalTokens} tokens, ${plan.estimatedCost:.2f}, "
+                    f"{plan.estimatedDurationSeconds / 60:.1f} min ({plan.limitedBy} bound)")
+        return plan
+
+    def get_coalescing_stats(self) -> CoalescingStats:
+        stats = self._single_flight.stats()
+        return CoalescingStats(leaders=stats["leaders"], coalesced=stats["coalesced"], inFlight=stats["in_flight"])
 
     def stop_batch_processing(self):
         self._processing = False
@@ -381,43 +1010,22 @@ class CaptionService:
                     totalCost=0.0
                 )
 
-            total_count = len([
-                f for f in os.listdir(self._current_folder)
-                if f.lower().endswith(('.png', '.jpg', '.jpeg', '.gif', '.webp'))
-            ]) if self._processing else 0
-
-            processed_count = len(self._processed_items)
-
-            # Calculate processing speed if applicable
-            processing_speed = None
-            if self._start_time and processed_count > 0:
-                elapsed_time = (datetime.now() - self._start_time).total_seconds() / 60  # minutes
-                processing_speed = processed_count / elapsed_time if elapsed_time > 0 else 0
-
-            # Estimate completion time
-            estimated_completion = None
-            if processing_speed and processing_speed > 0 and total_count > processed_count:
-                remaining_items = total_count - processed_count
-                remaining_minutes = remaining_items / processing_speed
-                estimated_completion = datetime.now() + timedelta(minutes=remaining_minutes)
-
-            # Filter out any invalid items
-            valid_items = [
-                item for item in self._processed_items
-                if isinstance(item, ProcessedItem)
-            ]
-
+            run = self._run
             return ProcessingStatus(
                 isProcessing=self._processing,
-                processedCount=processed_count,
-                totalCount=total_count,
+                processedCount=run.processed,
+                totalCount=run.total,
                 currentBatch=self._current_batch,
-                items=valid_items,
-                errorCount=sum(1 for item in valid_items if item.status == "error"),
+                items=run.recent(),
+                errorCount=run.errors,
                 startTime=self._start_time,
-                estimatedCompletion=estimated_completion,
-                processingSpeed=processing_speed,
-                totalCost=self._total_cost
+                estimatedCompletion=run.estimated_completion() if self._processing else None,
+                processingSpeed=run.items_per_minute,
+                totalCost=self._total_cost,
+                usage=self._usage,
+                peakRssMb=peak_rss_mb(),
+                peakImageMemoryMb=self._memory.peak / (1024 * 1024),
+                batchId=self._batch_id
             )
         except Exception as e:
             logger.error(f"Error getting processing status: {str(e)}")
@@ -442,60 +1050,156 @@ class CaptionService:
     def resume_processing(self):
         """Resume paused processing"""
         self._paused = False
+        self._run.restart_clock()
 
     async def save_example(self, image: UploadFile, caption: str) -> ExamplePair:
-        try:
-            # Generate unique filename with timestamp
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            filename = f"{timestamp}_{image.filename}"
-            filepath = os.path.join(self._examples_dir, filename)
-            caption_path = os.path.splitext(filepath)[0] + '.txt'
-
-            # Save image
-            async with aiofiles.open(filepath, 'wb') as out_file:
-                content = await image.read()
-                await out_file.write(content)
-
-            # Save caption
-            async with aiofiles.open(caption_path, 'w') as out_file:
-                await out_file.write(caption)
-
-            # Create database entry
+        """Store one example pair, returning the existing example if the image already is one"""
+        result = await self.save_examples([(image, caption)])
+        if result.added:
+            return result.added[0]
+        if result.duplicates:
+            existing_id = result.duplicates[0].existingId
+            return next(example for example in self.load_examples() if example.id == existing_id)
+        raise RuntimeError(f"Failed to save example: {result.failed[0].error}")
+
+    async def save_examples(self, uploads: List[Tuple[UploadFile, str]]) -> BulkExampleResult:
+        """Store many example pairs concurrently, skipping images that already are examples.
+
+        Each upload is hashed while it is read. New images are decoded once to
+        write their prompt copy and similarity features, then every new
+        example is inserted with one commit.
+        """
+        with SessionLocal() as db:
+            known = dict(db.query(DBExample.content_hash, DBExample.id).filter(DBExample.content_hash.isnot(None)))
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        semaphore = asyncio.Semaphore(EXAMPLE_INGEST_CONCURRENCY)
+        claimed = set()  # content hashes being added by this request
+        repeated: List[Tuple[str, str]] = []  # (filename, content hash) repeated within this request
+        duplicates: List[ExampleDuplicate] = []
+        failed: List[ExampleFailure] = []
+
+        async def ingest(upload: UploadFile, caption: str):
+            name = os.path.basename(upload.filename or "example")
+            async with semaphore:
+                try:
+                    content, content_hash = await read_upload(upload)
+                    if content_hash in known:
+                        duplicates.append(ExampleDuplicate(filename=name, existingId=known[content_hash]))
+                        return None
+                    if content_hash in claimed:
+                        repeated.append((name, content_hash))
+                        return None
+                    claimed.add(content_hash)
+                    filename = f"{timestamp}_{content_hash[:8]}_{name}"
+                    prompt_filename, features = await asyncio.to_thread(
+                        write_example_files, self._examples_dir, filename, content, caption
+                    )
+                except Exception as e:
+                    logger.error(f"Failed to save example {name}: {str(e)}")
+                    failed.append(ExampleFailure(filename=name, error=str(e)))
+                    return None
+            return name, dict(
+                filename=filename,
+                image_path=os.path.join(self._examples_dir, filename),
+                caption=caption,
+                features=serialize_features(features) if features else None,
+                content_hash=content_hash,
+                prompt_filename=prompt_filename
+            ), features
+
+        results = [result for result in await asyncio.gather(*[
+            ingest(upload, caption) for upload, caption in uploads
+        ]) if result is not None]
+
+        added = []
+        added_ids: Dict[str, int] = {}
+        if results:
             with SessionLocal() as db:
-                db_example = DBExample(
-                    filename=filename,
-                    image_path=filepath,  # Store the full filepath
-                    caption=caption
-                )
-                db.add(db_example)
+                try:
+                    rows = self._insert_examples(db, [values for _, values, _ in results])
+                except Exception as e:
+                    db.rollback()
+                    for _, values, _ in results:
+                        self._remove_example_files(values["filename"], values["prompt_filename"])
+                    raise RuntimeError(f"Failed to save examples: {str(e)}")
+
+                for name, values, features in results:
+                    content_hash = values["content_hash"]
+                    row = rows[content_hash]
+                    if row is None:
+                        # Stored by a concurrent request after this one checked for duplicates
+                        existing_id, existing_filename = db.query(DBExample.id, DBExample.filename).filter(
+                            DBExample.content_hash == content_hash).one()
+                        if existing_filename != values["filename"]:  # same name within the same second
+                            self._remove_example_files(values["filename"], values["prompt_filename"])
+                        added_ids[content_hash] = existing_id
+                        duplicates.append(ExampleDuplicate(filename=name, existingId=added_ids[content_hash]))
+                        continue
+                    example = self._to_example_pair(row, "/api/examples")
+                    added.append(example)
+                    added_ids[content_hash] = example.id
+                    if features:
+                        self._example_index.add(example.id, features)
+            self._examples_version += 1
+
+        for name, content_hash in repeated:
+            if content_hash in added_ids:
+                duplicates.append(ExampleDuplicate(filename=name, existingId=added_ids[content_hash]))
+            else:
+                failed.append(ExampleFailure(filename=name, error="Same image as an upload that failed"))
+
+        logger.info(f"Added {len(added)} of {len(uploads)} examples, "
+                    f"{len(duplicates)} duplicates, {len(failed)} failed")
+        return BulkExampleResult(added=added, duplicates=duplicates, failed=failed)
+
+    @staticmethod
+    def _insert_examples(db: Session, rows: List[dict]) -> Dict[str, Optional[DBExample]]:
+        """Insert new examples with one commit, returning them by content hash.
+
+        If another request stored one of the images meanwhile, the unique
+        content hash rejects the commit and the rows are inserted one at a
+        time instead, the ones already stored map to None.
+        """
+        examples = [DBExample(**values) for values in rows]
+        try:
+            db.add_all(examples)
+            db.commit()
+            return {example.content_hash: example for example in examples}
+        except IntegrityError:
+            db.rollback()
+
+        stored: Dict[str, Optional[DBExample]] = {}
+        for values in rows:
+            example = DBExample(**values)
+            db.add(example)
+            try:
                 db.commit()
-                db.refresh(db_example)
-
-                # Return with URL for frontend
-                return ExamplePair(
-                    id=db_example.id,
-                    image=f"/api/examples/{filename}",  # Remove the host part
-                    filename=filename,
-                    caption=caption
-                )
-
-        except Exception as e:
-            if os.path.exists(filepath):
-                os.remove(filepath)
-            raise RuntimeError(f"Failed to save example: {str(e)}")
+                stored[example.content_hash] = example
+            except IntegrityError:
+                db.rollback()
+                stored[values["content_hash"]] = None
+        return stored
+
+    def _remove_example_files(self, filename: str, prompt_filename: str):
+        remove_example_files([os.path.join(self._examples_dir, name) for name in
+                              {filename, prompt_filename, os.path.splitext(filename)[0] + '.txt'}])
+
+    @staticmethod
+    def _to_example_pair(db_example: DBExample, url_prefix: str) -> ExamplePair:
+        return ExamplePair(
+            id=db_example.id,
+            image=f"{url_prefix}/{db_example.filename}",
+            filename=db_example.filename,
+            caption=db_example.caption,
+            prompt_filename=db_example.prompt_filename
+        )
 
     # Add method to load examples on startup
     def load_examples(self) -> List[ExamplePair]:
         with SessionLocal() as db:
-            db_examples = db.query(DBExample).all()
             return [
-                ExamplePair(
-                    id=ex.id,
-                    image=f"http://localhost:8000/api/examples/{ex.filename}",
-                    filename=ex.filename,
-                    caption=ex.caption
-                )
-                for ex in db_examples
+                self._to_example_pair(ex, "http://localhost:8000/api/examples")
+                for ex in db.query(DBExample).all()
             ]
 
     async def remove_example(self, example_id: int) -> bool:
@@ -507,16 +1211,19 @@ class CaptionService:
                 if not example:
                     return False
 
-                # Store the image path before deleting from DB
+                # Store the file paths before deleting from DB
                 image_path = example.image_path
+                prompt_path = (os.path.join(self._examples_dir, example.prompt_filename)
+                               if example.prompt_filename and example.prompt_filename != example.filename else None)
 
                 # Delete from database
                 db.query(DBExample).filter(DBExample.id == example_id).delete()
                 db.commit()
+                self._example_index.remove(example_id)
+                self._examples_version += 1
 
-                # Delete the image file if it exists
-                if os.path.exists(image_path):
-                    os.remove(image_path)
+                # Delete the image file and its prompt copy if they exist
+                remove_example_files([image_path] + ([prompt_path] if prompt_path else []))
 
                 return True
             except Exception as e:
@@ -597,73 +1304,145 @@ class CaptionService:
             db.commit()
             return result > 0
 
-    def update_caption(self, item_id: int, new_caption: str) -> ProcessedItem:
+    def _resolve_image_paths(self, db: Session, edits: List[CaptionEdit]) -> List[str]:
+        """Find the image of every edit through the persistent id->path index.
+
+        Ids are 32-bit filename hashes, so several files can share one. Those
+        are narrowed down to the current folder, otherwise the edit has to
+        name the image path.
+        """
+        lookup = list({edit.id for edit in edits if not edit.image and self._run.find(edit.id) is None})
+        indexed = find_image_paths(db, lookup)
+        current_folder = os.path.normpath(self._current_folder) if self._current_folder else None
+        if (current_folder and current_folder not in self._reindexed_folders
+                and any(item_id not in indexed for item_id in lookup)):
+            # Captions written before the index existed: index the folder once and look again
+            self.reindex_captions(current_folder)
+            indexed = find_image_paths(db, lookup)
+
+        paths = []
+        for edit in edits:
+            if edit.image:
+                image_path = os.path.normpath(edit.image)
+                if item_id_for(os.path.basename(image_path)) != edit.id or not os.path.isfile(image_path):
+                    raise ValueError(f"{edit.image} is not the image with id {edit.id}")
+                paths.append(image_path)
+                continue
+
+            recent = self._run.find(edit.id)
+            if recent is not None:
+                paths.append(os.path.normpath(recent.image))
+                continue
+
+            candidates = indexed.get(edit.id, [])
+            if len(candidates) > 1 and current_folder:
+                candidates = [path for path in candidates if os.path.dirname(path) == current_folder] or candidates
+            if not candidates:
+                raise LookupError(f"No item found with id {edit.id}")
+            if len(candidates) > 1:
+                raise ValueError(f"Id {edit.id} matches {len(candidates)} images, pass the image path")
+            paths.append(candidates[0])
+        return paths
+
+    def _store_caption_edits(self, db: Session, captions: Dict[str, str]) -> List[ProcessedItem]:
+        """Stage the edited captions (image path -> caption) in the session and return the updated items"""
+        latest: Dict[str, DBProcessedItem] = {}
+        paths = list(captions)
+        for start in range(0, len(paths), 500):
+            for row in db.query(DBProcessedItem).filter(DBProcessedItem.image_path.in_(paths[start:start + 500])):
+                if row.image_path not in latest or row.created_at > latest[row.image_path].created_at:
+                    latest[row.image_path] = row
+
+        if latest:
+            db.execute(update(DBProcessedItem), [
+                {"id": row.id, "caption": captions[image_path]} for image_path, row in latest.items()
+            ])
+        upsert_captions(db, list(captions.items()))
+        # Edited captions are no longer what the recorded inputs produced, "stale" reprocessing keeps them
+        delete_provenance(db, list(captions))
+
+        items = []
+        for image_path, caption in captions.items():
+            item = self._run.get(image_path)
+            if item is None and image_path in latest:
+                item = self._to_processed_item(latest[image_path])
+            elif item is None:
+                item = ProcessedItem(
+                    id=item_id_for(os.path.basename(image_path)),
+                    filename=os.path.basename(image_path),
+                    image=image_path,
+                    caption=caption,
+                    timestamp=datetime.now(),
+                    status="success"
+                )
+            items.append(item.model_copy(update={"caption": caption}))
+        return items
+
+    def _apply_to_processed_items(self, items: List[ProcessedItem]):
+        for item in items:
+            self._run.replace(item)
+
+    def update_caption(self, item_id: int, new_caption: str, image_path: Optional[str] = None) -> ProcessedItem:
         """Update caption for a processed item"""
         try:
-            # Find the item in the processed items
-            item = next((item for item in self._processed_items if item.id == item_id), None)
-            if not item:
-                for root, _, files in os.walk(self._current_folder):
-                    for filename in files:
-                        if self._get_item_id(filename) == item_id:
-                            image_path = os.path.join(root, filename)
-                            item = ProcessedItem(
-                                id=item_id,
-                                filename=filename,
-                                image=image_path,
-                                caption=new_caption,
-                                timestamp=datetime.now(),
-                                status="success"
-                            )
-                            break
-                if not item:
-                    raise ValueError(f"No item found with id {item_id}")
-
-            # Update the caption in the text file
-            caption_path = os.path.splitext(item.image)[0] + '.txt'
-            with open(caption_path, 'w') as f:
-                f.write(new_caption)
-
-            # Create a new item instance with updated caption
-            updated_item = ProcessedItem(
-                id=item.id,
-                filename=item.filename,
-                image=item.image,
-                caption=new_caption,
-                timestamp=item.timestamp,
-                status=item.status,
-                error_message=item.error_message
-            )
+            with SessionLocal() as db:
+                path = self._resolve_image_paths(db, [CaptionEdit(id=item_id, caption=new_caption, image=image_path)])[0]
 
-            # Update the item in the processed items list
-            self._processed_items = [
-                updated_item if i.id == item_id else i
-                for i in self._processed_items
-            ]
+                # Update the caption in the text file
+                with open(os.path.splitext(path)[0] + '.txt', 'w') as f:
+                    f.write(new_caption)
 
-            # Update in database if using one
-            with self._db as db:
-                db_item = db.query(DBProcessedItem).filter(DBProcessedItem.id == str(item_id)).first()
-                if db_item:
-                    db_item.caption = new_caption
-                    db.commit()
+                items = self._store_caption_edits(db, {path: new_caption})
+                db.commit()
 
-            # Return the full list of processed items to maintain state
-            return updated_item
+            self._apply_to_processed_items(items)
+            return items[0]
         except Exception as e:
             logger.error(f"Error updating caption: {str(e)}")
             raise RuntimeError(f"Failed to update caption: {str(e)}")
 
+    async def update_captions(self, edits: List[CaptionEdit]) -> List[ProcessedItem]:
+        """Apply many caption edits in one database transaction, writing the caption files in parallel.
+
+        The new captions are written to temporary files first, which replace
+        the caption files only once the transaction is committed. If an edit
+        does not resolve or a file cannot be written, neither the database
+        nor any caption file changes. Edits of the same image are applied in
+        order, the last wins.
+        """
+        db = SessionLocal()
+        staged: List[Tuple[str, str]] = []
+        try:
+            paths = await asyncio.to_thread(self._resolve_image_paths, db, edits)
+            captions = dict(zip(paths, (edit.caption for edit in edits)))
+            items = await asyncio.to_thread(self._store_caption_edits, db, captions)
+            # Wait for every write, so nothing is still writing when the staged files are removed
+            for result in await asyncio.gather(*(
+                self._stage_caption_file(path, caption, staged) for path, caption in captions.items()
+            ), return_exceptions=True):
+                if isinstance(result, BaseException):
+                    raise result
+            await asyncio.to_thread(db.commit)
+        except BaseException:
+            db.rollback()
+            for tmp_path, _ in staged:
+                with suppress(FileNotFoundError):
+                    os.remove(tmp_path)
+            raise
+        finally:
+            db.close()
+
+        for tmp_path, caption_path in staged:
+            os.replace(tmp_path, caption_path)
+
+        self._apply_to_processed_items(items)
+        logger.info(f"Updated {len(items)} captions")
+        return items
 
     def _get_item_id(self, filename: str) -> int:
         """Generate a stable ID for a file"""
         # Use the same hashing algorithm as the frontend
-        hash_value = 0
-        for char in filename:
-            hash_value = ((hash_value << 5) - hash_value) + ord(char)
-            hash_value = hash_value & 0xFFFFFFFF  # Convert to 32-bit integer
-        return abs(hash_value)
-
+        return item_id_for(filename)
 
 
 _caption_service = None
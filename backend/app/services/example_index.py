@@ -0,0 +1,91 @@
+# backend/app/services/example_index.py
+import json
+import logging
+import math
+from typing import Dict, List, Optional
+
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+# Size of the grayscale thumbnail used as a coarse layout descriptor
+_LAYOUT_SIZE = 8
+# Number of bins per RGB channel for the colour histogram
+_COLOR_BINS = 4
+# Relative weight of the layout part versus the colour part
+_LAYOUT_WEIGHT = 0.5
+
+
+def _normalize(vector: List[float]) -> List[float]:
+    norm = math.sqrt(sum(v * v for v in vector))
+    if norm == 0:
+        return vector
+    return [v / norm for v in vector]
+
+
+def compute_features(image: Image.Image) -> List[float]:
+    """Compute a cheap perceptual feature vector for an image.
+
+    The vector combines a zero-mean 8x8 grayscale thumbnail (composition) and
+    a 4x4x4 RGB histogram (colour distribution). Both halves are L2 normalized
+    so cosine similarity can be computed with a plain dot product.
+    """
+    small = image.convert("RGB")
+    small.thumbnail((64, 64))
+
+    gray = small.convert("L").resize((_LAYOUT_SIZE, _LAYOUT_SIZE), Image.Resampling.BILINEAR)
+    pixels = list(gray.getdata())
+    mean = sum(pixels) / len(pixels)
+    layout = _normalize([p - mean for p in pixels])
+
+    step = 256 // _COLOR_BINS
+    histogram = [0.0] * (_COLOR_BINS ** 3)
+    for r, g, b in small.getdata():
+        histogram[(r // step) * _COLOR_BINS * _COLOR_BINS + (g // step) * _COLOR_BINS + (b // step)] += 1
+    color = _normalize([math.sqrt(h) for h in histogram])
+
+    return [v * _LAYOUT_WEIGHT for v in layout] + [v * (1 - _LAYOUT_WEIGHT) for v in color]
+
+
+def serialize_features(features: List[float]) -> str:
+    return json.dumps([round(v, 5) for v in features])
+
+
+def deserialize_features(data: Optional[str]) -> Optional[List[float]]:
+    if not data:
+        return None
+    try:
+        return json.loads(data)
+    except ValueError:
+        return None
+
+
+class ExampleIndex:
+    """In-memory index of example feature vectors keyed by example id."""
+
+    def __init__(self):
+        self._vectors: Dict[int, List[float]] = {}
+
+    def __len__(self) -> int:
+        return len(self._vectors)
+
+    def __contains__(self, example_id: int) -> bool:
+        return example_id in self._vectors
+
+    def add(self, example_id: int, features: List[float]):
+        self._vectors[example_id] = features
+
+    def remove(self, example_id: int):
+        self._vectors.pop(example_id, None)
+
+    def clear(self):
+        self._vectors.clear()
+
+    def top_k(self, features: List[float], k: int) -> List[int]:
+        """Return the ids of the k most similar examples, best match first."""
+        scored = [
+            (sum(a * b for a, b in zip(features, vector)), example_id)
+            for example_id, vector in self._vectors.items()
+        ]
+        scored.sort(key=lambda item: (-item[0], item[1]))
+        return [example_id for _, example_id in scored[:k]]
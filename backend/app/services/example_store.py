@@ -0,0 +1,90 @@
+# backend/app/services/example_store.py
+import os
+from io import BytesIO
+from typing import List, Optional, Tuple
+
+from .example_index import compute_features
+from .image_utils import encode_jpeg, open_image
+
+# Examples are sent with every caption request, so each one gets a prompt copy
+# that is small to upload. 1024px keeps the tile count of a 2048px original
+# for typical aspect ratios, since the provider scales the short side to 768.
+EXAMPLE_MAX_SIDE = 1024
+EXAMPLE_MAX_BYTES = 512 * 1024
+EXAMPLE_QUALITIES = (90, 80, 70, 60)
+# Images that still don't fit at the lowest quality are halved down to this side before giving up
+EXAMPLE_MIN_SIDE = 128
+PROMPT_COPY_SUFFIX = ".prompt.jpg"
+
+
+def prompt_copy_name(filename: str) -> str:
+    return os.path.splitext(filename)[0] + PROMPT_COPY_SUFFIX
+
+
+def encode_prompt_copy(image) -> Tuple[bytes, bool]:
+    """JPEG of the image at most EXAMPLE_MAX_SIDE on its longest side, lowering quality until it fits the cap.
+
+    If the lowest quality is still too large the size is halved until it
+    fits, down to EXAMPLE_MIN_SIDE. Also returns whether the source bytes
+    already qualify, in which case no copy is needed.
+    """
+    for quality in EXAMPLE_QUALITIES:
+        data, passthrough = encode_jpeg(image, EXAMPLE_MAX_SIDE, EXAMPLE_MAX_BYTES, quality)
+        if len(data) <= EXAMPLE_MAX_BYTES:
+            return data, passthrough
+    max_side = EXAMPLE_MAX_SIDE // 2
+    while max_side >= EXAMPLE_MIN_SIDE:
+        data, passthrough = encode_jpeg(image, max_side, EXAMPLE_MAX_BYTES, EXAMPLE_QUALITIES[-1])
+        if len(data) <= EXAMPLE_MAX_BYTES:
+            return data, passthrough
+        max_side //= 2
+    raise ValueError(f"Image does not fit {EXAMPLE_MAX_BYTES // 1024} KB even at {EXAMPLE_MIN_SIDE}px")
+
+
+def write_example_files(examples_dir: str, filename: str, content: bytes,
+                        caption: str) -> Tuple[str, Optional[List[float]]]:
+    """Store an example's original, caption and prompt copy, returning the copy's filename and the features.
+
+    The image is decoded once, at the prompt copy's size, for both the copy
+    and the similarity features. Small JPEGs are their own prompt copy.
+    Nothing is left behind if any step fails.
+    """
+    filepath = os.path.join(examples_dir, filename)
+    files = [(filepath, content), (os.path.splitext(filepath)[0] + '.txt', caption.encode("utf-8"))]
+    written = []
+    try:
+        with open_image(BytesIO(content), EXAMPLE_MAX_SIDE) as image:
+            prompt_copy, passthrough = encode_prompt_copy(image)
+            features = compute_features(image)
+        prompt_filename = filename if passthrough else prompt_copy_name(filename)
+        if not passthrough:
+            files.append((os.path.join(examples_dir, prompt_filename), prompt_copy))
+
+        for path, data in files:
+            with open(path, "wb") as f:
+                written.append(path)
+                f.write(data)
+        return prompt_filename, features
+    except Exception:
+        remove_example_files(written)
+        raise
+
+
+def write_prompt_copy(examples_dir: str, filename: str) -> str:
+    """Create the prompt copy of an example stored before copies existed, returning its filename"""
+    with open_image(os.path.join(examples_dir, filename), EXAMPLE_MAX_SIDE) as image:
+        data, passthrough = encode_prompt_copy(image)
+    if passthrough:
+        return filename
+    prompt_filename = prompt_copy_name(filename)
+    with open(os.path.join(examples_dir, prompt_filename), "wb") as f:
+        f.write(data)
+    return prompt_filename
+
+
+def remove_example_files(paths: List[str]):
+    for path in paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,316 @@
+# backend/app/services/export_service.py
+import argparse
+import asyncio
+import base64
+import hashlib
+import io
+import json
+import logging
+import os
+import sys
+import tarfile
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from .image_utils import open_image, encode_jpeg
+from ..models import ExportRequest, ExportStatus
+
+logger = logging.getLogger(__name__)
+
+EXPORT_ROOT = "/data/exports"
+# Records the export settings and completed shards so an export can be resumed
+STATE_FILE = "export.json"
+# Rows buffered before a Parquet row group is flushed
+PARQUET_ROW_GROUP = 64
+
+SHARD_EXTENSIONS = {"webdataset": "tar", "jsonl": "jsonl", "parquet": "parquet"}
+# Settings that must match for a previous export to be resumed
+RESUME_KEYS = ("format", "shard_size", "include_images", "image_max_side", "image_quality")
+
+
+def list_pairs(folder_path: str) -> Tuple[List[Tuple[str, str, str]], int]:
+    """Return the sorted (key, image path, caption path) pairs of a folder and the number of uncaptioned images.
+
+    Keys are the file stems with dots replaced, as WebDataset uses the first
+    dot to split the sample key from the member extension. A key that was
+    already issued gets the first free counter suffix.
+    """
+    names = sorted(
+        entry.name for entry in os.scandir(folder_path)
+        if entry.is_file() and entry.name.lower().endswith(('.png', '.jpg', '.jpeg', '.gif', '.webp'))
+    )
+    existing = set(os.listdir(folder_path))
+
+    pairs = []
+    keys = set()
+    skipped = 0
+    for name in names:
+        stem = os.path.splitext(name)[0]
+        if stem + '.txt' not in existing:
+            skipped += 1
+            continue
+        base = key = stem.replace('.', '_')
+        suffix = 1
+        while key in keys:
+            key = f"{base}_{suffix}"
+            suffix += 1
+        keys.add(key)
+        pairs.append((key, os.path.join(folder_path, name), os.path.join(folder_path, stem + '.txt')))
+    return pairs, skipped
+
+
+class ExportService:
+    """Streams a folder's image/caption pairs into sharded dataset files.
+
+    Shards are written one at a time to a temporary file and renamed once
+    complete, so memory stays bounded by a single sample (or one Parquet row
+    group) and an interrupted export resumes at the first missing shard.
+    """
+
+    def __init__(self):
+        self._status = ExportStatus(isExporting=False)
+        self._task: Optional[asyncio.Task] = None
+
+    def get_status(self) -> ExportStatus:
+        return self._status
+
+    async def start_export(self, request: ExportRequest) -> ExportStatus:
+        if self._task and not self._task.done():
+            raise ValueError("An export is already running")
+        output_dir = self._validate(request)
+
+        self._status = ExportStatus(isExporting=True, format=request.format, outputDir=output_dir)
+        self._task = asyncio.create_task(self._run(request, output_dir, self._status))
+        return self._status
+
+    async def _run(self, request: ExportRequest, output_dir: str, status: ExportStatus):
+        try:
+            await asyncio.to_thread(self.export, request, output_dir, status)
+        except Exception as e:
+            logger.error(f"Export of {request.folder_path} failed: {str(e)}")
+            status.error = str(e)
+        finally:
+            status.isExporting = False
+
+    @staticmethod
+    def _validate(request: ExportRequest) -> str:
+        if not os.path.isdir(request.folder_path):
+            raise ValueError(f"Folder not found: {request.folder_path}")
+        if request.shard_size < 1:
+            raise ValueError("shard_size must be at least 1")
+        if request.format == "parquet":
+            _import_pyarrow()
+        folder_name = os.path.basename(os.path.normpath(request.folder_path))
+        return request.output_dir or os.path.join(EXPORT_ROOT, f"{folder_name}-{request.format}")
+
+    def export(self, request: ExportRequest, output_dir: str, status: ExportStatus) -> ExportStatus:
+        """Run an export synchronously, updating status as shards complete"""
+        pairs, status.skippedCount = list_pairs(request.folder_path)
+        status.totalCount = len(pairs)
+        os.makedirs(output_dir, exist_ok=True)
+
+        digest = hashlib.sha256("\n".join(path for _, path, _ in pairs).encode()).hexdigest()
+        state = self._load_state(output_dir, request, digest)
+        completed = set(state["completed"])
+
+        prefix = os.path.basename(os.path.normpath(request.folder_path)) or "shard"
+        extension = SHARD_EXTENSIONS[request.format]
+        writer = _WRITERS[request.format]
+        logger.info(f"Exporting {len(pairs)} pairs from {request.folder_path} to {output_dir} "
+                    f"as {request.format} ({len(completed)} shards already complete)")
+
+        for index, start in enumerate(range(0, len(pairs), request.shard_size)):
+            shard_pairs = pairs[start:start + request.shard_size]
+            shard_name = f"{prefix}-{index:06d}.{extension}"
+            shard_path = os.path.join(output_dir, shard_name)
+
+            if shard_name in completed and os.path.exists(shard_path):
+                status.shardsResumed += 1
+                status.exportedCount += len(shard_pairs)
+                continue
+
+            def count():
+                status.exportedCount += 1
+
+            tmp_path = shard_path + ".tmp"
+            writer(tmp_path, _records(shard_pairs, request, count), request)
+            os.replace(tmp_path, shard_path)
+
+            state["completed"].append(shard_name)
+            self._save_state(output_dir, state)
+            status.shardsWritten += 1
+            logger.info(f"Wrote {shard_name} ({len(shard_pairs)} samples)")
+
+        state["complete"] = True
+        self._save_state(output_dir, state)
+        logger.info(f"Export finished: {status.exportedCount} pairs, {status.shardsWritten} shards written, "
+                    f"{status.shardsResumed} resumed, {status.skippedCount} images without caption skipped")
+        return status
+
+    @staticmethod
+    def _load_state(output_dir: str, request: ExportRequest, digest: str) -> Dict:
+        settings = {key: getattr(request, key) for key in RESUME_KEYS}
+        state_path = os.path.join(output_dir, STATE_FILE)
+        fresh = dict(settings, files_digest=digest, completed=[], complete=False)
+
+        if not os.path.exists(state_path):
+            return fresh
+        with open(state_path) as f:
+            state = json.load(f)
+
+        if request.overwrite:
+            for shard_name in state.get("completed", []):
+                shard_path = os.path.join(output_dir, shard_name)
+                if os.path.exists(shard_path):
+                    os.remove(shard_path)
+            return fresh
+
+        previous = {key: state.get(key) for key in RESUME_KEYS}
+        if previous != settings or state.get("files_digest") != digest:
+            raise ValueError(
+                f"{output_dir} holds an export with different settings or folder contents, "
+                f"set overwrite to start over"
+            )
+        return state
+
+    @staticmethod
+    def _save_state(output_dir: str, state: Dict):
+        tmp_path = os.path.join(output_dir, STATE_FILE + ".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(state, f)
+        os.replace(tmp_path, os.path.join(output_dir, STATE_FILE))
+
+
+def _records(pairs: List[Tuple[str, str, str]], request: ExportRequest,
+             on_record: Callable[[], None]) -> Iterator[Dict]:
+    """Yield one sample at a time, reading the caption and preparing the image lazily"""
+    for key, image_path, caption_path in pairs:
+        with open(caption_path, encoding="utf-8") as f:
+            caption = f.read().strip()
+        record = {
+            "key": key,
+            "filename": os.path.basename(image_path),
+            "path": image_path,
+            "caption": caption,
+            "image": None,
+            "image_ext": os.path.splitext(image_path)[1][1:].lower()
+        }
+        # Only WebDataset shards and include_images write the image, other exports would discard it
+        if request.image_max_side and (request.format == "webdataset" or request.include_images):
+            with open_image(image_path, request.image_max_side) as image:
+                record["image"], _ = encode_jpeg(image, request.image_max_side, sys.maxsize, request.image_quality)
+            record["image_ext"] = "jpg"
+        yield record
+        on_record()
+
+
+def _image_bytes(record: Dict) -> bytes:
+    if record["image"] is not None:
+        return record["image"]
+    with open(record["path"], "rb") as f:
+        return f.read()
+
+
+def _write_webdataset(path: str, records: Iterator[Dict], request: ExportRequest):
+    with tarfile.open(path, "w") as tar:
+        for record in records:
+            key = record["key"]
+            metadata = json.dumps({"filename": record["filename"]}).encode()
+            members = [(f"{key}.txt", record["caption"].encode("utf-8")), (f"{key}.json", metadata)]
+
+            image_name = f"{key}.{record['image_ext']}"
+            if record["image"] is not None:
+                members.insert(0, (image_name, record["image"]))
+            else:
+                # Original files are streamed into the archive without being read into memory
+                tar.add(record["path"], arcname=image_name, recursive=False)
+
+            for name, data in members:
+                info = tarfile.TarInfo(name)
+                info.size = len(data)
+                tar.addfile(info, io.BytesIO(data))
+
+
+def _write_jsonl(path: str, records: Iterator[Dict], request: ExportRequest):
+    with open(path, "w", encoding="utf-8") as f:
+        for record in records:
+            line = {key: record[key] for key in ("key", "filename", "path", "caption")}
+            if request.include_images:
+                line["image_format"] = record["image_ext"]
+                line["image_base64"] = base64.b64encode(_image_bytes(record)).decode()
+            f.write(json.dumps(line, ensure_ascii=False) + "\n")
+
+
+def _import_pyarrow():
+    """Import pyarrow on first use, it is optional and slow to import"""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ValueError("Parquet export requires the pyarrow package")
+    return pa, pq
+
+
+def _write_parquet(path: str, records: Iterator[Dict], request: ExportRequest):
+    pa, pq = _import_pyarrow()
+    fields = [
+        ("key", pa.string()), ("filename", pa.string()), ("path", pa.string()), ("caption", pa.string())
+    ]
+    if request.include_images:
+        fields += [("image_format", pa.string()), ("image", pa.binary())]
+    schema = pa.schema(fields)
+
+    with pq.ParquetWriter(path, schema) as writer:
+        rows = []
+        for record in records:
+            row = {key: record[key] for key in ("key", "filename", "path", "caption")}
+            if request.include_images:
+                row["image_format"] = record["image_ext"]
+                row["image"] = _image_bytes(record)
+            rows.append(row)
+            if len(rows) >= PARQUET_ROW_GROUP:
+                writer.write_table(pa.Table.from_pylist(rows, schema=schema))
+                rows = []
+        if rows:
+            writer.write_table(pa.Table.from_pylist(rows, schema=schema))
+
+
+_WRITERS = {
+    "webdataset": _write_webdataset,
+    "jsonl": _write_jsonl,
+    "parquet": _write_parquet
+}
+
+_export_service = None
+
+
+def get_export_service() -> ExportService:
+    global _export_service
+    if _export_service is None:
+        _export_service = ExportService()
+    return _export_service
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export a folder's image/caption pairs as dataset shards")
+    parser.add_argument("folder_path")
+    parser.add_argument("--output-dir")
+    parser.add_argument("--format", choices=sorted(SHARD_EXTENSIONS), default="webdataset")
+    parser.add_argument("--shard-size", type=int, default=1000, help="samples per shard")
+    parser.add_argument("--include-images", action="store_true", help="embed images in jsonl/parquet shards")
+    parser.add_argument("--image-max-side", type=int, help="resize embedded images to this size")
+    parser.add_argument("--image-quality", type=int, default=90)
+    parser.add_argument("--overwrite", action="store_true", help="start over instead of resuming")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    request = ExportRequest(**vars(args))
+    service = ExportService()
+    output_dir = service._validate(request)
+    status = service.export(request, output_dir, ExportStatus(isExporting=True, format=request.format,
+                                                              outputDir=output_dir))
+    status.isExporting = False
+    print(status.model_dump_json(indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+# backend/app/services/image_scan.py
+import asyncio
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import List, Optional
+
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+# Rejected images are moved here, inside the folder being processed
+QUARANTINE_DIR = ".quarantine"
+QUARANTINE_LOG = "quarantine.log"
+# Files checked per worker task, and below which the scan runs without a process pool
+SCAN_CHUNK_SIZE = 64
+MAX_SCAN_WORKERS = 8
+# JPEGs are decoded at 1/8 scale, which still reads (and checks) every byte of the file
+VERIFY_DECODE_SCALE = 8
+
+IMAGE_FORMATS = ("JPEG", "PNG", "GIF", "WEBP")
+
+
+def check_image(path: str, max_bytes: int, max_pixels: int, allow_animated: bool = False) -> Optional[str]:
+    """Return why an image should not be sent to a provider, None if it is fine"""
+    try:
+        size = os.path.getsize(path)
+        if size == 0:
+            return "empty file"
+        if size > max_bytes:
+            return f"file is {size / (1024 * 1024):.1f} MB, the limit is {max_bytes / (1024 * 1024):.0f} MB"
+
+        with Image.open(path, formats=IMAGE_FORMATS) as image:
+            width, height = image.size
+            if width * height > max_pixels:
+                return f"image is {width * height / 1e6:.0f} megapixels, the limit is {max_pixels / 1e6:.0f}"
+            if getattr(image, "n_frames", 1) > 1 and not allow_animated:
+                return "animated image" if image.format in ("GIF", "WEBP") else "multi-frame image"
+            if image.format == "PNG":
+                # Checks the CRC of every chunk up to the end of the file
+                image.verify()
+                return None
+            # Other formats have no structural verify, decoding is what finds truncation
+            # Clamped, PIL's draft divides by the requested size and tiny images would round it to 0
+            image.draft(image.mode, (max(1, width // VERIFY_DECODE_SCALE), max(1, height // VERIFY_DECODE_SCALE)))
+            image.load()
+        return None
+    except Image.DecompressionBombError as e:
+        return f"decompression bomb: {str(e)}"
+    except Image.UnidentifiedImageError:
+        return "not a supported image (JPEG, PNG, GIF or WebP)"
+    except Exception as e:
+        return f"corrupt or truncated: {str(e)}"
+
+
+def _check_images(paths: List[str], max_bytes: int, max_pixels: int, allow_animated: bool) -> List[Optional[str]]:
+    return [check_image(path, max_bytes, max_pixels, allow_animated) for path in paths]
+
+
+async def scan_images(paths: List[str], max_bytes: int, max_pixels: int,
+                      allow_animated: bool = False) -> List[Optional[str]]:
+    """Check images in a process pool, returns the rejection reason of each path (None when valid)"""
+    if len(paths) <= SCAN_CHUNK_SIZE:
+        return await asyncio.to_thread(_check_images, paths, max_bytes, max_pixels, allow_animated)
+
+    loop = asyncio.get_running_loop()
+    chunks = [paths[start:start + SCAN_CHUNK_SIZE] for start in range(0, len(paths), SCAN_CHUNK_SIZE)]
+    workers = min(MAX_SCAN_WORKERS, os.cpu_count() or 1, len(chunks))
+    # Spawned workers do not inherit the server's threads, sockets or event loop
+    executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+    try:
+        results = await asyncio.gather(*[
+            loop.run_in_executor(executor, _check_images, chunk, max_bytes, max_pixels, allow_animated)
+            for chunk in chunks
+        ])
+    finally:
+        # Not a `with` block, its exit would wait for every queued chunk on the event loop if the job is cancelled
+        executor.shutdown(wait=False, cancel_futures=True)
+    return [reason for chunk_results in results for reason in chunk_results]
+
+
+def quarantine_image(path: str, reason: str) -> str:
+    """Move an image into the folder's quarantine directory, noting why, and return its new path"""
+    quarantine_dir = os.path.join(os.path.dirname(path), QUARANTINE_DIR)
+    os.makedirs(quarantine_dir, exist_ok=True)
+    name = os.path.basename(path)
+    stem, ext = os.path.splitext(name)
+    destination = os.path.join(quarantine_dir, name)
+    copy = 1
+    # Never overwrite an image quarantined earlier under the same name
+    while os.path.exists(destination):
+        destination = os.path.join(quarantine_dir, f"{stem}_{copy}{ext}")
+        copy += 1
+    os.rename(path, destination)
+    with open(os.path.join(quarantine_dir, QUARANTINE_LOG), "a", encoding="utf-8") as f:
+        f.write(f"{datetime.now().isoformat(timespec='seconds')}\t{name}\t{os.path.basename(destination)}\t{reason}\n")
+    return destination
@@ -0,0 +1,119 @@
+# backend/app/services/image_utils.py
+import base64
+import hashlib
+import math
+import os
+from io import BytesIO
+from typing import BinaryIO, Optional, Tuple, Union
+
+from PIL import Image
+from fastapi import UploadFile
+
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+
+async def read_upload(upload: UploadFile) -> Tuple[bytes, str]:
+    """Read an upload into memory and return its bytes with their sha256 hex digest.
+
+    The digest is computed chunk by chunk while reading, so the content is
+    only traversed once.
+    """
+    digest = hashlib.sha256()
+    chunks = []
+    while True:
+        chunk = await upload.read(UPLOAD_CHUNK_SIZE)
+        if not chunk:
+            break
+        digest.update(chunk)
+        chunks.append(chunk)
+    return b"".join(chunks), digest.hexdigest()
+
+
+def file_sha256(path: str) -> str:
+    """Return the sha256 hex digest of a file, read in chunks"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(UPLOAD_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def open_image(source: Union[str, BinaryIO], max_side: Optional[int] = None) -> Image.Image:
+    """Open an image lazily, letting large JPEGs decode at a reduced scale.
+
+    With max_side set, JPEG decoding uses DCT scaling (1/2, 1/4 or 1/8) at the
+    smallest scale that still covers max_side, so a 40MP photo is never
+    materialized at full resolution. Only the header is read here; use the
+    result as a context manager so the file is closed deterministically.
+    """
+    image = Image.open(source)
+    if max_side and image.format == "JPEG" and max(image.size) > max_side:
+        ratio = max_side / max(image.size)
+        image.info["original_size"] = image.size
+        image.draft(None, (max(1, math.ceil(image.width * ratio)), max(1, math.ceil(image.height * ratio))))
+    return image
+
+
+def decoded_size(image: Image.Image) -> int:
+    """Estimate from the header the bytes needed to decode an image and convert it to RGB"""
+    return image.width * image.height * (len(image.getbands()) + 3)
+
+
+def to_rgb(image: Image.Image) -> Image.Image:
+    """Convert an image to RGB, flattening transparency onto a white background"""
+    if image.mode in ('RGBA', 'LA'):
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        if image.mode == 'RGBA':
+            background.paste(image, mask=image.split()[3])  # Use alpha channel as mask
+        else:
+            background.paste(image, mask=image.split()[1])  # Use alpha channel as mask
+        return background
+    if image.mode != 'RGB':
+        return image.convert('RGB')
+    return image
+
+
+def _passthrough_source(image: Image.Image, max_side: int, max_bytes: int) -> Optional[bytes]:
+    """Return the original encoded bytes if they can be uploaded as they are.
+
+    Only header fields (format, mode, size) and the byte size are inspected,
+    the pixel data is never decoded.
+    """
+    size = image.info.get("original_size", image.size)
+    if image.format != "JPEG" or image.mode not in ("RGB", "L") or max(size) > max_side:
+        return None
+
+    filename = getattr(image, "filename", None)
+    if filename:
+        if os.path.getsize(filename) > max_bytes:
+            return None
+        with open(filename, "rb") as f:
+            return f.read()
+
+    # Images opened from memory keep their buffer until they are decoded
+    if isinstance(image.fp, BytesIO):
+        data = image.fp.getvalue()
+        return data if len(data) <= max_bytes else None
+    return None
+
+
+def encode_jpeg(image: Image.Image, max_side: int, max_bytes: int, quality: int) -> Tuple[bytes, bool]:
+    """Return the image as JPEG bytes and whether the source bytes were passed through unchanged"""
+    source = _passthrough_source(image, max_side, max_bytes)
+    if source is not None:
+        return source, True
+
+    image = to_rgb(image)
+    if max(image.size) > max_side:
+        image = image.copy()
+        image.thumbnail((max_side, max_side), Image.Resampling.LANCZOS)
+
+    buffered = BytesIO()
+    image.save(buffered, format="JPEG", quality=quality)
+    return buffered.getvalue(), False
+
+
+def encode_for_upload(image: Image.Image, max_side: int, max_bytes: int, quality: int) -> Tuple[str, bool]:
+    """Return the image as base64 JPEG and whether the source bytes were passed through unchanged"""
+    data, passthrough = encode_jpeg(image, max_side, max_bytes, quality)
+    return base64.b64encode(data).decode(), passthrough
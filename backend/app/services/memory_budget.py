@@ -0,0 +1,52 @@
+# backend/app/services/memory_budget.py
+import asyncio
+import logging
+import sys
+from contextlib import asynccontextmanager
+from typing import Optional
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+
+class MemoryBudget:
+    """Limits how many bytes of decoded image data a job keeps in flight.
+
+    Reservations larger than the whole budget are capped to it, so an
+    oversized image still gets processed, just on its own.
+    """
+
+    def __init__(self, limit_bytes: Optional[int] = None):
+        self.limit = limit_bytes
+        self.in_use = 0
+        self.peak = 0
+        self._condition = asyncio.Condition()
+
+    @asynccontextmanager
+    async def reserve(self, size: int):
+        if self.limit:
+            size = min(size, self.limit)
+        async with self._condition:
+            if self.limit:
+                await self._condition.wait_for(lambda: self.in_use + size <= self.limit)
+            self.in_use += size
+            self.peak = max(self.peak, self.in_use)
+        try:
+            yield
+        finally:
+            async with self._condition:
+                self.in_use -= size
+                self._condition.notify_all()
+
+
+def peak_rss_mb() -> Optional[float]:
+    """Peak resident set size of this worker process in MB"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in bytes on macOS and in kilobytes elsewhere
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
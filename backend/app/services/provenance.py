@@ -0,0 +1,95 @@
+# backend/app/services/provenance.py
+import hashlib
+import json
+import os
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from sqlalchemy.orm import Session
+
+from .caption_search import dialect_insert
+from .image_utils import file_sha256
+from ..models import DBCaptionProvenance, ExamplePair, ModelConfig
+
+# Rows per multi-row upsert statement
+UPSERT_CHUNK_SIZE = 500
+
+STALE_REASONS = ("template", "examples", "model", "temperature", "image")
+
+
+def _hash(value) -> str:
+    return hashlib.sha256(json.dumps(value, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def caption_inputs(template: Optional[str], examples: List[ExamplePair], example_top_k: Optional[int],
+                   model_config: ModelConfig) -> dict:
+    """The job-wide inputs of a caption, as stored in its provenance row"""
+    model = f"{model_config.provider}/{model_config.model}"
+    if model_config.backends:
+        model += "|" + ",".join(sorted(backend.model or model_config.model for backend in model_config.backends))
+    return {
+        "template_hash": _hash(template or ""),
+        # Top-k selection picks from the whole set, so any example change can change what an image is sent.
+        # Sorted by id, the database returns them in no particular order.
+        "examples_hash": _hash([[example.filename, example.caption]
+                                for example in sorted(examples, key=lambda example: example.id)]
+                               + [example_top_k or 0]),
+        "model": model,
+        "temperature": model_config.temperature
+    }
+
+
+def provenance_row(image_path: str, inputs: dict, image_hash: str, batch_id: Optional[str]) -> dict:
+    image_path = os.path.normpath(image_path)
+    stat = os.stat(image_path)
+    return {
+        "image_path": image_path,
+        "folder": os.path.dirname(image_path),
+        **inputs,
+        "image_hash": image_hash,
+        "image_size": stat.st_size,
+        "image_mtime": stat.st_mtime,
+        "batch_id": batch_id,
+        "created_at": datetime.utcnow()
+    }
+
+
+def upsert_provenance(db: Session, rows: List[dict]):
+    """Insert or replace the provenance of each captioned image. The caller commits."""
+    if not rows:
+        return
+    insert = dialect_insert(db)
+    rows = list({row["image_path"]: row for row in rows}.values())
+    for start in range(0, len(rows), UPSERT_CHUNK_SIZE):
+        statement = insert(DBCaptionProvenance).values(rows[start:start + UPSERT_CHUNK_SIZE])
+        db.execute(statement.on_conflict_do_update(
+            index_elements=[DBCaptionProvenance.image_path],
+            set_={column: getattr(statement.excluded, column) for column in rows[0] if column != "image_path"}
+        ))
+
+
+def delete_provenance(db: Session, image_paths: List[str]):
+    """Forget where captions came from, e.g. after they were edited by hand. The caller commits."""
+    image_paths = [os.path.normpath(path) for path in image_paths]
+    for start in range(0, len(image_paths), UPSERT_CHUNK_SIZE):
+        (db.query(DBCaptionProvenance)
+         .filter(DBCaptionProvenance.image_path.in_(image_paths[start:start + UPSERT_CHUNK_SIZE]))
+         .delete(synchronize_session=False))
+
+
+def load_folder_provenance(db: Session, folder_path: str) -> Dict[str, DBCaptionProvenance]:
+    """Provenance of every caption recorded for a folder, by image path"""
+    rows = db.query(DBCaptionProvenance).filter(DBCaptionProvenance.folder == os.path.normpath(folder_path))
+    return {row.image_path: row for row in rows}
+
+
+def stale_reasons(row: DBCaptionProvenance, inputs: dict, image_path: str) -> List[str]:
+    """Which inputs of a caption changed since it was generated, empty when it is current"""
+    reasons = [name for name, column in (("template", "template_hash"), ("examples", "examples_hash"),
+                                         ("model", "model"), ("temperature", "temperature"))
+               if getattr(row, column) != inputs[column]]
+    stat = os.stat(image_path)
+    # Only files whose size or modification time changed are hashed again
+    if (stat.st_size, stat.st_mtime) != (row.image_size, row.image_mtime) and file_sha256(image_path) != row.image_hash:
+        reasons.append("image")
+    return reasons
@@ -1,5 +1,42 @@
 # backend/app/services/providers/__init__.py
-from .openai_provider import OpenAIProvider
-from .huggingface_provider import HuggingFaceProvider
+import importlib
+from typing import Dict, Tuple, Type
 
-__all__ = ['OpenAIProvider', 'HuggingFaceProvider']
\ No newline at end of file
+from .base_provider import BaseProvider, MissingCaptionError, served_by
+
+# Provider modules are imported on first use, so an OpenAI-only deployment
+# never pays for importing torch/transformers
+_REGISTRY: Dict[str, Tuple[str, str]] = {
+    "openai": ("openai_provider", "OpenAIProvider"),
+    "huggingface": ("huggingface_provider", "HuggingFaceProvider"),
+    "router": ("router_provider", "RouterProvider"),
+}
+_CLASS_NAMES = {class_name: name for name, (_, class_name) in _REGISTRY.items()}
+
+
+def available_providers() -> Tuple[str, ...]:
+    return tuple(name for name in _REGISTRY if name != "router")
+
+
+def provider_class(name: str) -> Type[BaseProvider]:
+    """Import and return the provider class registered under name"""
+    if name not in _REGISTRY:
+        raise ValueError(f"Unsupported provider: {name}")
+    module_name, class_name = _REGISTRY[name]
+    module = importlib.import_module(f".{module_name}", __name__)
+    return getattr(module, class_name)
+
+
+def create_provider(name: str) -> BaseProvider:
+    return provider_class(name)()
+
+
+def __getattr__(attribute: str):
+    # Provider classes stay importable by name, their module is loaded on access
+    if attribute in _CLASS_NAMES:
+        return provider_class(_CLASS_NAMES[attribute])
+    raise AttributeError(f"module {__name__!r} has no attribute {attribute!r}")
+
+
+__all__ = ['OpenAIProvider', 'HuggingFaceProvider', 'RouterProvider', 'MissingCaptionError', 'served_by',
+           'available_providers', 'provider_class', 'create_provider']
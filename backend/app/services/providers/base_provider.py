@@ -1,7 +1,18 @@
 # backend/app/services/providers/base_provider.py
 from abc import ABC, abstractmethod
+from contextvars import ContextVar
+from typing import AsyncIterator, List, Optional, Union
+
 from PIL import Image
-from ...models import ModelConfig
+from ...models import ModelConfig, ExamplePair, UsageStats
+
+# Name of the backend that served the last caption request of the current task
+served_by: ContextVar[Optional[str]] = ContextVar("served_by", default=None)
+
+
+class MissingCaptionError(RuntimeError):
+    """A multi-image response did not include a caption for one of its images"""
+
 
 class BaseProvider(ABC):
     @abstractmethod
@@ -10,6 +21,24 @@ class BaseProvider(ABC):
         pass
 
     @abstractmethod
-    async def generate_caption(self, image: Image.Image) -> str:
-        """Generate a caption for the given image."""
-        pass
\ No newline at end of file
+    async def generate_caption(self, image: Image.Image, template: Optional[str] = None,
+                               examples: Optional[List[ExamplePair]] = None,
+                               usage: Optional[UsageStats] = None) -> str:
+        """Generate a caption for the given image, adding token usage to `usage` if given."""
+        pass
+
+    async def generate_captions(self, images: List[Image.Image], template: Optional[str] = None,
+                                examples: Optional[List[ExamplePair]] = None,
+                                usage: Optional[UsageStats] = None) -> List[Union[str, Exception]]:
+        """Generate captions for several images, in order. Providers may batch them into one request.
+
+        An image the provider could not caption may have an exception in
+        place of its caption, the caller decides whether to retry it.
+        """
+        return [await self.generate_caption(image, template, examples, usage) for image in images]
+
+    async def stream_caption(self, image: Image.Image, template: Optional[str] = None,
+                             examples: Optional[List[ExamplePair]] = None,
+                             usage: Optional[UsageStats] = None) -> AsyncIterator[str]:
+        """Yield the caption as it is generated. Providers without token streaming yield it whole."""
+        yield await self.generate_caption(image, template, examples, usage)
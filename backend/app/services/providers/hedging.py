@@ -0,0 +1,100 @@
+# backend/app/services/providers/hedging.py
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Awaitable, Callable, Optional, Tuple, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Latency samples needed before the hedge delay is trusted
+MIN_SAMPLES = 20
+
+
+class LatencyTracker:
+    """Keeps a window of recent request latencies (in seconds)."""
+
+    def __init__(self, window: int = 200):
+        self._samples = deque(maxlen=window)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def record(self, seconds: float):
+        self._samples.append(seconds)
+
+    def percentile(self, p: float) -> Optional[float]:
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        index = min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))
+        return ordered[index]
+
+
+class HedgedCaller:
+    """Runs provider requests with a hard deadline and optional hedging.
+
+    When hedging is enabled and a request has not answered after the p95 of
+    recent latencies, a duplicate request is sent and whichever answers first
+    wins; the other one is cancelled. Hedges are capped at `max_ratio` of all
+    requests so tail latency cannot silently double the spend.
+    """
+
+    def __init__(self):
+        self.latency = LatencyTracker()
+        self.requests = 0
+        self.hedges = 0
+
+    def hedge_delay(self) -> Optional[float]:
+        if len(self.latency) < MIN_SAMPLES:
+            return None
+        return self.latency.percentile(95)
+
+    def _can_hedge(self, max_ratio: float) -> bool:
+        return self.hedges + 1 <= max_ratio * self.requests
+
+    async def call(
+            self,
+            make_request: Callable[[], Awaitable[T]],
+            timeout: float,
+            hedge: bool = False,
+            max_ratio: float = 0.1
+    ) -> Tuple[T, bool]:
+        """Return the first successful result and whether a hedge request was sent."""
+        loop = asyncio.get_running_loop()
+        started = time.monotonic()
+        deadline = loop.time() + timeout
+        self.requests += 1
+
+        tasks = {asyncio.ensure_future(make_request())}
+        hedged = False
+        last_error: Optional[BaseException] = None
+        try:
+            delay = self.hedge_delay() if hedge else None
+            if delay is not None and delay < timeout:
+                done, _ = await asyncio.wait(tasks, timeout=delay)
+                if not done and self._can_hedge(max_ratio):
+                    logger.info(f"No response after {delay:.2f}s, sending hedge request")
+                    self.hedges += 1
+                    hedged = True
+                    tasks.add(asyncio.ensure_future(make_request()))
+
+            while tasks:
+                remaining = deadline - loop.time()
+                done, _ = await asyncio.wait(
+                    tasks, timeout=max(0.0, remaining), return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    raise TimeoutError(f"Provider request exceeded its {timeout:g}s deadline")
+                for task in done:
+                    tasks.discard(task)
+                    if task.exception() is None:
+                        self.latency.record(time.monotonic() - started)
+                        return task.result(), hedged
+                    last_error = task.exception()
+            raise last_error
+        finally:
+            for task in tasks:
+                task.cancel()
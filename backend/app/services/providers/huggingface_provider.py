@@ -0,0 +1,154 @@
+# backend/app/services/providers/huggingface_provider.py
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, List, Tuple
+
+import torch
+from PIL import Image
+from transformers import (
+    AutoImageProcessor, AutoModelForVision2Seq, AutoProcessor, AutoTokenizer, PreTrainedTokenizerBase
+)
+
+from .base_provider import BaseProvider
+from ..image_utils import to_rgb
+from ...models import ModelConfig, ExamplePair, UsageStats
+
+logger = logging.getLogger(__name__)
+
+MAX_NEW_TOKENS = 75
+
+
+class HuggingFaceProvider(BaseProvider):
+    """Local vision-to-text model running on the CPU.
+
+    The model is loaded once and stays resident. Concurrent generate_caption
+    calls are collected into micro-batches (up to local_batch_size images, or
+    whatever arrived within local_max_wait_ms) and run as a single forward
+    pass on a dedicated inference thread, so the event loop never blocks.
+    Templates and examples are not used by these models.
+    """
+
+    def __init__(self):
+        self.config: Optional[ModelConfig] = None
+        self._model = None
+        self._processor = None
+        self._tokenizer = None
+        self._model_name: Optional[str] = None
+        # A single worker keeps model loading and inference strictly sequential
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="hf-inference")
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def configure(self, config: ModelConfig):
+        self.config = config
+        if config.local_threads:
+            torch.set_num_threads(config.local_threads)
+
+    def _ensure_model(self, model_name: str, token: Optional[str]):
+        """Load the model unless it is already resident. Runs on the inference thread."""
+        if self._model is not None and self._model_name == model_name:
+            return
+
+        logger.info(f"Loading HuggingFace model {model_name}")
+        processor = AutoProcessor.from_pretrained(model_name, token=token)
+        model = AutoModelForVision2Seq.from_pretrained(model_name, token=token)
+        model.eval()
+
+        if isinstance(processor, PreTrainedTokenizerBase):
+            # Encoder-decoder checkpoints (e.g. ViT + GPT-2) have no combined processor, only the two parts
+            self._tokenizer = processor
+            processor = AutoImageProcessor.from_pretrained(model_name, token=token)
+        else:
+            # Some processors only wrap the image processor, decode with the tokenizer then
+            self._tokenizer = None if hasattr(processor, "batch_decode") else AutoTokenizer.from_pretrained(
+                model_name, token=token
+            )
+        self._processor = processor
+        self._model = model
+        self._model_name = model_name
+        logger.info(f"Model {model_name} loaded")
+
+    def _infer(self, images: List[Image.Image], model_name: str, token: Optional[str]) -> List[str]:
+        self._ensure_model(model_name, token)
+        # Converted here rather than when queued, decoding the pixels would block the event loop
+        inputs = self._processor(images=[to_rgb(image) for image in images], return_tensors="pt")
+        with torch.inference_mode():
+            output = self._model.generate(**inputs, max_new_tokens=MAX_NEW_TOKENS)
+        decoder = self._tokenizer or self._processor
+        return [caption.strip() for caption in decoder.batch_decode(output, skip_special_tokens=True)]
+
+    def _ensure_worker(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._worker is None or self._worker.done():
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._worker = loop.create_task(self._batch_worker())
+
+    async def _batch_worker(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch: List[Tuple[Image.Image, asyncio.Future]] = [await self._queue.get()]
+            batch_size = max(1, self.config.local_batch_size)
+            deadline = loop.time() + self.config.local_max_wait_ms / 1000
+
+            # Gather more requests until the batch is full or the wait time is up
+            while len(batch) < batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            batch = [(image, future) for image, future in batch if not future.cancelled()]
+            if not batch:
+                continue
+
+            logger.debug(f"Running inference on a batch of {len(batch)} images")
+            try:
+                captions = await loop.run_in_executor(
+                    self._executor,
+                    self._infer,
+                    [image for image, _ in batch],
+                    self.config.model,
+                    self.config.api_key or None
+                )
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            for (_, future), caption in zip(batch, captions):
+                if not future.done():
+                    future.set_result(caption)
+
+    async def generate_caption(self, image: Image.Image, template: Optional[str] = None,
+                               examples: Optional[List[ExamplePair]] = None,
+                               usage: Optional[UsageStats] = None) -> str:
+        if not self.config:
+            logger.error("Provider not configured")
+            raise RuntimeError("Provider not configured")
+
+        try:
+            self._ensure_worker()
+            future = asyncio.get_running_loop().create_future()
+            await self._queue.put((image, future))
+            caption = await future
+            if usage is not None:
+                usage.add(None)
+            return caption
+        except Exception as e:
+            logger.error(f"Error generating caption: {str(e)}")
+            raise RuntimeError(f"Error generating caption: {str(e)}")
+
+    async def generate_captions(self, images: List[Image.Image], template: Optional[str] = None,
+                                examples: Optional[List[ExamplePair]] = None,
+                                usage: Optional[UsageStats] = None) -> List[str]:
+        # Queue all images at once so they end up in the same micro-batch
+        return list(await asyncio.gather(*[
+            self.generate_caption(image, template, examples, usage) for image in images
+        ]))
@@ -1,151 +1,358 @@
 # backend/app/services/providers/openai_provider.py
+import asyncio
 import base64
+import json
 import logging
 import os
-from io import BytesIO
-from typing import Optional, List
+from collections import OrderedDict
+from typing import AsyncIterator, Optional, List, Tuple, Union
+from urllib.parse import urlparse
 
 from PIL import Image
 from openai import AsyncOpenAI
 
-from .base_provider import BaseProvider
-from ...models import ModelConfig, ExamplePair
+from .base_provider import BaseProvider, MissingCaptionError, served_by
+from .hedging import HedgedCaller
+from ..image_utils import encode_for_upload
+from ...models import ModelConfig, ExamplePair, UsageStats
 
 logger = logging.getLogger(__name__)
 
+SYSTEM_PROMPT = "You are a highly accurate image captioning assistant..."
+
+# The client doesn't retry on its own: HedgedCaller enforces the request deadline, and retries go
+# through the router's failover or the caller's request limits
+CLIENT_MAX_RETRIES = 0
+
+# Encoded example images kept in memory. Prompt copies are at most 512 KB, so this holds ~90 of them.
+EXAMPLE_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+MULTI_IMAGE_INSTRUCTION = (
+    "Caption each of the {count} images below separately, following the same instructions "
+    "and style as before. Respond only with a JSON object of the form "
+    '{{"captions": [{{"image": 1, "caption": "..."}}, ...]}} containing exactly one entry '
+    "for every image number from 1 to {count}."
+)
+
 
 class OpenAIProvider(BaseProvider):
     def __init__(self):
         self.client: Optional[AsyncOpenAI] = None
         self.config: Optional[ModelConfig] = None
+        self._example_cache: "OrderedDict[Tuple[int, str], str]" = OrderedDict()
+        self._example_cache_bytes = 0
+        # One hedging state per request shape, multi-image requests are naturally slower
+        self._callers: dict = {}
+        # Request quota reported by the x-ratelimit-* headers of the last response
+        self.remaining_requests: Optional[int] = None
+        self.limit_requests: Optional[int] = None
+
+    @property
+    def name(self) -> str:
+        if self.config and self.config.base_url:
+            return f"{self.config.model}@{urlparse(self.config.base_url).netloc}"
+        return self.config.model if self.config else "openai"
 
     def configure(self, config: ModelConfig):
-        logger.info(f"Configuring OpenAI provider with model: {config.model}")
+        previous = self.config
         self.config = config
+        if (self.client is not None and previous is not None
+                and previous.api_key == config.api_key
+                and previous.base_url == config.base_url
+                and previous.request_timeout == config.request_timeout):
+            # Keep the existing client and its connection pool
+            return
         try:
-            self.client = AsyncOpenAI(api_key=config.api_key)
-            logger.info("OpenAI client initialized successfully")
+            self.client = AsyncOpenAI(
+                api_key=config.api_key,
+                base_url=config.base_url,
+                timeout=config.request_timeout,
+                max_retries=CLIENT_MAX_RETRIES
+            )
+            logger.info(f"OpenAI client initialized for model {config.model}")
         except Exception as e:
             logger.error(f"Failed to initialize OpenAI client: {str(e)}")
             raise
 
+    async def _create_completion(self, image_count: int, usage: Optional[UsageStats] = None, **kwargs):
+        """Send a chat completion with a deadline, hedging it if configured"""
+        caller = self._callers.setdefault(image_count, HedgedCaller())
+        sent = answered = 0
+
+        async def request():
+            nonlocal sent, answered
+            sent += 1
+            raw = await self.client.chat.completions.with_raw_response.create(**kwargs)
+            self._record_rate_limits(raw.headers)
+            response = raw.parse()
+            # Every answer is billed, a hedge that lost the race included
+            answered += 1
+            if usage is not None:
+                usage.add(response.usage)
+            return response
+
+        response, hedged = await caller.call(
+            request,
+            timeout=self.config.request_timeout,
+            hedge=self.config.hedge_requests,
+            max_ratio=self.config.hedge_max_ratio
+        )
+        if usage is not None:
+            # The request that was cancelled or failed when the other one won still counts
+            usage.requests += sent - answered
+            if hedged:
+                usage.hedged_requests += 1
+        served_by.set(self.name)
+        return response
+
+    def observed_latency(self, image_count: int = 1) -> Optional[float]:
+        """Median latency of recent requests with this many images, None before the first one"""
+        caller = self._callers.get(image_count)
+        return caller.latency.percentile(50) if caller else None
+
+    def _record_rate_limits(self, headers):
+        try:
+            remaining = headers.get("x-ratelimit-remaining-requests")
+            limit = headers.get("x-ratelimit-limit-requests")
+            if remaining is not None:
+                self.remaining_requests = int(remaining)
+            if limit is not None:
+                self.limit_requests = int(limit)
+        except (TypeError, ValueError):
+            pass
+
+    def _example_image_url(self, example: ExamplePair) -> Optional[str]:
+        """Data URL of an example's size-capped prompt copy, None if it cannot be read.
+
+        Cached per example rather than per example set, so per-image top-k
+        selections share the encoded images. Failures are not cached, the
+        next request tries again.
+        """
+        # Examples stored before prompt copies existed use the original
+        filename = example.prompt_filename or example.filename
+        key = (example.id, filename)
+        cached = self._example_cache.get(key)
+        if cached is not None:
+            self._example_cache.move_to_end(key)
+            return cached
+
+        example_path = os.path.join('/data/examples', filename)
+        try:
+            with open(example_path, 'rb') as img_file:
+                image_url = f"data:image/jpeg;base64,{base64.b64encode(img_file.read()).decode()}"
+        except FileNotFoundError:
+            logger.error(f"Example image not found: {example_path}")
+            return None
+        except Exception as e:
+            logger.error(f"Failed to process example {example.filename}: {str(e)}")
+            return None
+
+        self._example_cache[key] = image_url
+        self._example_cache_bytes += len(image_url)
+        while self._example_cache_bytes > EXAMPLE_CACHE_MAX_BYTES and len(self._example_cache) > 1:
+            _, evicted = self._example_cache.popitem(last=False)
+            self._example_cache_bytes -= len(evicted)
+        return image_url
+
+    def _build_prefix(self, template: Optional[str], examples: Optional[List[ExamplePair]]) -> List[dict]:
+        """Build the messages shared by every request using the same template and examples.
+
+        The prefix is always laid out as system prompt, template, then example
+        pairs ordered by id, so every request with the same template and
+        examples sends a byte-identical prefix. This lets provider-side prompt
+        caching hit on all requests after the first one.
+        """
+        messages = [{
+            "role": "system",
+            "content": SYSTEM_PROMPT
+        }]
+
+        if template:
+            messages.append({
+                "role": "user",
+                "content": [{"type": "text", "text": template}]
+            })
+
+        for example in sorted(examples or [], key=lambda example: example.id):
+            image_url = self._example_image_url(example)
+            if image_url is None:
+                continue
+            messages.append({
+                "role": "user",
+                "content": [
+                    {
+                        "type": "image_url",
+                        "image_url": {
+                            "url": image_url
+                        }
+                    }
+                ]
+            })
+            messages.append({
+                "role": "assistant",
+                "content": example.caption
+            })
+        return messages
+
+    async def _encode_image(self, image: Image.Image, usage: Optional[UsageStats] = None) -> str:
+        """Return the image as base64 JPEG, passing compliant source bytes through untouched"""
+        image_base64, passthrough = await asyncio.to_thread(
+            encode_for_upload,
+            image,
+            self.config.image_max_side,
+            self.config.image_max_bytes,
+            self.config.image_quality
+        )
+        if usage is not None:
+            if passthrough:
+                usage.passthrough_images += 1
+            else:
+                usage.reencoded_images += 1
+        return image_base64
+
     async def generate_caption(self, image: Image.Image, template: Optional[str] = None,
-                               examples: Optional[List[ExamplePair]] = None) -> str:
+                               examples: Optional[List[ExamplePair]] = None,
+                               usage: Optional[UsageStats] = None) -> str:
         if not self.client or not self.config:
             logger.error("Provider not configured")
             raise RuntimeError("Provider not configured")
 
-        logger.info("Starting caption generation process")
         try:
-            # Convert image to RGB if needed
-            if image.mode in ('RGBA', 'LA'):
-                logger.info(f"Converting image from {image.mode} to RGB")
-                background = Image.new('RGB', image.size, (255, 255, 255))
-                if image.mode == 'RGBA':
-                    background.paste(image, mask=image.split()[3])  # Use alpha channel as mask
-                else:
-                    background.paste(image, mask=image.split()[1])  # Use alpha channel as mask
-                image = background
-            elif image.mode != 'RGB':
-                logger.info(f"Converting image from {image.mode} to RGB")
-                image = image.convert('RGB')
-
-            # Initialize messages array
-            messages = [{
-                "role": "system",
-                "content": "You are a highly accurate image captioning assistant..."
-            }]
-
-            # Process examples
-            if examples:
-                logger.info(f"Processing {len(examples)} example pairs")
-                for i, example in enumerate(examples):
-                    try:
-                        # Load and process example image
-                        example_path = os.path.join('/data/examples', example.filename)
-                        if not os.path.exists(example_path):
-                            logger.error(f"Example image not found: {example_path}")
-                            continue
-
-                        with open(example_path, 'rb') as img_file:
-                            example_base64 = base64.b64encode(img_file.read()).decode()
-
-                        if i == 0 and template:
-                            messages.append({
-                                "role": "user",
-                                "content": [
-                                    {"type": "text", "text": template},
-                                    {
-                                        "type": "image_url",
-                                        "image_url": {
-                                            "url": f"data:image/jpeg;base64,{example_base64}"
-                                        }
-                                    }
-                                ]
-                            })
-                        else:
-                            messages.append({
-                                "role": "user",
-                                "content": [
-                                    {
-                                        "type": "image_url",
-                                        "image_url": {
-                                            "url": f"data:image/jpeg;base64,{example_base64}"
-                                        }
-                                    }
-                                ]
-                            })
-                        messages.append({
-                            "role": "assistant",
-                            "content": example.caption
-                        })
-                    except Exception as e:
-                        logger.error(f"Failed to process example {example.filename}: {str(e)}")
-                        continue
-
-            # Convert the target image to base64
-            buffered = BytesIO()
-            image.save(buffered, format="JPEG", quality=95)
-            image_base64 = base64.b64encode(buffered.getvalue()).decode()
-
-            # Add the target image message
-            if not examples and template:
-                messages.append({
-                    "role": "user",
-                    "content": [
-                        {"type": "text", "text": template},
-                        {
-                            "type": "image_url",
-                            "image_url": {
-                                "url": f"data:image/jpeg;base64,{image_base64}"
-                            }
-                        }
-                    ]
-                })
-            else:
-                messages.append({
-                    "role": "user",
-                    "content": [
-                        {
-                            "type": "image_url",
-                            "image_url": {
-                                "url": f"data:image/jpeg;base64,{image_base64}"
-                            }
-                        }
-                    ]
-                })
-
-            logger.info(f"Final message array has {len(messages)} messages")
-            response = await self.client.chat.completions.create(
+            response = await self._create_completion(
+                1,
+                usage,
                 model=self.config.model,
-                messages=messages,
+                messages=await self._caption_messages(image, template, examples, usage),
                 temperature=self.config.temperature
             )
 
-            caption = response.choices[0].message.content.strip()
-            logger.info("Caption generated successfully")
-            return caption
+            return response.choices[0].message.content.strip()
 
         except Exception as e:
             logger.error(f"Error generating caption: {str(e)}")
             raise RuntimeError(f"Error generating caption: {str(e)}")
+
+    async def _caption_messages(self, image: Image.Image, template: Optional[str],
+                                examples: Optional[List[ExamplePair]], usage: Optional[UsageStats]) -> List[dict]:
+        image_base64 = await self._encode_image(image, usage)
+        # Shared prefix first, the target image is the only per-request part
+        return self._build_prefix(template, examples) + [{
+            "role": "user",
+            "content": [
+                {
+                    "type": "image_url",
+                    "image_url": {
+                        "url": f"data:image/jpeg;base64,{image_base64}"
+                    }
+                }
+            ]
+        }]
+
+    async def stream_caption(self, image: Image.Image, template: Optional[str] = None,
+                             examples: Optional[List[ExamplePair]] = None,
+                             usage: Optional[UsageStats] = None) -> AsyncIterator[str]:
+        """Yield caption tokens as the completion streams in, usage arrives with the last chunk.
+
+        Streamed requests are not hedged, a duplicate would have to be
+        cancelled after its first token rather than when it completes.
+        """
+        if not self.client or not self.config:
+            logger.error("Provider not configured")
+            raise RuntimeError("Provider not configured")
+
+        try:
+            raw = await self.client.chat.completions.with_raw_response.create(
+                model=self.config.model,
+                messages=await self._caption_messages(image, template, examples, usage),
+                temperature=self.config.temperature,
+                stream=True,
+                stream_options={"include_usage": True}
+            )
+            self._record_rate_limits(raw.headers)
+            stream = raw.parse()
+            reported = False
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+                if getattr(chunk, "usage", None) is not None and usage is not None:
+                    usage.add(chunk.usage)
+                    reported = True
+            if usage is not None and not reported:
+                usage.add(None)  # endpoints that ignore include_usage still count the request
+            served_by.set(self.name)
+        except Exception as e:
+            logger.error(f"Error streaming caption: {str(e)}")
+            raise RuntimeError(f"Error streaming caption: {str(e)}")
+
+    async def generate_captions(self, images: List[Image.Image], template: Optional[str] = None,
+                                examples: Optional[List[ExamplePair]] = None,
+                                usage: Optional[UsageStats] = None) -> List[Union[str, Exception]]:
+        """Caption several images with a single request sharing one copy of the prefix.
+
+        Images whose caption is missing from a malformed or incomplete
+        response get a MissingCaptionError in their place. The caller retries
+        them, so the retries go through its own request limits.
+        """
+        if len(images) <= 1:
+            return [await self.generate_caption(image, template, examples, usage) for image in images]
+        if not self.client or not self.config:
+            logger.error("Provider not configured")
+            raise RuntimeError("Provider not configured")
+
+        try:
+            content = [{"type": "text", "text": MULTI_IMAGE_INSTRUCTION.format(count=len(images))}]
+            for number, image in enumerate(images, start=1):
+                content.append({"type": "text", "text": f"Image {number}:"})
+                content.append({
+                    "type": "image_url",
+                    "image_url": {
+                        "url": f"data:image/jpeg;base64,{await self._encode_image(image, usage)}"
+                    }
+                })
+            messages = self._build_prefix(template, examples) + [{"role": "user", "content": content}]
+
+            logger.debug(f"Requesting captions for {len(images)} images in one request")
+            response = await self._create_completion(
+                len(images),
+                usage,
+                model=self.config.model,
+                messages=messages,
+                temperature=self.config.temperature,
+                response_format={"type": "json_object"}
+            )
+        except Exception as e:
+            logger.error(f"Multi-image caption request failed: {str(e)}")
+            raise RuntimeError(f"Multi-image caption request failed: {str(e)}") from e
+
+        captions = self._parse_multi_caption_response(response.choices[0].message.content, len(images))
+        missing = len(images) - len(captions)
+        if missing:
+            logger.warning(f"Multi-image response has no caption for {missing} of {len(images)} images")
+        return [captions[index] if index in captions else MissingCaptionError(
+            f"No caption for image {index + 1} in the multi-image response") for index in range(len(images))]
+
+    @staticmethod
+    def _parse_multi_caption_response(content: Optional[str], count: int) -> dict:
+        """Return the valid captions of a multi-image response keyed by zero-based image index"""
+        try:
+            data = json.loads(content or "")
+        except ValueError:
+            logger.error("Multi-image response is not valid JSON")
+            return {}
+
+        entries = data.get("captions") if isinstance(data, dict) else None
+        if not isinstance(entries, list):
+            logger.error("Multi-image response has no captions list")
+            return {}
+
+        captions = {}
+        for entry in entries:
+            if not isinstance(entry, dict):
+                continue
+            number, caption = entry.get("image"), entry.get("caption")
+            if not isinstance(number, int) or not 1 <= number <= count:
+                continue
+            if not isinstance(caption, str) or not caption.strip() or (number - 1) in captions:
+                continue
+            captions[number - 1] = caption.strip()
+        return captions
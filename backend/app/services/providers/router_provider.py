@@ -0,0 +1,213 @@
+# backend/app/services/providers/router_provider.py
+import asyncio
+import logging
+import random
+import time
+from typing import AsyncIterator, Awaitable, Callable, List, Optional, TypeVar, Union
+
+import openai
+from PIL import Image
+
+from .base_provider import BaseProvider, served_by
+from .openai_provider import OpenAIProvider
+from ...models import ModelConfig, ExamplePair, UsageStats, BackendConfig
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Consecutive failures before a backend is ejected
+FAILURE_THRESHOLD = 3
+# First ejection period in seconds, doubled on every failed probe
+BASE_COOLDOWN = 30.0
+MAX_COOLDOWN = 300.0
+# Smoothing factor of the latency moving average
+LATENCY_ALPHA = 0.2
+# Status codes that say the backend, not the request, is the problem: bad key, wrong endpoint or model,
+# timeouts and rate limits. Other 4xx responses would fail the same way on every backend.
+BACKEND_STATUS_CODES = {401, 403, 404, 408, 429}
+
+
+def is_backend_failure(error: BaseException) -> bool:
+    """Whether an error counts against the backend's circuit breaker and warrants failing over.
+
+    Providers wrap their errors, so the cause chain is searched for the
+    original transport error or error response.
+    """
+    while error is not None:
+        if isinstance(error, (openai.APIConnectionError, asyncio.TimeoutError, TimeoutError, ConnectionError)):
+            return True
+        if isinstance(error, openai.APIStatusError):
+            return error.status_code >= 500 or error.status_code in BACKEND_STATUS_CODES
+        error = error.__cause__ or error.__context__
+    return False
+
+
+class _Backend:
+    """A routed backend together with its health and load statistics."""
+
+    def __init__(self, name: str, config: BackendConfig, provider: OpenAIProvider):
+        self.name = name
+        self.config = config
+        self.provider = provider
+        self.latency: Optional[float] = None
+        self.failures = 0
+        self.cooldown = BASE_COOLDOWN
+        self.open_until = 0.0
+        self.probing = False
+
+    def available(self, now: float) -> bool:
+        """Circuit breaker: closed, or open and ready for a single probe request"""
+        if self.failures < FAILURE_THRESHOLD:
+            return True
+        return now >= self.open_until and not self.probing
+
+    def score(self) -> float:
+        quota = 1.0
+        if self.provider.remaining_requests is not None and self.provider.limit_requests:
+            quota = max(0.05, self.provider.remaining_requests / self.provider.limit_requests)
+        latency = max(0.05, self.latency or 1.0)
+        return self.config.weight * quota / latency
+
+    def on_success(self, seconds: float):
+        self.latency = seconds if self.latency is None else (
+                LATENCY_ALPHA * seconds + (1 - LATENCY_ALPHA) * self.latency
+        )
+        self.failures = 0
+        self.cooldown = BASE_COOLDOWN
+        self.probing = False
+
+    def on_failure(self):
+        self.failures += 1
+        if self.probing:
+            self.cooldown = min(MAX_COOLDOWN, self.cooldown * 2)
+        self.probing = False
+        if self.failures >= FAILURE_THRESHOLD:
+            self.open_until = time.monotonic() + self.cooldown
+            logger.warning(f"Backend {self.name} ejected for {self.cooldown:.0f}s after {self.failures} failures")
+
+
+class RouterProvider(BaseProvider):
+    """Spreads requests over a pool of OpenAI-compatible backends.
+
+    Backends are picked at random, weighted by their configured weight, the
+    share of their request quota that is left and their recent latency.
+    Failing backends are ejected by a circuit breaker, and a request that
+    failed because of its backend is retried transparently on the next one.
+    Errors caused by the request itself, such as an unreadable image, are
+    raised right away and do not count against any backend.
+    """
+
+    def __init__(self):
+        self.config: Optional[ModelConfig] = None
+        self._backends: List[_Backend] = []
+
+    def configure(self, config: ModelConfig):
+        self.config = config
+        existing = {backend.name: backend for backend in self._backends}
+        backends = []
+        for i, backend_config in enumerate(config.backends or []):
+            name = backend_config.name or f"backend-{i + 1}"
+            backend = existing.get(name)
+            if backend is None:
+                backend = _Backend(name, backend_config, OpenAIProvider())
+            backend.config = backend_config
+            # Each backend shares the request settings but has its own key, model and endpoint
+            backend.provider.configure(config.model_copy(update={
+                "api_key": backend_config.api_key,
+                "model": backend_config.model or config.model,
+                "base_url": backend_config.base_url,
+                "backends": None
+            }))
+            backends.append(backend)
+        if [backend.name for backend in backends] != list(existing):
+            logger.info(f"Configured router with {len(backends)} backends")
+        self._backends = backends
+
+    def _select(self, exclude: set) -> Optional[_Backend]:
+        now = time.monotonic()
+        candidates = [b for b in self._backends if b.name not in exclude and b.available(now)]
+        if not candidates:
+            return None
+        backend = random.choices(candidates, weights=[b.score() for b in candidates])[0]
+        if backend.failures >= FAILURE_THRESHOLD:
+            backend.probing = True
+        return backend
+
+    async def _route(self, call: Callable[[OpenAIProvider], Awaitable[T]]) -> T:
+        if not self._backends:
+            raise RuntimeError("Provider not configured")
+
+        tried = set()
+        last_error: Optional[Exception] = None
+        while True:
+            backend = self._select(tried)
+            if backend is None:
+                break
+            tried.add(backend.name)
+            started = time.monotonic()
+            try:
+                result = await call(backend.provider)
+            except Exception as e:
+                if not is_backend_failure(e):
+                    raise
+                backend.on_failure()
+                last_error = e
+                logger.warning(f"Backend {backend.name} failed, failing over: {str(e)}")
+                continue
+            finally:
+                # A probe that was cancelled or failed on its request must not keep the backend ejected
+                backend.probing = False
+            backend.on_success(time.monotonic() - started)
+            served_by.set(backend.name)
+            return result
+
+        raise RuntimeError(f"All backends failed: {str(last_error) if last_error else 'none available'}")
+
+    async def generate_caption(self, image: Image.Image, template: Optional[str] = None,
+                               examples: Optional[List[ExamplePair]] = None,
+                               usage: Optional[UsageStats] = None) -> str:
+        return await self._route(lambda provider: provider.generate_caption(image, template, examples, usage))
+
+    async def generate_captions(self, images: List[Image.Image], template: Optional[str] = None,
+                                examples: Optional[List[ExamplePair]] = None,
+                                usage: Optional[UsageStats] = None) -> List[Union[str, Exception]]:
+        return await self._route(lambda provider: provider.generate_captions(images, template, examples, usage))
+
+    async def stream_caption(self, image: Image.Image, template: Optional[str] = None,
+                             examples: Optional[List[ExamplePair]] = None,
+                             usage: Optional[UsageStats] = None) -> AsyncIterator[str]:
+        """Stream from one backend, failing over only until the first token has been relayed"""
+        if not self._backends:
+            raise RuntimeError("Provider not configured")
+
+        tried = set()
+        last_error: Optional[Exception] = None
+        while True:
+            backend = self._select(tried)
+            if backend is None:
+                break
+            tried.add(backend.name)
+            started = time.monotonic()
+            relayed = False
+            try:
+                async for text in backend.provider.stream_caption(image, template, examples, usage):
+                    relayed = True
+                    yield text
+            except Exception as e:
+                if not is_backend_failure(e):
+                    raise
+                backend.on_failure()
+                if relayed:
+                    raise
+                last_error = e
+                logger.warning(f"Backend {backend.name} failed, failing over: {str(e)}")
+                continue
+            finally:
+                # Also runs when the client disconnects mid-stream (GeneratorExit) or the request is cancelled
+                backend.probing = False
+            backend.on_success(time.monotonic() - started)
+            served_by.set(backend.name)
+            return
+
+        raise RuntimeError(f"All backends failed: {str(last_error) if last_error else 'none available'}")
@@ -0,0 +1,106 @@
+# backend/app/services/run_state.py
+import math
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional
+
+from ..models import ProcessedItem
+
+# Items kept for the live feed, older results are paged from the database
+RECENT_ITEMS = 200
+# Seconds after which a throughput sample has half its weight
+THROUGHPUT_HALF_LIFE = 30.0
+# Completions are pooled until this much time has passed, so bursts do not produce huge rates
+MIN_SAMPLE_SECONDS = 1.0
+
+
+class RunState:
+    """Progress of one batch job in constant memory.
+
+    Counters are updated as results arrive, only the most recent items are
+    kept, and throughput is an exponentially weighted moving average over
+    time, so the ETA follows the current rate instead of the average since
+    the start of the job.
+    """
+
+    def __init__(self, total: int = 0, recent_size: int = RECENT_ITEMS,
+                 half_life: float = THROUGHPUT_HALF_LIFE):
+        self.total = total
+        self.processed = 0
+        self.errors = 0
+        self._recent_size = recent_size
+        self._half_life = half_life
+        # Normalized image path -> item, oldest first
+        self._recent: "OrderedDict[str, ProcessedItem]" = OrderedDict()
+        self._paths_by_id: Dict[int, str] = {}
+        self._rate: Optional[float] = None  # items per second
+        self._sample_start = time.monotonic()
+        self._sample_count = 0
+
+    def record(self, items: Iterable[ProcessedItem]):
+        count = 0
+        for item in items:
+            count += 1
+            if item.status == "error":
+                self.errors += 1
+            self._remember(item)
+        self.processed += count
+        self._sample(count)
+
+    def _remember(self, item: ProcessedItem):
+        path = os.path.normpath(item.image)
+        self._recent.pop(path, None)
+        self._recent[path] = item
+        self._paths_by_id[item.id] = path
+        while len(self._recent) > self._recent_size:
+            evicted_path, evicted = self._recent.popitem(last=False)
+            if self._paths_by_id.get(evicted.id) == evicted_path:
+                del self._paths_by_id[evicted.id]
+
+    def _sample(self, count: int):
+        self._sample_count += count
+        now = time.monotonic()
+        elapsed = now - self._sample_start
+        if elapsed < MIN_SAMPLE_SECONDS:
+            return
+        rate = self._sample_count / elapsed
+        if self._rate is None:
+            self._rate = rate
+        else:
+            weight = 1 - math.pow(0.5, elapsed / self._half_life)
+            self._rate += weight * (rate - self._rate)
+        self._sample_start = now
+        self._sample_count = 0
+
+    def restart_clock(self):
+        """Leave a pause out of the throughput"""
+        self._sample_start = time.monotonic()
+        self._sample_count = 0
+
+    def recent(self) -> List[ProcessedItem]:
+        return list(self._recent.values())
+
+    def find(self, item_id: int) -> Optional[ProcessedItem]:
+        path = self._paths_by_id.get(item_id)
+        return self._recent[path] if path else None
+
+    def get(self, image_path: str) -> Optional[ProcessedItem]:
+        return self._recent.get(os.path.normpath(image_path))
+
+    def replace(self, item: ProcessedItem):
+        """Update a recent item in place, e.g. after a caption edit"""
+        path = os.path.normpath(item.image)
+        if path in self._recent:
+            self._recent[path] = item
+
+    @property
+    def items_per_minute(self) -> Optional[float]:
+        return self._rate * 60 if self._rate is not None else None
+
+    def estimated_completion(self) -> Optional[datetime]:
+        remaining = self.total - self.processed
+        if not self._rate or remaining <= 0:
+            return None
+        return datetime.now() + timedelta(seconds=remaining / self._rate)
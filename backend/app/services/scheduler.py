@@ -0,0 +1,91 @@
+# backend/app/services/scheduler.py
+import asyncio
+import heapq
+import itertools
+import logging
+from contextlib import asynccontextmanager
+from enum import IntEnum
+from typing import Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class Priority(IntEnum):
+    INTERACTIVE = 0
+    BATCH = 1
+
+
+class RequestScheduler:
+    """Shares provider request slots between interactive and batch work.
+
+    At most `capacity` requests are in flight. `reserved` of those slots can
+    only be taken by interactive requests, and waiting interactive requests
+    are always granted before queued batch requests. A running batch thus
+    delays a Test panel request by at most the time it takes one in-flight
+    request to finish, and only when the reserved slots are busy too.
+    Requests already in flight are never interrupted.
+    """
+
+    def __init__(self, capacity: int = 8, reserved: int = 2):
+        self.capacity = 1
+        self.reserved = 0
+        self._in_flight: Dict[Priority, int] = {priority: 0 for priority in Priority}
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._order = itertools.count()
+        self.configure(capacity, reserved)
+
+    def configure(self, capacity: int, reserved: int):
+        self.capacity = max(1, capacity)
+        self.reserved = min(max(0, reserved), self.capacity - 1)
+        self._wake()
+
+    @property
+    def in_flight(self) -> Dict[str, int]:
+        return {priority.name.lower(): count for priority, count in self._in_flight.items()}
+
+    @property
+    def waiting(self) -> int:
+        return sum(1 for _, _, future in self._waiters if not future.done())
+
+    def _can_start(self, priority: Priority) -> bool:
+        if sum(self._in_flight.values()) >= self.capacity:
+            return False
+        if priority == Priority.BATCH:
+            return self._in_flight[Priority.BATCH] < self.capacity - self.reserved
+        return True
+
+    def _wake(self):
+        """Grant free slots to waiters, highest priority first, then in arrival order"""
+        while self._waiters:
+            priority, _, future = self._waiters[0]
+            if future.done():
+                # Cancelled while waiting
+                heapq.heappop(self._waiters)
+                continue
+            if not self._can_start(Priority(priority)):
+                break
+            heapq.heappop(self._waiters)
+            self._in_flight[Priority(priority)] += 1
+            future.set_result(None)
+
+    def _release(self, priority: Priority):
+        self._in_flight[priority] -= 1
+        self._wake()
+
+    @asynccontextmanager
+    async def slot(self, priority: Priority):
+        """Hold one request slot for the duration of the block"""
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (int(priority), next(self._order), future))
+        self._wake()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # The slot was granted just before the cancellation arrived
+                self._release(priority)
+            raise
+        try:
+            yield
+        finally:
+            self._release(priority)
@@ -43,7 +43,11 @@ class SettingsService:
                 temperature=settings_update.temperature or 0.5,
                 batch_size=settings_update.batch_size or 50,
                 error_handling=settings_update.error_handling or "continue",
-                concurrent_processing=settings_update.concurrent_processing or 2
+                concurrent_processing=settings_update.concurrent_processing or 2,
+                example_top_k=settings_update.example_top_k,
+                images_per_request=settings_update.images_per_request or 1,
+                request_timeout=settings_update.request_timeout or 60.0,
+                hedge_requests=bool(settings_update.hedge_requests)
             )
             self._db.add(settings)
             self._db.commit()
@@ -58,6 +62,10 @@ class SettingsService:
             settings.batch_size = settings_update.batch_size if settings_update.batch_size is not None else settings.batch_size
             settings.error_handling = settings_update.error_handling if settings_update.error_handling is not None else settings.error_handling
             settings.concurrent_processing = settings_update.concurrent_processing if settings_update.concurrent_processing is not None else settings.concurrent_processing
+            settings.example_top_k = settings_update.example_top_k if settings_update.example_top_k is not None else settings.example_top_k
+            settings.images_per_request = settings_update.images_per_request if settings_update.images_per_request is not None else settings.images_per_request
+            settings.request_timeout = settings_update.request_timeout if settings_update.request_timeout is not None else settings.request_timeout
+            settings.hedge_requests = settings_update.hedge_requests if settings_update.hedge_requests is not None else settings.hedge_requests
             self._db.commit()
             self._db.refresh(settings)
 
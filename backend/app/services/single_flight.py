@@ -0,0 +1,69 @@
+# backend/app/services/single_flight.py
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, Hashable, Tuple, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """Coalesces identical concurrent calls so only one of them does the work.
+
+    The first caller for a key starts the work, later callers with the same
+    key await its result. The work runs as its own task, so a leader whose
+    request is cancelled (e.g. the client went away) does not fail the
+    followers still waiting on it. Once every caller has been cancelled, the
+    work is cancelled too.
+
+    The task runs in a copy of the leader's context, so context variables it
+    sets are not seen by any caller; work that needs to report them must
+    return them with its result.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, asyncio.Task] = {}
+        self._waiters: Dict[asyncio.Task, int] = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._calls)
+
+    def stats(self) -> Dict[str, int]:
+        return {"leaders": self.leaders, "coalesced": self.coalesced, "in_flight": self.in_flight}
+
+    async def do(self, key: Hashable, work: Callable[[], Awaitable[T]]) -> Tuple[T, bool]:
+        """Return the result for key and whether it was shared from another caller's request"""
+        task = self._calls.get(key)
+        shared = task is not None
+        if shared:
+            self.coalesced += 1
+        else:
+            task = asyncio.ensure_future(work())
+            self._calls[key] = task
+            self._waiters[task] = 0
+            self.leaders += 1
+            task.add_done_callback(lambda done: self._finish(key, done))
+
+        self._waiters[task] += 1
+        try:
+            return await asyncio.shield(task), shared
+        except asyncio.CancelledError:
+            if not task.done() and self._waiters[task] == 1:
+                # Nobody is left to use the result, e.g. the batch was stopped
+                task.cancel()
+            raise
+        finally:
+            if task in self._waiters:
+                self._waiters[task] -= 1
+
+    def _finish(self, key: Hashable, task: asyncio.Task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        self._waiters.pop(task, None)
+        # Mark the exception as retrieved in case every caller was cancelled
+        if not task.cancelled():
+            task.exception()
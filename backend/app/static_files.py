@@ -0,0 +1,56 @@
+# backend/app/static_files.py
+import os
+import re
+from typing import Optional
+
+from starlette.datastructures import Headers, QueryParams
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+from starlette.types import Scope
+
+# URLs whose bytes can never change are cached for a year without revalidating
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+# Everything else is kept but revalidated, which costs a 304 when the file is unchanged
+REVALIDATE_CACHE_CONTROL = "no-cache"
+
+# Larger reads than Starlette's 64 KB default, dataset images are usually several megabytes
+CHUNK_SIZE = 1024 * 1024
+
+# Stored examples are named "{timestamp}_{sha256[:8]}_{name}", see CaptionService.save_examples
+HASHED_EXAMPLE_NAME = re.compile(r"^\d{8}_\d{6}_[0-9a-f]{8}_")
+
+
+def file_version(stat_result: os.stat_result) -> str:
+    """Token that changes whenever a file is rewritten, for use as the ?v= parameter of its URL"""
+    return f"{stat_result.st_mtime_ns:x}-{stat_result.st_size:x}"
+
+
+class CachedStaticFiles(StaticFiles):
+    """StaticFiles with a cache policy.
+
+    Starlette already answers conditional requests (ETag, Last-Modified) and
+    byte ranges. This adds Cache-Control: immutable for content-addressed URLs,
+    meaning a filename matching `immutable_names` or a `?v=` equal to the
+    file's current version, and revalidation for everything else.
+    """
+
+    def __init__(self, *args, immutable_names: Optional[re.Pattern] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.immutable_names = immutable_names
+
+    def _is_immutable(self, full_path: str, stat_result: os.stat_result, scope: Scope) -> bool:
+        if self.immutable_names and self.immutable_names.match(os.path.basename(full_path)):
+            return True
+        return QueryParams(scope["query_string"]).get("v") == file_version(stat_result)
+
+    def file_response(self, full_path, stat_result: os.stat_result, scope: Scope,
+                      status_code: int = 200) -> Response:
+        response = FileResponse(full_path, status_code=status_code, stat_result=stat_result)
+        response.chunk_size = CHUNK_SIZE
+        response.headers["Cache-Control"] = (IMMUTABLE_CACHE_CONTROL
+                                             if self._is_immutable(full_path, stat_result, scope)
+                                             else REVALIDATE_CACHE_CONTROL)
+        # Checked after Cache-Control is set, so a 304 refreshes the cached policy too
+        if self.is_not_modified(response.headers, Headers(scope=scope)):
+            return NotModifiedResponse(response.headers)
+        return response
@@ -0,0 +1,59 @@
+# backend/benchmarks/corpus.py
+"""Synthetic image corpora for the benchmarks."""
+import os
+import random
+from typing import Dict, List, Tuple
+
+from PIL import Image
+
+# name -> (width, height, mode, format)
+PROFILES: Dict[str, Tuple[int, int, str, str]] = {
+    "small_jpeg": (1024, 768, "RGB", "JPEG"),
+    "rgba_png": (1600, 1200, "RGBA", "PNG"),
+    "palette_png": (1200, 900, "P", "PNG"),
+    "huge_jpeg": (8000, 6000, "RGB", "JPEG"),
+}
+
+CORPORA: Dict[str, List[str]] = {
+    "small": ["small_jpeg"],
+    "mixed": ["small_jpeg", "rgba_png", "palette_png"],
+    "huge": ["huge_jpeg"],
+    "all": list(PROFILES),
+}
+
+
+def _make_image(width: int, height: int, mode: str, rng: random.Random) -> Image.Image:
+    # A noisy gradient compresses like a photo, unlike a flat colour
+    base = Image.linear_gradient("L").resize((width, height))
+    noise = Image.effect_noise((width, height), 40 + rng.random() * 40)
+    channels = [Image.blend(base, noise, rng.random()) for _ in range(3)]
+    image = Image.merge("RGB", channels)
+    if mode == "RGBA":
+        image.putalpha(base)
+    elif mode == "P":
+        image = image.quantize(colors=128)
+    return image
+
+
+def generate_corpus(directory: str, corpus: str = "mixed", count: int = 50, seed: int = 0) -> List[str]:
+    """Write `count` images cycling through the corpus profiles and return their paths.
+
+    Existing files are reused so repeated runs do not pay for generation again.
+    """
+    os.makedirs(directory, exist_ok=True)
+    rng = random.Random(seed)
+    profiles = CORPORA[corpus]
+    cache: Dict[str, Image.Image] = {}
+    paths = []
+    for i in range(count):
+        profile = profiles[i % len(profiles)]
+        width, height, mode, image_format = PROFILES[profile]
+        extension = "jpg" if image_format == "JPEG" else "png"
+        path = os.path.join(directory, f"{profile}_{i:05d}.{extension}")
+        if not os.path.exists(path):
+            if profile not in cache:
+                cache[profile] = _make_image(width, height, mode, rng)
+            save_options = {"quality": 90} if image_format == "JPEG" else {}
+            cache[profile].save(path, format=image_format, **save_options)
+        paths.append(path)
+    return paths
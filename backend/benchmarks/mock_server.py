@@ -0,0 +1,119 @@
+# backend/benchmarks/mock_server.py
+"""Local mock of the OpenAI chat completions API used by the benchmarks.
+
+Latency follows a log-normal distribution, and a configurable share of the
+requests fail with a 500 or are rejected with a 429, like a loaded upstream.
+
+    python -m benchmarks.mock_server --port 8089 --latency-ms 800 --error-rate 0.01
+"""
+import argparse
+import asyncio
+import json
+import math
+import random
+import time
+import uuid
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+
+def create_mock_app(
+        latency_ms: float = 500.0,
+        latency_sigma: float = 0.5,
+        error_rate: float = 0.0,
+        rate_limit_rate: float = 0.0,
+        response_words: int = 60,
+        seed: int = 0
+) -> FastAPI:
+    app = FastAPI()
+    rng = random.Random(seed)
+    caption = " ".join(f"word{i % 50}" for i in range(response_words))
+    stats = {"requests": 0, "errors": 0, "rate_limited": 0}
+
+    @app.get("/stats")
+    async def get_stats():
+        return stats
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        stats["requests"] += 1
+
+        roll = rng.random()
+        if roll < rate_limit_rate:
+            stats["rate_limited"] += 1
+            return JSONResponse(
+                status_code=429,
+                content={"error": {"message": "Rate limit reached", "type": "requests"}},
+                headers={"retry-after-ms": "50"}
+            )
+        if roll < rate_limit_rate + error_rate:
+            stats["errors"] += 1
+            return JSONResponse(status_code=500, content={"error": {"message": "Mock server error"}})
+
+        await asyncio.sleep(rng.lognormvariate(math.log(latency_ms / 1000), latency_sigma))
+
+        # Rough usage numbers so cost and cache accounting have something to add up
+        messages = body.get("messages", [])
+        images = sum(
+            1 for message in messages if isinstance(message.get("content"), list)
+            for part in message["content"] if part.get("type") == "image_url"
+        )
+        prompt_tokens = 85 * images + len(json.dumps(messages)) // 1000
+        content = caption
+        if body.get("response_format", {}).get("type") == "json_object":
+            last = messages[-1]["content"]
+            count = sum(1 for part in last if part.get("type") == "image_url")
+            content = json.dumps({"captions": [{"image": i, "caption": caption} for i in range(1, count + 1)]})
+
+        return JSONResponse(
+            content={
+                "id": f"chatcmpl-{uuid.uuid4().hex}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": body.get("model", "mock"),
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": content},
+                    "finish_reason": "stop"
+                }],
+                "usage": {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": response_words,
+                    "total_tokens": prompt_tokens + response_words,
+                    "prompt_tokens_details": {"cached_tokens": 0}
+                }
+            },
+            headers={
+                "x-ratelimit-limit-requests": "10000",
+                "x-ratelimit-remaining-requests": str(10000 - stats["requests"] % 10000)
+            }
+        )
+
+    return app
+
+
+def serve(port: int, **options):
+    import uvicorn
+
+    uvicorn.run(create_mock_app(**options), host="127.0.0.1", port=port, log_level="warning")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mock OpenAI chat completions server")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency-ms", type=float, default=500.0)
+    parser.add_argument("--latency-sigma", type=float, default=0.5)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--response-words", type=int, default=60)
+    args = parser.parse_args()
+    serve(
+        args.port,
+        latency_ms=args.latency_ms,
+        latency_sigma=args.latency_sigma,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        response_words=args.response_words
+    )
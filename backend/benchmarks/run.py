@@ -0,0 +1,331 @@
+# backend/benchmarks/run.py
+"""Benchmark the caption engine against a local mock OpenAI-compatible server.
+
+Each scenario runs in a fresh process so CPU time and peak RSS are not
+polluted by the others. Results are written as JSON and can be compared
+with an earlier run:
+
+    cd backend
+    python -m benchmarks.run --images 200 --corpus mixed --latency-ms 300
+    python -m benchmarks.run --compare benchmarks/results/<old-commit>.json
+
+Scenarios:
+    provider  OpenAIProvider.generate_caption on already opened images
+    single    CaptionService.generate_single_caption with in-memory uploads
+    batch     a complete batch job over the corpus folder
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import queue as queue_module
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from datetime import datetime
+from io import BytesIO
+from typing import Dict, List
+
+from .corpus import CORPORA, generate_corpus
+from .mock_server import serve
+
+SCENARIOS = ["provider", "single", "batch"]
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+# How often a running scenario is checked for having died without reporting
+POLL_SECONDS = 1.0
+
+
+def _percentile(values: List[float], p: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+
+def _model_config(server_url: str):
+    from app.models import ModelConfig
+
+    return ModelConfig(
+        provider="openai",
+        model="mock-vision",
+        api_key="mock",
+        base_url=f"{server_url}/v1",
+        cost_per_token=0.01,
+        temperature=0.5
+    )
+
+
+async def _bench_provider(paths: List[str], options: dict) -> Dict:
+    from PIL import Image
+    from app.services.providers import OpenAIProvider
+
+    provider = OpenAIProvider()
+    provider.configure(_model_config(options["server_url"]))
+    sem = asyncio.Semaphore(options["concurrency"])
+    latencies, errors = [], 0
+
+    async def run(path):
+        nonlocal errors
+        async with sem:
+            started = time.perf_counter()
+            try:
+                with Image.open(path) as image:
+                    await provider.generate_caption(image)
+                latencies.append(time.perf_counter() - started)
+            except Exception:
+                errors += 1
+
+    await asyncio.gather(*[run(path) for path in paths])
+    return {"latencies": latencies, "errors": errors}
+
+
+async def _bench_single(paths: List[str], options: dict) -> Dict:
+    from fastapi import UploadFile
+    from app.services.caption_service import CaptionService
+
+    service = CaptionService()
+    model_config = _model_config(options["server_url"])
+    sem = asyncio.Semaphore(options["concurrency"])
+    latencies, errors = [], 0
+
+    async def run(path):
+        nonlocal errors
+        with open(path, "rb") as f:
+            upload = UploadFile(file=BytesIO(f.read()), filename=os.path.basename(path))
+        async with sem:
+            started = time.perf_counter()
+            try:
+                await service.generate_single_caption(upload, model_config)
+                latencies.append(time.perf_counter() - started)
+            except Exception:
+                errors += 1
+
+    await asyncio.gather(*[run(path) for path in paths])
+    return {"latencies": latencies, "errors": errors}
+
+
+async def _bench_batch(paths: List[str], options: dict) -> Dict:
+    from app.models import ProcessingConfig
+    from app.services.caption_service import CaptionService
+
+    service = CaptionService()
+    latencies = []
+    process_group = service._process_image_group
+
+    # Time every provider round trip, a group's latency counts for each of its images
+    async def timed_group(image_paths, *args, **kwargs):
+        started = time.perf_counter()
+        items = await process_group(image_paths, *args, **kwargs)
+        latencies.extend([time.perf_counter() - started] * len(image_paths))
+        return items
+
+    service._process_image_group = timed_group
+    await service.start_batch_processing(
+        folder_path=os.path.dirname(paths[0]),
+        model_config=_model_config(options["server_url"]),
+        processing_config=ProcessingConfig(
+            batch_size=options["batch_size"],
+            concurrent_processing=options["concurrency"],
+            images_per_request=options["images_per_request"]
+        ),
+        reprocess=True
+    )
+    await service._processing_task
+    errors = service.get_processing_status().errorCount
+    return {"latencies": latencies, "errors": errors}
+
+
+def _run_scenario(name: str, paths: List[str], options: dict, queue):
+    """Entry point of the per-scenario subprocess"""
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(options['work_dir'], name + '.db')}"
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+    from app.database import init_db
+    import app.services.caption_service  # noqa: F401 keep import time out of the measurement
+
+    init_db()
+    baseline_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    cpu_start = time.process_time()
+    started = time.perf_counter()
+
+    bench = {"provider": _bench_provider, "single": _bench_single, "batch": _bench_batch}[name]
+    result = asyncio.run(bench(paths, options))
+
+    wall = time.perf_counter() - started
+    cpu = time.process_time() - cpu_start
+    latencies = result["latencies"]
+    queue.put({
+        "images": len(paths),
+        "errors": result["errors"],
+        "wall_seconds": round(wall, 3),
+        "images_per_second": round(len(latencies) / wall, 3) if wall else 0.0,
+        "latency_ms": {
+            "p50": round(_percentile(latencies, 50) * 1000, 1),
+            "p95": round(_percentile(latencies, 95) * 1000, 1),
+            "p99": round(_percentile(latencies, 99) * 1000, 1),
+        },
+        "cpu_seconds": round(cpu, 3),
+        "cpu_percent": round(100 * cpu / wall, 1) if wall else 0.0,
+        # ru_maxrss is reported in kilobytes on Linux
+        "baseline_rss_mb": round(baseline_rss / 1024, 1),
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    })
+
+
+def _collect_metrics(process, queue, timeout: float) -> dict:
+    """Wait for a scenario's metrics, raising if its process dies first or it runs out of time"""
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            return queue.get(timeout=POLL_SECONDS)
+        except queue_module.Empty:
+            pass
+        if not process.is_alive():
+            try:
+                # The metrics may have arrived just before the process exited
+                return queue.get(timeout=POLL_SECONDS)
+            except queue_module.Empty:
+                raise RuntimeError(f"exited with code {process.exitcode} without reporting metrics")
+        if time.monotonic() > deadline:
+            process.terminate()
+            raise RuntimeError(f"did not finish within {timeout:g}s")
+
+
+def _wait_for_server(url: str, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            urllib.request.urlopen(f"{url}/stats", timeout=1)
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError("Mock server did not start")
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except Exception:
+        return "unknown"
+
+
+def _compare(current: dict, baseline: dict):
+    print(f"\nComparison with {baseline.get('commit')} ({baseline.get('timestamp')})")
+    for name, metrics in current["scenarios"].items():
+        old = baseline.get("scenarios", {}).get(name)
+        if not old or "error" in metrics or "error" in old:
+            continue
+        for key, new_value, old_value in [
+            ("images/s", metrics["images_per_second"], old["images_per_second"]),
+            ("p50 ms", metrics["latency_ms"]["p50"], old["latency_ms"]["p50"]),
+            ("p99 ms", metrics["latency_ms"]["p99"], old["latency_ms"]["p99"]),
+            ("cpu s", metrics["cpu_seconds"], old["cpu_seconds"]),
+            ("peak rss MB", metrics["peak_rss_mb"], old["peak_rss_mb"]),
+        ]:
+            change = (new_value - old_value) / old_value * 100 if old_value else 0.0
+            print(f"  {name:<9} {key:<12} {old_value:>10} -> {new_value:>10} ({change:+.1f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Caption engine benchmarks")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument("--images", type=int, default=100)
+    parser.add_argument("--corpus", choices=list(CORPORA), default="mixed")
+    parser.add_argument("--corpus-dir", default=None, help="reuse generated images between runs")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--batch-size", type=int, default=50)
+    parser.add_argument("--images-per-request", type=int, default=1)
+    parser.add_argument("--latency-ms", type=float, default=300.0)
+    parser.add_argument("--latency-sigma", type=float, default=0.5)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--response-words", type=int, default=60)
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--scenario-timeout", type=float, default=3600.0, help="seconds before a scenario is stopped")
+    parser.add_argument("--output", default=None)
+    parser.add_argument("--compare", default=None, help="earlier result file to compare with")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="labela-bench-")
+    corpus_dir = args.corpus_dir or os.path.join(work_dir, "corpus")
+    print(f"Generating {args.images} '{args.corpus}' images in {corpus_dir}")
+    paths = generate_corpus(corpus_dir, args.corpus, args.images)
+
+    server_options = {
+        "latency_ms": args.latency_ms,
+        "latency_sigma": args.latency_sigma,
+        "error_rate": args.error_rate,
+        "rate_limit_rate": args.rate_limit_rate,
+        "response_words": args.response_words,
+    }
+    context = multiprocessing.get_context("spawn")
+    server = context.Process(target=serve, args=(args.port,), kwargs=server_options, daemon=True)
+    server.start()
+    server_url = f"http://127.0.0.1:{args.port}"
+
+    options = {
+        "server_url": server_url,
+        "work_dir": work_dir,
+        "concurrency": args.concurrency,
+        "batch_size": args.batch_size,
+        "images_per_request": args.images_per_request,
+    }
+    results = {
+        "commit": _git_commit(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "config": {**vars(args), **server_options},
+        "scenarios": {},
+    }
+    failed = []
+    try:
+        _wait_for_server(server_url)
+        for name in args.scenarios:
+            queue = context.Queue()
+            process = context.Process(target=_run_scenario, args=(name, paths, options, queue))
+            process.start()
+            try:
+                metrics = _collect_metrics(process, queue, args.scenario_timeout)
+            except RuntimeError as e:
+                metrics = {"error": str(e)}
+                failed.append(name)
+            finally:
+                process.join()
+            results["scenarios"][name] = metrics
+            if "error" in metrics:
+                print(f"{name:<9} FAILED: {metrics['error']}")
+            else:
+                print(f"{name:<9} {metrics['images_per_second']:>8.2f} img/s  "
+                      f"p50 {metrics['latency_ms']['p50']:>8.1f} ms  p95 {metrics['latency_ms']['p95']:>8.1f} ms  "
+                      f"p99 {metrics['latency_ms']['p99']:>8.1f} ms  cpu {metrics['cpu_seconds']:>7.2f} s  "
+                      f"peak rss {metrics['peak_rss_mb']:>7.1f} MB  errors {metrics['errors']}")
+            # The batch scenario writes caption sidecars next to the corpus
+            for path in paths:
+                caption_path = os.path.splitext(path)[0] + ".txt"
+                if os.path.exists(caption_path):
+                    os.remove(caption_path)
+    finally:
+        server.terminate()
+
+    output = args.output or os.path.join(RESULTS_DIR, f"{results['commit']}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            _compare(results, json.load(f))
+
+    if not args.corpus_dir:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    if failed:
+        sys.exit(f"Failed scenarios: {', '.join(failed)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+# backend/benchmarks/startup.py
+"""Measure how fast the API becomes available after a (container) restart.
+
+Every run starts a fresh interpreter, so nothing is cached in-process:
+
+    cd backend
+    python -m benchmarks.startup --runs 5
+
+import     seconds to import app.main
+healthy    seconds from spawning uvicorn until /health answers
+rss        resident memory of the server once healthy
+"""
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from typing import Dict, List
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMPORT_SCRIPT = """
+import time
+started = time.perf_counter()
+import app.main
+print(time.perf_counter() - started)
+"""
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _rss_mb(pid: int) -> float:
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def _measure_import(env: Dict[str, str]) -> float:
+    output = subprocess.check_output([sys.executable, "-c", IMPORT_SCRIPT], cwd=BACKEND_DIR, env=env, text=True,
+                                     stderr=subprocess.DEVNULL)
+    return float(output.strip().splitlines()[-1])
+
+
+def _measure_healthy(env: Dict[str, str], timeout: float) -> Dict[str, float]:
+    port = _free_port()
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port)],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        deadline = started + timeout
+        while time.perf_counter() < deadline:
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=1) as response:
+                    body = json.load(response)
+                healthy = time.perf_counter() - started
+                return {"healthy": healthy, "rss_mb": _rss_mb(server.pid), "startup": body.get("startup", {})}
+            except OSError:
+                time.sleep(0.02)
+        raise RuntimeError(f"Server did not become healthy within {timeout}s")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def _summary(values: List[float]) -> Dict[str, float]:
+    ordered = sorted(values)
+    return {"min": round(ordered[0], 3), "median": round(ordered[len(ordered) // 2], 3),
+            "max": round(ordered[-1], 3)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="API startup benchmark")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--database-url", default=None, help="defaults to a temporary SQLite database")
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="labela-startup-")
+    env = dict(os.environ, DATABASE_URL=args.database_url or f"sqlite:///{os.path.join(work_dir, 'startup.db')}")
+
+    imports, healthy, rss = [], [], []
+    for run in range(args.runs):
+        imports.append(_measure_import(env))
+        result = _measure_healthy(env, args.timeout)
+        healthy.append(result["healthy"])
+        rss.append(result["rss_mb"])
+        print(f"run {run + 1}: import {imports[-1]:.3f} s  healthy {healthy[-1]:.3f} s  "
+              f"rss {rss[-1]:.1f} MB  server timings {result['startup']}")
+
+    results = {"import_seconds": _summary(imports), "healthy_seconds": _summary(healthy),
+               "rss_mb": _summary(rss)}
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
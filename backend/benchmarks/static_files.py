@@ -0,0 +1,151 @@
+# backend/benchmarks/static_files.py
+"""Load test of the static mounts that serve dataset images and examples.
+
+Starts uvicorn on a temporary folder of images, once with Starlette's plain
+StaticFiles and once with CachedStaticFiles, and hammers each with
+concurrent requests:
+
+    cd backend
+    python -m benchmarks.static_files --images 20 --size-mb 4 --requests 400
+
+full         cold GET of the whole file
+revalidate   repeat view, If-None-Match with the ETag of the first response
+range        GET of the first 64 KB, as a video or progressive decoder would
+"""
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def create_app():
+    """Application factory for uvicorn, configured through the environment by main()"""
+    from starlette.applications import Starlette
+    from starlette.routing import Mount
+    from starlette.staticfiles import StaticFiles
+    from app.static_files import CachedStaticFiles
+
+    files_class = CachedStaticFiles if os.environ["STATIC_BENCH_CLASS"] == "cached" else StaticFiles
+    return Starlette(routes=[Mount("/data", files_class(directory=os.environ["STATIC_BENCH_DIR"]))])
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _write_images(directory: str, count: int, size_mb: float) -> List[str]:
+    names = []
+    for i in range(count):
+        name = f"image_{i:04d}.jpg"
+        with open(os.path.join(directory, name), "wb") as f:
+            f.write(os.urandom(int(size_mb * 1024 * 1024)))
+        names.append(name)
+    return names
+
+
+def _get(url: str, headers: Dict[str, str]) -> Dict:
+    request = urllib.request.Request(url, headers=headers)
+    started = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=30) as response:
+            status, body, response_headers = response.status, response.read(), response.headers
+    except urllib.error.HTTPError as e:
+        # urllib reports 304 as an error
+        status, body, response_headers = e.code, e.read(), e.headers
+    return {"status": status, "bytes": len(body), "seconds": time.perf_counter() - started,
+            "etag": response_headers.get("etag"), "cache_control": response_headers.get("cache-control")}
+
+
+def _run_phase(urls: List[str], headers: List[Dict[str, str]], concurrency: int) -> Dict:
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        results = list(pool.map(_get, urls, headers))
+    elapsed = time.perf_counter() - started
+    latencies = sorted(result["seconds"] for result in results)
+    statuses: Dict[int, int] = {}
+    for result in results:
+        statuses[result["status"]] = statuses.get(result["status"], 0) + 1
+    return {
+        "requests_per_second": round(len(results) / elapsed, 1),
+        "p50_ms": round(latencies[len(latencies) // 2] * 1000, 2),
+        "p95_ms": round(latencies[int(len(latencies) * 0.95)] * 1000, 2),
+        "mb_transferred": round(sum(result["bytes"] for result in results) / 1024 / 1024, 2),
+        "statuses": statuses,
+        "cache_control": results[0]["cache_control"]
+    }
+
+
+def _benchmark(files_class: str, directory: str, names: List[str], requests: int, concurrency: int,
+               timeout: float) -> Dict:
+    port = _free_port()
+    env = dict(os.environ, STATIC_BENCH_CLASS=files_class, STATIC_BENCH_DIR=directory)
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "benchmarks.static_files:create_app", "--factory",
+         "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        base = f"http://127.0.0.1:{port}/data/"
+        deadline = time.perf_counter() + timeout
+        etags: Optional[Dict[str, str]] = None
+        while etags is None:
+            try:
+                etags = {name: _get(base + name, {})["etag"] for name in names}
+            except OSError:
+                if time.perf_counter() > deadline:
+                    raise RuntimeError(f"Server did not start within {timeout}s")
+                time.sleep(0.05)
+
+        urls = [base + names[i % len(names)] for i in range(requests)]
+        return {
+            "full": _run_phase(urls, [{}] * requests, concurrency),
+            "revalidate": _run_phase(urls, [{"If-None-Match": etags[url.rsplit("/", 1)[1]]} for url in urls],
+                                     concurrency),
+            "range": _run_phase(urls, [{"Range": "bytes=0-65535"}] * requests, concurrency)
+        }
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Static file serving benchmark")
+    parser.add_argument("--images", type=int, default=20)
+    parser.add_argument("--size-mb", type=float, default=4.0)
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix="labela-static-")
+    names = _write_images(directory, args.images, args.size_mb)
+
+    results = {}
+    for files_class in ("plain", "cached"):
+        results[files_class] = _benchmark(files_class, directory, names, args.requests, args.concurrency,
+                                          args.timeout)
+        for phase, phase_result in results[files_class].items():
+            print(f"{files_class:7s} {phase:10s} {phase_result['requests_per_second']:8.1f} req/s  "
+                  f"p50 {phase_result['p50_ms']:7.2f} ms  p95 {phase_result['p95_ms']:7.2f} ms  "
+                  f"{phase_result['mb_transferred']:9.2f} MB  {phase_result['statuses']}")
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
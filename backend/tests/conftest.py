@@ -0,0 +1,5 @@
+# backend/tests/conftest.py
+import os
+
+# Importing app.models creates the engine, so tests run without the compose Postgres
+os.environ.setdefault("DATABASE_URL", "sqlite://")
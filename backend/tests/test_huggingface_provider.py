@@ -0,0 +1,122 @@
+# backend/tests/test_huggingface_provider.py
+import asyncio
+
+import pytest
+import torch
+from PIL import Image
+from tokenizers import Tokenizer, models, pre_tokenizers
+from transformers import (
+    GPT2Config, PreTrainedTokenizerFast, ViTConfig, ViTImageProcessor, VisionEncoderDecoderConfig,
+    VisionEncoderDecoderModel
+)
+
+from app.models import ModelConfig
+from app.services.providers.huggingface_provider import HuggingFaceProvider
+
+VOCAB = ["[PAD]", "[BOS]", "[EOS]", "[UNK]", "a", "red", "blue", "square", "on", "white"]
+
+
+@pytest.fixture(scope="module")
+def tiny_model_dir(tmp_path_factory):
+    """A randomly initialized ViT + GPT-2 captioner, saved locally so nothing is downloaded"""
+    path = tmp_path_factory.mktemp("tiny-captioner")
+    torch.manual_seed(0)
+
+    tokenizer = Tokenizer(models.WordLevel({token: i for i, token in enumerate(VOCAB)}, unk_token="[UNK]"))
+    tokenizer.pre_tokenizer = pre_tokenizers.Whitespace()
+    PreTrainedTokenizerFast(tokenizer_object=tokenizer, pad_token="[PAD]", bos_token="[BOS]", eos_token="[EOS]",
+                            unk_token="[UNK]").save_pretrained(path)
+    ViTImageProcessor(size={"height": 32, "width": 32}).save_pretrained(path)
+
+    config = VisionEncoderDecoderConfig.from_encoder_decoder_configs(
+        ViTConfig(image_size=32, patch_size=8, hidden_size=32, num_hidden_layers=1, num_attention_heads=2,
+                  intermediate_size=64),
+        GPT2Config(vocab_size=len(VOCAB), n_embd=32, n_layer=1, n_head=2, n_positions=128,
+                   bos_token_id=1, eos_token_id=2)
+    )
+    config.decoder_start_token_id = 1
+    config.pad_token_id = 0
+    config.eos_token_id = 2
+    VisionEncoderDecoderModel(config).save_pretrained(path)
+    return str(path)
+
+
+def make_provider(model_dir: str, batch_size: int, max_wait_ms: int):
+    provider = HuggingFaceProvider()
+    provider.configure(ModelConfig(provider="huggingface", model=model_dir, api_key="", cost_per_token=0,
+                                   temperature=0, local_batch_size=batch_size, local_max_wait_ms=max_wait_ms))
+    batches = []
+    infer = provider._infer
+
+    def recording_infer(images, model_name, token):
+        batches.append(len(images))
+        return infer(images, model_name, token)
+
+    provider._infer = recording_infer
+    return provider, batches
+
+
+def image(color: str) -> Image.Image:
+    return Image.new("RGB", (48, 40), color)
+
+
+def test_concurrent_calls_share_one_forward_pass(tiny_model_dir):
+    provider, batches = make_provider(tiny_model_dir, batch_size=4, max_wait_ms=500)
+
+    async def run():
+        return await asyncio.gather(*[provider.generate_caption(image(color))
+                                      for color in ("red", "blue", "white", "red")])
+
+    captions = asyncio.run(run())
+    assert batches == [4]
+    assert len(captions) == 4
+    assert all(isinstance(caption, str) for caption in captions)
+
+
+def test_batch_size_caps_each_forward_pass(tiny_model_dir):
+    provider, batches = make_provider(tiny_model_dir, batch_size=2, max_wait_ms=500)
+
+    async def run():
+        return await asyncio.gather(*[provider.generate_caption(image("red")) for _ in range(5)])
+
+    assert len(asyncio.run(run())) == 5
+    assert batches == [2, 2, 1]
+
+
+def test_max_wait_limits_how_long_a_batch_fills(tiny_model_dir):
+    provider, batches = make_provider(tiny_model_dir, batch_size=8, max_wait_ms=50)
+
+    async def run():
+        first = asyncio.ensure_future(provider.generate_caption(image("red")))
+        # Arrives well after the first batch stopped waiting
+        await asyncio.sleep(0.5)
+        second = await provider.generate_caption(image("blue"))
+        return [await first, second]
+
+    assert len(asyncio.run(run())) == 2
+    assert batches == [1, 1]
+
+
+def test_generate_captions_queues_images_into_one_batch(tiny_model_dir):
+    provider, batches = make_provider(tiny_model_dir, batch_size=8, max_wait_ms=500)
+
+    captions = asyncio.run(provider.generate_captions([image("red"), image("blue"), image("white")]))
+    assert len(captions) == 3
+    assert batches == [3]
+
+
+def test_images_are_converted_on_the_inference_thread(tiny_model_dir):
+    provider, _ = make_provider(tiny_model_dir, batch_size=2, max_wait_ms=500)
+    modes = []
+    infer = provider._infer
+
+    def recording_infer(images, model_name, token):
+        modes.extend(image.mode for image in images)
+        return infer(images, model_name, token)
+
+    provider._infer = recording_infer
+    images = [Image.new("RGBA", (48, 40), "red"), Image.new("L", (48, 40), 128)]
+
+    assert len(asyncio.run(provider.generate_captions(images))) == 2
+    # Queued as given, the worker converts them to RGB
+    assert modes == ["RGBA", "L"]
@@ -0,0 +1,47 @@
+# backend/tests/test_image_scan.py
+import os
+
+from PIL import Image
+
+from app.services.image_scan import check_image, quarantine_image
+
+MAX_BYTES = 20 * 1024 * 1024
+MAX_PIXELS = 50_000_000
+
+
+def test_tiny_jpeg_is_valid(tmp_path):
+    path = str(tmp_path / "tiny.jpg")
+    Image.new("RGB", (4, 4), "red").save(path)
+    assert check_image(path, MAX_BYTES, MAX_PIXELS) is None
+
+
+def test_thin_jpeg_is_valid(tmp_path):
+    path = str(tmp_path / "thin.jpg")
+    Image.new("RGB", (600, 3), "blue").save(path)
+    assert check_image(path, MAX_BYTES, MAX_PIXELS) is None
+
+
+def test_truncated_jpeg_is_rejected(tmp_path):
+    path = str(tmp_path / "truncated.jpg")
+    Image.effect_noise((256, 256), 64).convert("RGB").save(path, quality=95)
+    with open(path, "rb") as f:
+        data = f.read()
+    with open(path, "wb") as f:
+        f.write(data[:len(data) // 2])
+    assert check_image(path, MAX_BYTES, MAX_PIXELS).startswith("corrupt or truncated")
+
+
+def test_empty_and_unsupported_files_are_rejected(tmp_path):
+    empty = tmp_path / "empty.png"
+    empty.write_bytes(b"")
+    text = tmp_path / "notes.png"
+    text.write_bytes(b"not an image")
+    assert check_image(str(empty), MAX_BYTES, MAX_PIXELS) == "empty file"
+    assert check_image(str(text), MAX_BYTES, MAX_PIXELS).startswith("not a supported image")
+
+
+def test_quarantine_keeps_earlier_files_of_the_same_name(tmp_path):
+    for _ in range(2):
+        (tmp_path / "bad.jpg").write_bytes(b"x")
+        quarantine_image(str(tmp_path / "bad.jpg"), "corrupt")
+    assert sorted(os.listdir(tmp_path / ".quarantine")) == ["bad.jpg", "bad_1.jpg", "quarantine.log"]
@@ -58,6 +58,8 @@ const AppPage = () => {
                     isProcessing={state.isProcessing}
                     isPaused={state.isPaused}
                     processedItems={state.processedItems}
+                    batchId={state.batchId}
+                    runProgress={state.runProgress}
                     onStartProcessing={startProcessing}
                     onStopProcessing={stopProcessing}
                     onPauseProcessing={pauseProcessing}
@@ -1,6 +1,15 @@
 // frontend/src/components/batch_processing/BatchProcessingView.tsx
 import React, {useEffect, useState} from 'react';
-import {ExamplePair, ModelConfig, ProcessedItem, ProcessingConfig, PromptTemplate} from '@/lib/types';
+import {
+    ExamplePair,
+    ModelConfig,
+    ProcessedItem,
+    ProcessedItemPage,
+    ProcessingConfig,
+    PromptTemplate,
+    ReprocessMode,
+    RunProgress
+} from '@/lib/types';
 import StatusSection, {FolderStats} from './StatusSection';
 import LiveFeed from './LiveFeed';
 import ProcessedGallery from './ProcessedGallery';
@@ -8,11 +17,15 @@ import FolderSelect from './FolderSelect';
 import QuickReview from './QuickReview';
 import {api} from '@/lib/api';
 
+const HISTORY_PAGE_SIZE = 60;
+
 interface BatchProcessingViewProps {
     isProcessing: boolean;
     isPaused: boolean;
     processedItems: ProcessedItem[];
-    onStartProcessing: (folder: string, reprocess?: boolean) => Promise<void>;
+    batchId?: string;
+    runProgress?: RunProgress;
+    onStartProcessing: (folder: string, reprocess?: ReprocessMode) => Promise<void>;
     onStopProcessing: () => Promise<void>;
     onPauseProcessing: () => Promise<void>;
     onResumeProcessing: () => Promise<void>;
@@ -28,11 +41,14 @@ const BatchProcessingView: React.FC<BatchProcessingViewProps> = ({
                                                                      isProcessing,
                                                                      isPaused,
                                                                      processedItems,
+                                                                     batchId,
+                                                                     runProgress,
                                                                      onStartProcessing,
                                                                      onStopProcessing,
                                                                      onPauseProcessing,
                                                                      onResumeProcessing,
                                                                      modelConfig,
+                                                                     processingConfig,
                                                                      examples,
                                                                      activeTemplate,
                                                                      onUpdateProcessedItem,
@@ -45,6 +61,56 @@ const BatchProcessingView: React.FC<BatchProcessingViewProps> = ({
     const [totalImageCount, setTotalImageCount] = useState(0);
     const [startTime, setStartTime] = useState<Date | undefined>(undefined);
     const [folderStats, setFolderStats] = useState<FolderStats | undefined>(undefined);
+    // Once a run has finished, the gallery and review page through its stored results
+    const [historyBatchId, setHistoryBatchId] = useState<string | undefined>(undefined);
+    const [historyPage, setHistoryPage] = useState<ProcessedItemPage | null>(null);
+    const [page, setPage] = useState(1);
+    const [searchQuery, setSearchQuery] = useState('');
+    const [searchPage, setSearchPage] = useState<ProcessedItemPage | null>(null);
+
+    useEffect(() => {
+        setHistoryBatchId(batchId);
+        setPage(1);
+    }, [batchId]);
+
+    useEffect(() => {
+        if (!historyBatchId || isProcessing) {
+            setHistoryPage(null);
+            return;
+        }
+        api.getProcessedItems({batchId: historyBatchId, page, pageSize: HISTORY_PAGE_SIZE})
+            .then(setHistoryPage)
+            .catch(error => console.error('Failed to fetch processed items:', error));
+    }, [historyBatchId, isProcessing, page]);
+
+    useEffect(() => {
+        if (!searchQuery) {
+            setSearchPage(null);
+            return;
+        }
+        api.searchCaptions({query: searchQuery, folder: sourceFolder || undefined, page, pageSize: HISTORY_PAGE_SIZE})
+            .then(setSearchPage)
+            .catch(error => console.error('Failed to search captions:', error));
+    }, [searchQuery, sourceFolder, page]);
+
+    const handleSearch = (query: string) => {
+        setSearchQuery(query.trim());
+        setPage(1);
+    };
+
+    const pagedResults = searchPage || historyPage;
+    const galleryItems = pagedResults ? pagedResults.items : processedItems;
+    const totalPages = pagedResults ? Math.max(1, Math.ceil(pagedResults.total / pagedResults.pageSize)) : 1;
+
+    const handleCaptionUpdate = async (itemId: number, caption: string) => {
+        await onUpdateProcessedItem(itemId, caption);
+        const updatePage = (prev: ProcessedItemPage | null) => prev && {
+            ...prev,
+            items: prev.items.map(item => item.id === itemId ? {...item, caption} : item)
+        };
+        setHistoryPage(updatePage);
+        setSearchPage(updatePage);
+    };
 
     useEffect(() => {
         const fetchFolderStats = async () => {
@@ -70,6 +136,7 @@ const BatchProcessingView: React.FC<BatchProcessingViewProps> = ({
 
     const handleFolderSelect = async (folder: string, imageCount: number) => {
         setSourceFolder(folder);
+        setHistoryBatchId(undefined);
         setTotalImageCount(imageCount);
         setShowFolderSelect(false);
 
@@ -82,7 +149,7 @@ const BatchProcessingView: React.FC<BatchProcessingViewProps> = ({
                     .map((file) => ({
                         id: hashFilename(file.filename),
                         filename: file.filename,
-                        image: `/data/${folder.split('/').pop()}/${file.filename}`,
+                        image: `/data/${folder.split('/').pop()}/${encodeURIComponent(file.filename)}?v=${file.version}`,
                         caption: file.caption || '',
                         status: 'success' as const,
                         timestamp: new Date(file.last_modified).toISOString(),
@@ -120,6 +187,30 @@ const BatchProcessingView: React.FC<BatchProcessingViewProps> = ({
         }
     };
 
+    const handleReprocessStale = async () => {
+        try {
+            // Dry run first, so the user sees what the job would cost before anything is sent
+            const selection = await api.previewBatchProcessing(sourceFolder, modelConfig, processingConfig, 'stale');
+            if (selection.imageCount === 0) {
+                alert('All captions are up to date.');
+                return;
+            }
+            const reasons = Object.entries(selection.staleReasons)
+                .filter(([, count]) => count > 0)
+                .map(([reason, count]) => `${reason}: ${count}`)
+                .join(', ');
+            const message = `${selection.stale} stale${reasons ? ` (${reasons})` : ''} and ` +
+                `${selection.uncaptioned} uncaptioned of ${selection.totalImages} images will be captioned. ` +
+                `${selection.current + selection.unknownProvenance} captions are kept. Continue?`;
+            if (window.confirm(message)) {
+                setStartTime(new Date());
+                await onStartProcessing(sourceFolder, 'stale');
+            }
+        } catch (error) {
+            alert(error instanceof Error ? error.message : 'Failed to check for stale captions');
+        }
+    };
+
     return (
         <div className="flex flex-col h-screen">
             <div className="p-6 border-b">
@@ -133,14 +224,18 @@ const BatchProcessingView: React.FC<BatchProcessingViewProps> = ({
                         handleStartProcessing
                     }
                     onStopProcessing={onStopProcessing}
-                    processedCount={processedItems.length}
-                    totalCount={totalImageCount}
+                    processedCount={runProgress?.processedCount ?? processedItems.length}
+                    totalCount={runProgress?.totalCount || totalImageCount}
                     startTime={startTime}
+                    processingSpeed={isProcessing ? runProgress?.processingSpeed : undefined}
+                    estimatedCompletion={isProcessing && runProgress?.estimatedCompletion
+                        ? new Date(runProgress.estimatedCompletion) : undefined}
                     modelConfig={modelConfig}
                     activeTemplate={activeTemplate}
                     examples={examples}
                     folderStats={folderStats}
                     onReprocessAll={handleReprocessAll}
+                    onReprocessStale={handleReprocessStale}
                 />
             </div>
 
@@ -152,7 +247,11 @@ const BatchProcessingView: React.FC<BatchProcessingViewProps> = ({
 
                     <div className="col-span-4 overflow-hidden flex flex-col">
                         <ProcessedGallery
-                            items={processedItems}
+                            items={galleryItems}
+                            page={page}
+                            totalPages={totalPages}
+                            onPageChange={setPage}
+                            onSearch={handleSearch}
                             onImageSelect={setSelectedImage}
                             onReviewModeToggle={() => setShowQuickReview(true)}
                         />
@@ -170,9 +269,9 @@ const BatchProcessingView: React.FC<BatchProcessingViewProps> = ({
 
             {showQuickReview && (
                 <QuickReview
-                    items={processedItems}
+                    items={galleryItems}
                     onClose={() => setShowQuickReview(false)}
-                    onCaptionUpdate={onUpdateProcessedItem}
+                    onCaptionUpdate={handleCaptionUpdate}
                 />
             )}
 
@@ -1,5 +1,5 @@
 // frontend/src/components/batch_processing/ProcessedGallery.tsx
-import React from 'react';
+import React, {useState} from 'react';
 import {Card, CardContent, CardHeader, CardTitle} from "@/components/ui/card";
 import {ProcessedItem} from '@/lib/types';
 
@@ -7,13 +7,22 @@ interface ProcessedGalleryProps {
     items: ProcessedItem[];
     onImageSelect: (item: ProcessedItem) => void;
     onReviewModeToggle: () => void;
+    page?: number;
+    totalPages?: number;
+    onPageChange?: (page: number) => void;
+    onSearch?: (query: string) => void;
 }
 
 const ProcessedGallery: React.FC<ProcessedGalleryProps> = ({
                                                                items,
                                                                onImageSelect,
                                                                onReviewModeToggle,
+                                                               page = 1,
+                                                               totalPages = 1,
+                                                               onPageChange,
+                                                               onSearch,
                                                            }) => {
+    const [query, setQuery] = useState('');
 
     const getImageUrl = (imagePath: string) => {
         // If the URL is already complete, return it
@@ -29,6 +38,38 @@ const ProcessedGallery: React.FC<ProcessedGalleryProps> = ({
             <CardHeader>
                 <CardTitle className="flex justify-between items-center">
                     <span>Processed Images</span>
+                    {onSearch && (
+                        <input
+                            type="search"
+                            value={query}
+                            placeholder="Search captions..."
+                            onChange={(e) => {
+                                setQuery(e.target.value);
+                                if (!e.target.value) onSearch('');
+                            }}
+                            onKeyDown={(e) => e.key === 'Enter' && onSearch(query)}
+                            className="flex-1 mx-4 px-3 py-1 text-sm font-normal border rounded-lg"
+                        />
+                    )}
+                    {onPageChange && totalPages > 1 && (
+                        <div className="flex items-center gap-2 text-sm font-normal">
+                            <button
+                                onClick={() => onPageChange(page - 1)}
+                                disabled={page <= 1}
+                                className="px-2 py-1 rounded hover:bg-gray-100 disabled:opacity-40"
+                            >
+                                Previous
+                            </button>
+                            <span className="text-gray-500">Page {page} of {totalPages}</span>
+                            <button
+                                onClick={() => onPageChange(page + 1)}
+                                disabled={page >= totalPages}
+                                className="px-2 py-1 rounded hover:bg-gray-100 disabled:opacity-40"
+                            >
+                                Next
+                            </button>
+                        </div>
+                    )}
                     <button
                         onClick={onReviewModeToggle}
                         className="px-4 py-1 text-sm bg-blue-50 text-blue-600 rounded-lg hover:bg-blue-100"
@@ -22,6 +22,8 @@ interface StatusSectionProps {
     processedCount: number;
     totalCount: number;
     startTime?: Date;
+    processingSpeed?: number;  // items per minute measured by the backend
+    estimatedCompletion?: Date;
     modelConfig: ModelConfig;
     activeTemplate: PromptTemplate;
     examples: ExamplePair[];
@@ -34,9 +36,11 @@ interface StatusSectionProps {
             has_caption: boolean;
             caption: string | null;
             last_modified: number;
+            version: string;
         }[];
     };
     onReprocessAll?: () => void;
+    onReprocessStale?: () => void;
 }
 
 
@@ -50,7 +54,11 @@ const formatDuration = (minutes: number): string => {
     return `${hours}h ${remainingMinutes}m`;
 };
 
-const calculateTimeLeft = (processedCount: number, totalCount: number, startTime?: Date): string => {
+const calculateTimeLeft = (processedCount: number, totalCount: number, startTime?: Date,
+                           estimatedCompletion?: Date): string => {
+    if (estimatedCompletion) {
+        return formatDuration(Math.max(0, (estimatedCompletion.getTime() - Date.now()) / (1000 * 60)));
+    }
     if (!startTime || processedCount === 0) return '--';
 
     const elapsedMinutes = (Date.now() - startTime.getTime()) / (1000 * 60);
@@ -61,7 +69,8 @@ const calculateTimeLeft = (processedCount: number, totalCount: number, startTime
     return formatDuration(remainingMinutes);
 };
 
-const calculateSpeed = (processedCount: number, startTime?: Date): string => {
+const calculateSpeed = (processedCount: number, startTime?: Date, processingSpeed?: number): string => {
+    if (processingSpeed !== undefined) return `${processingSpeed.toFixed(1)}/min`;
     if (!startTime || processedCount === 0) return '--';
 
     const elapsedMinutes = (Date.now() - startTime.getTime()) / (1000 * 60);
@@ -108,7 +117,9 @@ const calculateDetailedCost = (
     };
 };
 
-const calculateCompletion = (startTime?: Date, processedCount?: number, totalCount?: number): string => {
+const calculateCompletion = (startTime?: Date, processedCount?: number, totalCount?: number,
+                             estimatedCompletion?: Date): string => {
+    if (estimatedCompletion) return estimatedCompletion.toLocaleTimeString();
     if (!startTime || !processedCount || !totalCount || processedCount === 0) return '--';
 
     const elapsedMinutes = (Date.now() - startTime.getTime()) / (1000 * 60);
@@ -116,8 +127,7 @@ const calculateCompletion = (startTime?: Date, processedCount?: number, totalCou
     const remainingImages = totalCount - processedCount;
     const remainingMinutes = remainingImages / imagesPerMinute;
 
-    const estimatedCompletion = new Date(Date.now() + remainingMinutes * 60 * 1000);
-    return estimatedCompletion.toLocaleTimeString();
+    return new Date(Date.now() + remainingMinutes * 60 * 1000).toLocaleTimeString();
 };
 
 const StatusSection: React.FC<StatusSectionProps> = ({
@@ -128,13 +138,16 @@ const StatusSection: React.FC<StatusSectionProps> = ({
                                                          processedCount,
                                                          totalCount,
                                                          startTime,
+                                                         processingSpeed,
+                                                         estimatedCompletion,
                                                          modelConfig,
                                                          activeTemplate,
                                                          examples,
                                                          isPaused,
                                                          onStopProcessing,
                                                          folderStats,
-                                                         onReprocessAll
+                                                         onReprocessAll,
+                                                         onReprocessStale
                                                      }) => {
     const progress = folderStats
         ? (folderStats.captioned / folderStats.total_images) * 100
@@ -143,12 +156,13 @@ const StatusSection: React.FC<StatusSectionProps> = ({
     const showReprocessButton = folderStats !== undefined &&
         folderStats.captioned === folderStats.total_images &&
         folderStats.total_images > 0;
+    const showStaleButton = folderStats !== undefined && folderStats.captioned > 0 && !isProcessing;
     const showStartButton = !showReprocessButton &&
         folderStats !== undefined &&
         folderStats.uncaptioned > 0;
-    const estimatedTimeLeft = calculateTimeLeft(processedCount, totalCount, startTime);
-    const processingSpeed = calculateSpeed(processedCount, startTime);
-    const estimatedCompletion = calculateCompletion(startTime, processedCount, totalCount);
+    const estimatedTimeLeft = calculateTimeLeft(processedCount, totalCount, startTime, estimatedCompletion);
+    const speedLabel = calculateSpeed(processedCount, startTime, processingSpeed);
+    const completionLabel = calculateCompletion(startTime, processedCount, totalCount, estimatedCompletion);
 
     const {currentCost, estimatedTotalCost, tokenCounts} = calculateDetailedCost(
         processedCount,
@@ -232,6 +246,22 @@ const StatusSection: React.FC<StatusSectionProps> = ({
                             </button>
                         )}
 
+                        {showStaleButton && (
+                            <button
+                                className="px-6 py-2 bg-amber-100 text-amber-700 rounded-lg hover:bg-amber-200 flex items-center gap-2"
+                                onClick={() => {
+                                    if (!modelConfig.apiKey) {
+                                        alert("Please configure your API key in the settings panel first.");
+                                        return;
+                                    }
+                                    onReprocessStale?.();
+                                }}
+                            >
+                                <RefreshCw className="w-4 h-4"/>
+                                Redo Stale
+                            </button>
+                        )}
+
                         {showStartButton && !isProcessing && (
                             <button
                                 className="px-6 py-2 bg-blue-600 text-white rounded-lg hover:bg-blue-700 flex items-center gap-2"
@@ -290,7 +320,7 @@ const StatusSection: React.FC<StatusSectionProps> = ({
                         </div>
                         <div className="p-2 bg-gray-50 rounded-lg text-center">
                             <p className="text-gray-600 text-sm">Speed</p>
-                            <p className="font-medium">{processingSpeed}</p>
+                            <p className="font-medium">{speedLabel}</p>
                         </div>
                         <div className="p-2 bg-gray-50 rounded-lg text-center">
                             <p className="text-gray-600 text-sm">Cost</p>
@@ -305,7 +335,7 @@ const StatusSection: React.FC<StatusSectionProps> = ({
                         </div>
                         <div className="p-2 bg-gray-50 rounded-lg text-center">
                             <p className="text-gray-600 text-sm">Completion</p>
-                            <p className="font-medium">{estimatedCompletion}</p>
+                            <p className="font-medium">{completionLabel}</p>
                         </div>
                     </div>
                 </CardContent>
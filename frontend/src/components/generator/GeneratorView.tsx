@@ -10,7 +10,7 @@ interface GeneratorViewProps {
     examples: ExamplePair[];
     onAddExample: (image: File, caption: string) => Promise<void>;
     onRemoveExample: (id: number) => void;
-    onGenerateCaption: (image: File) => Promise<string>;
+    onGenerateCaption: (image: File, onToken?: (text: string) => void) => Promise<string>;
     modelConfig: ModelConfig;
     templates: PromptTemplate[];
     activeTemplate: PromptTemplate;
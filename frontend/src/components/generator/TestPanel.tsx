@@ -6,7 +6,7 @@ import {ExamplePair, ModelConfig, PromptTemplate} from '@/lib/types';
 import {calculateCost, countTokens, getImageDimensions, getImageTokenCount} from '@/lib/utils/tokenCounter';
 
 interface TestPanelProps {
-    onGenerateCaption: (image: File) => Promise<string>;
+    onGenerateCaption: (image: File, onToken?: (text: string) => void) => Promise<string>;
     modelConfig: ModelConfig;
     examples: ExamplePair[];
     activeTemplate: PromptTemplate;
@@ -70,8 +70,9 @@ const TestPanel: React.FC<TestPanelProps> = ({
             return;
         }
         setIsGenerating(true);
+        setGeneratedCaption('');
         try {
-            const caption = await onGenerateCaption(selectedImage);
+            const caption = await onGenerateCaption(selectedImage, text => setGeneratedCaption(prev => prev + text));
             setGeneratedCaption(caption);
             localStorage.setItem('lastGeneratedCaption', caption);
         } catch (error) {
@@ -61,12 +61,50 @@ const ProcessingSettings: React.FC<ProcessingSettingsProps> = ({
                 </select>
             </div>
 
+            <div>
+                <label className="block text-sm font-medium text-gray-700 mb-2">
+                    Examples per Request
+                </label>
+                <select
+                    className="w-full p-2 border rounded-lg"
+                    value={config.exampleTopK}
+                    onChange={(e) => onUpdate({
+                        exampleTopK: parseInt(e.target.value)
+                    })}
+                >
+                    <option value={0}>All examples</option>
+                    <option value={1}>1 most similar example</option>
+                    <option value={3}>3 most similar examples</option>
+                    <option value={5}>5 most similar examples</option>
+                </select>
+            </div>
+
+            <div>
+                <label className="block text-sm font-medium text-gray-700 mb-2">
+                    Images per Request
+                </label>
+                <select
+                    className="w-full p-2 border rounded-lg"
+                    value={config.imagesPerRequest}
+                    onChange={(e) => onUpdate({
+                        imagesPerRequest: parseInt(e.target.value)
+                    })}
+                >
+                    <option value={1}>1 image per request</option>
+                    <option value={2}>2 images per request</option>
+                    <option value={4}>4 images per request</option>
+                    <option value={8}>8 images per request</option>
+                </select>
+            </div>
+
             <div className="bg-blue-50 p-4 rounded-lg">
                 <h4 className="text-sm font-medium text-blue-700 mb-2">Processing Tips</h4>
                 <ul className="text-sm text-blue-600 space-y-1">
                     <li>• Smaller batch sizes are better for testing</li>
                     <li>• Higher concurrency may increase costs</li>
                     <li>• Consider API rate limits when configuring</li>
+                    <li>• Sending only the most similar examples reduces prompt tokens</li>
+                    <li>• Several images per request share one copy of the template and examples</li>
                 </ul>
             </div>
         </div>
@@ -1,5 +1,15 @@
 // frontend/src/lib/api.ts
-import {ExamplePair, ModelConfig, ProcessedItem, ProcessingConfig, PromptTemplate} from './types';
+import {
+    ExamplePair,
+    ModelConfig,
+    ProcessedItem,
+    ProcessedItemPage,
+    ProcessingConfig,
+    PromptTemplate,
+    ReprocessMode,
+    ReprocessSelection,
+    RunProgress
+} from './types';
 import {FolderStats} from "@/components/batch_processing/StatusSection";
 
 class ApiClient {
@@ -28,8 +38,54 @@ class ApiClient {
         }
     }
 
-    async startBatchProcessing(folder: string, modelConfig: ModelConfig, processingConfig: ProcessingConfig, reprocess: boolean = false) {
-        const backendSettings = {
+    async streamCaption(image: File, onToken: (text: string) => void): Promise<string> {
+        const formData = new FormData();
+        formData.append('image', image);
+
+        const response = await fetch(`${this.baseUrl}/generate-caption/stream`, {
+            method: 'POST',
+            body: formData,
+        });
+        if (!response.ok || !response.body) {
+            const error = await response.json().catch(() => ({}));
+            throw new Error(error.detail || 'Failed to generate caption');
+        }
+
+        // Server-sent events: blocks of "event: <name>" and "data: <json>" lines separated by a blank line
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffered = '';
+        while (true) {
+            const {done, value} = await reader.read();
+            if (done) break;
+            buffered += decoder.decode(value, {stream: true});
+            let end;
+            while ((end = buffered.indexOf('\n\n')) !== -1) {
+                const block = buffered.slice(0, end);
+                buffered = buffered.slice(end + 2);
+                let event = 'message';
+                let data = '';
+                for (const line of block.split('\n')) {
+                    if (line.startsWith('event: ')) event = line.slice(7);
+                    else if (line.startsWith('data: ')) data += line.slice(6);
+                }
+                const payload = data ? JSON.parse(data) : {};
+                if (event === 'token') {
+                    onToken(payload.text);
+                } else if (event === 'done') {
+                    await reader.cancel();
+                    return payload.caption;
+                } else if (event === 'error') {
+                    await reader.cancel();
+                    throw new Error(payload.detail || 'Failed to generate caption');
+                }
+            }
+        }
+        throw new Error('Caption stream ended before the caption was complete');
+    }
+
+    private batchRequest(folder: string, modelConfig: ModelConfig, processingConfig: ProcessingConfig, reprocess: ReprocessMode) {
+        return {
             folder_path: folder,
             model_settings: {
                 provider: modelConfig.provider,
@@ -41,10 +97,30 @@ class ApiClient {
             processing_settings: {
                 batch_size: processingConfig.batchSize,
                 error_handling: processingConfig.errorHandling,
-                concurrent_processing: processingConfig.concurrentProcessing
+                concurrent_processing: processingConfig.concurrentProcessing,
+                example_top_k: processingConfig.exampleTopK,
+                images_per_request: processingConfig.imagesPerRequest
             },
             reprocess: reprocess
         };
+    }
+
+    async previewBatchProcessing(folder: string, modelConfig: ModelConfig, processingConfig: ProcessingConfig,
+                                 reprocess: ReprocessMode = false): Promise<ReprocessSelection> {
+        const response = await fetch(`${this.baseUrl}/batch-process/dry-run`, {
+            method: 'POST',
+            headers: {'Content-Type': 'application/json'},
+            body: JSON.stringify(this.batchRequest(folder, modelConfig, processingConfig, reprocess)),
+        });
+        if (!response.ok) {
+            const error = await response.json();
+            throw new Error(error.detail || 'Failed to check which images need captions');
+        }
+        return response.json();
+    }
+
+    async startBatchProcessing(folder: string, modelConfig: ModelConfig, processingConfig: ProcessingConfig, reprocess: ReprocessMode = false) {
+        const backendSettings = this.batchRequest(folder, modelConfig, processingConfig, reprocess);
 
         try {
             const response = await fetch(`${this.baseUrl}/batch-process`, {
@@ -74,13 +150,62 @@ class ApiClient {
         progress: number;
         processedItems: ProcessedItem[];
         status: string;
+        batchId?: string;
+        runProgress: RunProgress;
     }> {
         const response = await fetch(`${this.baseUrl}/batch-process/status`);
         const data = await response.json();
         return {
             progress: (data.processedCount / data.totalCount) * 100,
             processedItems: data.items || [],
-            status: data.isProcessing ? 'processing' : 'completed'
+            status: data.isProcessing ? 'processing' : 'completed',
+            batchId: data.batchId || undefined,
+            runProgress: {
+                processedCount: data.processedCount,
+                totalCount: data.totalCount,
+                errorCount: data.errorCount,
+                processingSpeed: data.processingSpeed ?? undefined,
+                estimatedCompletion: data.estimatedCompletion ?? undefined
+            }
+        };
+    }
+
+    async getProcessedItems(params: {
+        batchId?: string;
+        status?: string;
+        filename?: string;
+        page?: number;
+        pageSize?: number;
+    }): Promise<ProcessedItemPage> {
+        const query = new URLSearchParams();
+        if (params.batchId) query.set('batch_id', params.batchId);
+        if (params.status) query.set('status', params.status);
+        if (params.filename) query.set('filename', params.filename);
+        query.set('page', String(params.page || 1));
+        query.set('page_size', String(params.pageSize || 50));
+
+        const response = await fetch(`${this.baseUrl}/processed-items?${query}`);
+        if (!response.ok) throw new Error('Failed to fetch processed items');
+        return response.json();
+    }
+
+    async searchCaptions(params: {
+        query: string;
+        folder?: string;
+        page?: number;
+        pageSize?: number;
+    }): Promise<ProcessedItemPage> {
+        const query = new URLSearchParams({q: params.query});
+        if (params.folder) query.set('folder', params.folder);
+        query.set('page', String(params.page || 1));
+        query.set('page_size', String(params.pageSize || 50));
+
+        const response = await fetch(`${this.baseUrl}/captions/search?${query}`);
+        if (!response.ok) throw new Error('Failed to search captions');
+        const data = await response.json();
+        return {
+            ...data,
+            items: data.items.map((item: Omit<ProcessedItem, 'status'>) => ({...item, status: 'success' as const}))
         };
     }
 
@@ -197,7 +322,9 @@ class ApiClient {
                     temperature: 0.5,
                     batchSize: 50,
                     errorHandling: 'continue' as const,
-                    concurrentProcessing: 2
+                    concurrentProcessing: 2,
+                    exampleTopK: 0,
+                    imagesPerRequest: 1
                 };
             }
             throw new Error('Failed to fetch settings');
@@ -213,7 +340,9 @@ class ApiClient {
             temperature: data.temperature,
             batchSize: data.batch_size,
             errorHandling: data.error_handling,
-            concurrentProcessing: data.concurrent_processing
+            concurrentProcessing: data.concurrent_processing,
+            exampleTopK: data.example_top_k ?? 0,
+            imagesPerRequest: data.images_per_request ?? 1
         };
     }
 
@@ -227,7 +356,9 @@ class ApiClient {
             temperature: settings.temperature,
             batch_size: settings.batchSize,
             error_handling: settings.errorHandling,
-            concurrent_processing: settings.concurrentProcessing
+            concurrent_processing: settings.concurrentProcessing,
+            example_top_k: settings.exampleTopK,
+            images_per_request: settings.imagesPerRequest
         };
 
         const response = await fetch(`${this.baseUrl}/settings`, {
@@ -1,6 +1,6 @@
 // frontend/src/lib/hooks/useAppState.ts
 import {useCallback, useEffect, useRef, useState} from 'react';
-import {AppState, ModelConfig, ProcessedItem, ProcessingConfig, PromptTemplate} from '../types';
+import {AppState, ModelConfig, ProcessedItem, ProcessingConfig, PromptTemplate, ReprocessMode} from '../types';
 import {api} from '../api';
 
 const DEFAULT_MODEL_CONFIG: ModelConfig = {
@@ -15,6 +15,8 @@ const DEFAULT_PROCESSING_CONFIG: ProcessingConfig = {
     batchSize: 50,
     errorHandling: 'continue',
     concurrentProcessing: 2,
+    exampleTopK: 0,
+    imagesPerRequest: 1,
 };
 
 const DEFAULT_PROMPT_TEMPLATE: PromptTemplate = {
@@ -211,9 +213,12 @@ export function useAppState() {
 
     const addExample = useCallback(async (image: File, caption: string) => {
         const newExample = await api.uploadExamplePair(image, caption);
+        // An image that already is an example comes back as the existing one
         setState(prev => ({
             ...prev,
-            examples: [...prev.examples, newExample],
+            examples: prev.examples.some(example => example.id === newExample.id)
+                ? prev.examples
+                : [...prev.examples, newExample],
         }));
     }, []);
 
@@ -242,7 +247,7 @@ export function useAppState() {
         };
     }, []);
 
-    const startProcessing = useCallback(async (folder: string, reprocess: boolean = false) => {
+    const startProcessing = useCallback(async (folder: string, reprocess: ReprocessMode = false) => {
         setState(prev => ({...prev, isProcessing: true, isPaused: false}));
         try {
             await api.startBatchProcessing(
@@ -272,6 +277,8 @@ export function useAppState() {
                                 ...prev,
                                 processedItems: status.processedItems || [],
                                 isProcessing: status.status !== 'completed',
+                                batchId: status.batchId,
+                                runProgress: status.runProgress,
                             };
                         });
 
@@ -301,8 +308,9 @@ export function useAppState() {
         setState(prev => ({...prev, isProcessing: false, isPause: false}));
     }, []);
 
-    const generateCaption = useCallback(async (image: File) => {
-        const caption = await api.generateCaption(image);
+    const generateCaption = useCallback(async (image: File, onToken?: (text: string) => void) => {
+        // Streamed so the caption starts appearing at the first token
+        const caption = await api.streamCaption(image, onToken ?? (() => undefined));
         await addExample(image, caption);
         return caption;
     }, [addExample]);
@@ -32,6 +32,35 @@ export interface ProcessedItem {
     timestamp: string;
 }
 
+export interface ProcessedItemPage {
+    items: ProcessedItem[];
+    total: number;
+    page: number;
+    pageSize: number;
+}
+
+// Counters and throughput of the running job, reported by the backend
+export interface RunProgress {
+    processedCount: number;
+    totalCount: number;
+    errorCount: number;
+    processingSpeed?: number;  // items per minute, recent rate
+    estimatedCompletion?: string;
+}
+
+// false captions uncaptioned images, true redoes all, 'stale' also redoes captions whose inputs changed
+export type ReprocessMode = boolean | 'stale';
+
+export interface ReprocessSelection {
+    imageCount: number;  // images the job would caption
+    totalImages: number;
+    uncaptioned: number;
+    stale: number;
+    current: number;
+    unknownProvenance: number;  // older or hand-edited captions, kept
+    staleReasons: Record<string, number>;
+}
+
 export interface ExamplePair {
     id: number;
     image: string;
@@ -50,6 +79,8 @@ export interface ProcessingConfig {
     batchSize: number;
     errorHandling: 'continue' | 'stop';
     concurrentProcessing: number;
+    exampleTopK: number;  // 0 sends every example
+    imagesPerRequest: number;
 }
 
 export interface AppState {
@@ -62,6 +93,8 @@ export interface AppState {
     templates: PromptTemplate[];
     activeTemplate: PromptTemplate;
     isPaused: boolean;
+    batchId?: string;
+    runProgress?: RunProgress;
 }
 
 export interface FileInfo {
@@ -69,6 +102,7 @@ export interface FileInfo {
     has_caption: boolean;
     caption: string | null;
     last_modified: number;
+    version: string;
 }
 
 export function countTokens(template: PromptTemplate, examples: ExamplePair[]): TokenCount {